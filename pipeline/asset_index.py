@@ -0,0 +1,149 @@
+"""
+Persistent index of the local asset library (assets/ stock clips and music).
+
+Renderers used to glob the assets directory on every selection, match tags
+against file names only, and learn a clip's length by opening it in MoviePy
+(paying again for every file that fails to open). The index keeps one entry
+per file with its probed duration, resolution, fps and codec, the file's
+size/mtime/SHA-256 and tags derived from its name, stored as JSON under
+ASSET_INDEX_DIR (one index per assets directory).
+
+Refreshes are incremental: one directory scan, and only files whose size or
+mtime changed are hashed; only files whose content changed are probed again.
+Files that cannot be probed are recorded with an error and skipped until
+they change on disk.
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
+
+from cache_utils import file_lock, file_sha256, load_json, save_json_atomic
+from ffmpeg_tools import probe_video
+from render_metrics import stage
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+ASSETS_DIR = ROOT_DIR / "assets"
+ASSET_INDEX_DIR = Path(os.getenv("ASSET_INDEX_DIR", ROOT_DIR / "pipeline" / "cache" / "assets"))
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".mkv", ".webm"}
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".aac"}
+
+INDEX_VERSION = 1
+
+
+def _index_path(assets_dir):
+    key = hashlib.sha1(str(Path(assets_dir).resolve()).encode("utf-8")).hexdigest()[:12]
+    return ASSET_INDEX_DIR / f"{key}.json"
+
+
+def name_tags(filename):
+    """Lower-case words of a file name, e.g. 'City_Night-2.mp4' -> ['city', 'night', '2']."""
+    return [word for word in re.split(r"[\W_]+", Path(filename).stem.lower()) if word]
+
+
+def _refresh_entry(path, stat, entry):
+    """Return an up-to-date entry for path, reusing entry when the file is unchanged."""
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return entry, False
+
+    digest = file_sha256(path)
+    if entry and entry.get("sha256") == digest:
+        # Touched or copied over with identical bytes: keep the probe result
+        return {**entry, "size": stat.st_size, "mtime": stat.st_mtime}, True
+
+    extension = path.suffix.lower()
+    refreshed = {
+        "kind": "video" if extension in VIDEO_EXTENSIONS else "audio",
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": digest,
+        "tags": name_tags(path.name),
+    }
+    try:
+        refreshed.update(probe_video(path))
+        if refreshed["kind"] == "video" and not (refreshed["width"] and refreshed["duration"]):
+            refreshed["error"] = "no video stream"
+    except Exception as e:
+        # ffmpeg's last stderr line carries the actual reason
+        lines = [line for line in str(e).splitlines() if line.strip()]
+        refreshed["error"] = f"{type(e).__name__}: {lines[-1] if lines else e}"
+    if refreshed.get("error"):
+        print(f"  ⚠️  Asset {path.name} cannot be used: {refreshed['error']}")
+    return refreshed, True
+
+
+@stage("asset_index")
+def load_asset_index(assets_dir=None):
+    """
+    Refresh and return the index of assets_dir.
+
+    Returns:
+        {filename: entry} for every media file currently in the directory
+        (entries with an "error" key could not be probed)
+    """
+    assets_dir = Path(assets_dir or ASSETS_DIR)
+    index_path = _index_path(assets_dir)
+    if not assets_dir.is_dir():
+        return {}
+
+    with file_lock(index_path.with_suffix(".lock")):
+        index = load_json(index_path, dict)
+        if index.get("version") != INDEX_VERSION:
+            index = {"version": INDEX_VERSION, "assets": {}}
+        previous = index["assets"]
+
+        assets = {}
+        changed = 0
+        with os.scandir(assets_dir) as scan:
+            for item in scan:
+                extension = os.path.splitext(item.name)[1].lower()
+                if extension not in VIDEO_EXTENSIONS | AUDIO_EXTENSIONS or not item.is_file():
+                    continue
+                entry, updated = _refresh_entry(Path(item.path), item.stat(), previous.get(item.name))
+                assets[item.name] = entry
+                changed += updated
+
+        if changed or assets.keys() != previous.keys():
+            index["assets"] = assets
+            save_json_atomic(index_path, index)
+            print(f"  🗂️  Asset index: {changed} file(s) probed, {len(assets)} indexed")
+
+    return assets
+
+
+def list_assets(assets_dir=None, kind=None, extensions=None, index=None):
+    """
+    Usable assets ("video", "audio" or both) as entry dicts with an added "path".
+
+    index: an already loaded load_asset_index() result (skips the refresh)
+    """
+    assets_dir = Path(assets_dir or ASSETS_DIR)
+    index = load_asset_index(assets_dir) if index is None else index
+    return [
+        {**entry, "path": assets_dir / name}
+        for name, entry in sorted(index.items())
+        if kind in (None, entry["kind"]) and not entry.get("error")
+        and (extensions is None or Path(name).suffix.lower() in extensions)
+    ]
+
+
+def matches_tags(entry, tags):
+    """True if any tag occurs in the asset's name (substring match over its name tags)."""
+    name = " ".join(entry.get("tags") or name_tags(entry["path"].name))
+    return any(tag.lower().strip() in name for tag in tags or [] if tag.strip())
+
+
+def choose_clip(entries, rng, tags=None, min_duration=None):
+    """
+    Pick a clip entry: tagged clips first (when any match), and among those
+    the ones at least min_duration long so the slot does not have to loop.
+    Falls back to the whole candidate set rather than failing.
+    """
+    if not entries:
+        return None
+    candidates = [entry for entry in entries if matches_tags(entry, tags)] or entries
+    if min_duration:
+        long_enough = [entry for entry in candidates if entry["duration"] >= min_duration]
+        candidates = long_enough or candidates
+    return rng.choice(candidates)
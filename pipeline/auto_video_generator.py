@@ -9,10 +9,21 @@ os.environ['MOVIEPY_DOTENV'] = ''
 
 try:
     # MoviePy 2.x
-    from moviepy import AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips
+    from moviepy import AudioFileClip, VideoFileClip
 except ImportError:
     # MoviePy 1.x fallback
-    from moviepy.editor import AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips
+    from moviepy.editor import AudioFileClip, VideoFileClip
+
+from asset_index import choose_clip, list_assets
+from clip_cache import get_normalized_clip
+from clip_pool import clip_pool, pool_subclip, sequence_clips
+from encoding_profiles import ENCODING_PROFILE, ENCODING_PROFILES, moviepy_write_options
+from ffmpeg_backend import BACKENDS, render_preview, render_subtitled_video
+from render_metrics import render_job, stage
+from render_worker import submit_job
+from segment_renderer import render_segments_parallel
+from subtitle_sprites import apply_subtitle_track
+from word_captions import CAPTION_MODE, CAPTION_MODES, build_caption_track
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 VIDEOS_DIR = ROOT_DIR / "pipeline" / "videos"
@@ -20,8 +31,13 @@ VIDEOS_DIR = ROOT_DIR / "pipeline" / "videos"
 
 def process_video_clip(video_path):
     """
-    Process a single video: resize, crop to 1080x1920
+    Process a single video: resize, crop to 1080x1920.
+    Uses the shared normalized-clip cache and falls back to in-memory resize.
     """
+    cached_path = get_normalized_clip(video_path)
+    if cached_path:
+        return VideoFileClip(cached_path, audio=False)
+    
     video_clip = VideoFileClip(str(video_path))
     
     # Resize and crop video to 1080x1920 (9:16 aspect ratio)
@@ -53,11 +69,21 @@ def process_video_clip(video_path):
     return video_cropped
 
 
-def auto_generate_video(audio_path, subtitles, assets_dir, output_id):
+def auto_generate_video(audio_path, subtitles, assets_dir, output_id, backend="moviepy",
+                        parallel=False, workers=None, chunk_size=1, preview=False, seed=None,
+                        profile=None, captions=None):
     """
     Auto-generate video from stock videos in assets directory.
     Randomly selects videos for each subtitle and combines them.
+    backend="ffmpeg" renders the same timeline as one ffmpeg filter graph.
+    parallel=True encodes chunks of chunk_size segments on a process pool
+    (ffmpeg backend per chunk) and joins them by stream copy.
+    preview=True writes a fast low-resolution <output_id>-preview.mp4 instead.
+    seed makes the random clip choice repeatable (preview and full render match).
+    profile names the encoding profile (draft, upload, archive; default ENCODING_PROFILE).
+    captions is "line" or "word" (karaoke highlight; MoviePy backend only, default CAPTION_MODE).
     """
+    rng = random.Random(seed)
     audio_clip = AudioFileClip(str(audio_path))
     total_duration = audio_clip.duration
     
@@ -66,7 +92,8 @@ def auto_generate_video(audio_path, subtitles, assets_dir, output_id):
     if not assets_path.exists():
         raise FileNotFoundError(f"Assets directory not found: {assets_dir}")
     
-    stock_videos = list(assets_path.glob("*.mp4")) + list(assets_path.glob("*.mov"))
+    # Indexed clips (probed once, unreadable files skipped) instead of a fresh glob
+    stock_videos = list_assets(assets_path, "video", {".mp4", ".mov"})
     if len(stock_videos) == 0:
         raise FileNotFoundError(f"No stock videos found in {assets_dir}")
     
@@ -77,111 +104,90 @@ def auto_generate_video(audio_path, subtitles, assets_dir, output_id):
     if len(subtitles) == 0:
         raise ValueError("No subtitles provided")
     
-    # Create video segments for each subtitle
-    video_segments = []
-    last_successful_clip = None  # Track last successful clip to avoid black screens
-    
-    for i, sub in enumerate(subtitles):
-        start = float(sub['start'])
-        end = float(sub['end'])
-        segment_duration = end - start
-        
-        # Randomly select a stock video
-        try:
-            stock_video = random.choice(stock_videos)
+    if backend == "ffmpeg" or parallel or preview:
+        if (captions or CAPTION_MODE) == "word":
+            print("⚠️  Word captions need the MoviePy backend; rendering line captions")
+        segments = []
+        for i, sub in enumerate(subtitles):
+            segment_duration = float(sub['end']) - float(sub['start'])
+            stock_video = choose_clip(stock_videos, rng, min_duration=segment_duration)["path"]
             print(f"  Subtitle {i+1}/{len(subtitles)}: Using {stock_video.name} ({segment_duration:.2f}s)")
-            
-            # Process the stock video
-            clip = process_video_clip(stock_video)
-            last_successful_clip = clip  # Update last successful
-        except Exception as e:
-            # If processing fails and we have a previous clip, use it
-            if last_successful_clip:
-                print(f"  ⚠️  Error processing video, continuing previous scene: {e}")
-                clip = last_successful_clip
-            else:
-                raise  # First segment failed, can't continue
-        
-        # If stock video is shorter than needed, loop it
-        if clip.duration < segment_duration:
-            loops_needed = int(segment_duration / clip.duration) + 1
-            clip = concatenate_videoclips([clip] * loops_needed)
+            segments.append({"source": str(stock_video), "offset": 0.0, "duration": segment_duration})
+        audio_clip.close()
         
-        # Extract the segment we need
-        segment = clip.with_start(0).with_duration(segment_duration)
-        video_segments.append(segment)
-    
-    # Concatenate all segments
-    print("Merging video segments...")
-    final_video_bg = concatenate_videoclips(video_segments, method="compose")
+        VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+        output_path = VIDEOS_DIR / f"{output_id}.mp4"
+        if preview:
+            return render_preview(segments, subtitles, audio_path, total_duration, output_path)
+        if parallel:
+            return render_segments_parallel(
+                segments, subtitles, audio_path, total_duration, output_path,
+                workers=workers, chunk_size=chunk_size, profile=profile,
+            )
+        return render_subtitled_video(segments, subtitles, audio_path, total_duration, output_path,
+                                      profile=profile)
     
-    # Ensure exact duration match
-    final_video_bg = final_video_bg.with_duration(total_duration)
+    VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = VIDEOS_DIR / f"{output_id}.mp4"
     
-    # Create subtitle clips
-    print("Adding subtitles...")
-    subtitle_clips = []
-    for sub in subtitles:
-        try:
+    # Each distinct stock video is decoded by one pooled reader shared by its segments
+    with clip_pool(process_video_clip) as pool:
+        video_segments = []
+        last_successful_video = None  # Track last successful video to avoid black screens
+        
+        for i, sub in enumerate(subtitles):
             start = float(sub['start'])
             end = float(sub['end'])
-            text = sub['text']
+            segment_duration = end - start
             
-            # Create text clip with Turkish character support
-            txt_clip = TextClip(
-                text=text,
-                font_size=55,
-                color='white',
-                font='/System/Library/Fonts/Supplemental/Arial Bold.ttf',
-                stroke_color='black',
-                stroke_width=3,
-                method='caption',
-                text_align='center',
-                size=(950, 300),
-            )
+            # Randomly select a stock video, preferring ones long enough not to loop
+            try:
+                stock_video = choose_clip(stock_videos, rng, min_duration=segment_duration)["path"]
+                print(f"  Subtitle {i+1}/{len(subtitles)}: Using {stock_video.name} ({segment_duration:.2f}s)")
+                segment = pool_subclip(pool, stock_video, segment_duration)
+                last_successful_video = stock_video  # Update last successful
+            except Exception as e:
+                # If processing fails and we have a previous video, use it
+                if last_successful_video:
+                    print(f"  ⚠️  Error processing video, continuing previous scene: {e}")
+                    segment = pool_subclip(pool, last_successful_video, segment_duration)
+                else:
+                    raise  # First segment failed, can't continue
             
-            # Add timing and position
-            txt_clip = (
-                txt_clip
-                .with_position(('center', 1400))
-                .with_start(start)
-                .with_duration(end - start)
+            video_segments.append(segment)
+        
+        # Concatenate all segments
+        print("Merging video segments...")
+        final_video_bg = sequence_clips(video_segments)
+        
+        # Ensure exact duration match
+        final_video_bg = final_video_bg.with_duration(total_duration)
+        
+        # Create the subtitle track
+        print("Adding subtitles...")
+        subtitle_track = build_caption_track(subtitles, final_video_bg.size, captions)
+        
+        print(f"  ✓ {subtitle_track['lines']} subtitles created")
+        
+        # Composite video with subtitles (one track clip; only the active cue is blended per frame)
+        final_video = apply_subtitle_track(final_video_bg, subtitle_track)
+        
+        # Add audio
+        print("Adding audio...")
+        final_video = final_video.with_audio(audio_clip)
+        
+        # Save output
+        print("Rendering final video...")
+        with stage("compose_encode"):
+            final_video.write_videofile(
+                str(output_path),
+                audio_codec="aac",
+                fps=30,
+                **moviepy_write_options(profile),
             )
-            subtitle_clips.append(txt_clip)
-        except Exception as e:
-            print(f"  Warning: Failed to create subtitle: {e}")
-            continue
-    
-    print(f"  ✓ {len(subtitle_clips)} subtitles created")
-    
-    # Composite video with subtitles
-    if subtitle_clips:
-        final_video = CompositeVideoClip([final_video_bg, *subtitle_clips], size=(1080, 1920))
-    else:
-        final_video = final_video_bg
-    
-    # Add audio
-    print("Adding audio...")
-    final_video = final_video.with_audio(audio_clip)
-    
-    # Save output
-    print("Rendering final video...")
-    VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
-    output_path = VIDEOS_DIR / f"{output_id}.mp4"
-    
-    final_video.write_videofile(
-        str(output_path),
-        codec="libx264",
-        audio_codec="aac",
-        fps=30,
-        preset="medium",
-        threads=4,
-    )
-    
-    # Cleanup
-    final_video.close()
-    for segment in video_segments:
-        segment.close()
+        
+        # Cleanup
+        final_video.close()
     audio_clip.close()
     
     print(f"\n✓ Video saved to {output_path}")
@@ -194,6 +200,16 @@ def parse_args():
     parser.add_argument("--subtitles-file", required=True, help="Subtitles JSON file path")
     parser.add_argument("--assets-dir", required=True, help="Assets directory with stock videos")
     parser.add_argument("--output-id", required=True, help="Output video ID")
+    parser.add_argument("--backend", choices=BACKENDS, default="moviepy", help="Render backend (ffmpeg skips MoviePy frame compositing)")
+    parser.add_argument("--parallel", action="store_true", help="Render segment chunks on a process pool and join by stream copy")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=1, help="Subtitle segments per parallel chunk")
+    parser.add_argument("--preview", action="store_true", help="Render a quick low-resolution preview (<id>-preview.mp4) instead of the full video")
+    parser.add_argument("--profile", choices=ENCODING_PROFILES, default=ENCODING_PROFILE, help="Encoding profile: draft, upload or archive")
+    parser.add_argument("--captions", choices=CAPTION_MODES, default=CAPTION_MODE, help="Caption style: whole lines, or word-by-word karaoke highlight (MoviePy backend)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for clip selection (same seed -> same clips, e.g. preview and full render)")
+    parser.add_argument("--cprofile", action="store_true", help="Also run the render under cProfile and save <report>.prof next to the timing report")
+    parser.add_argument("--worker", action="store_true", help="Submit the job to a running render_worker.py instead of rendering in-process")
     return parser.parse_args()
 
 
@@ -207,9 +223,29 @@ def main():
     print(f"Assets Dir: {args.assets_dir}")
     print(f"Output ID: {args.output_id}")
     print(f"Subtitles: {len(subtitles)}")
+    print(f"Backend: {args.backend}")
     print("="*30)
     
-    auto_generate_video(args.audio, subtitles, args.assets_dir, args.output_id)
+    params = {
+        "audio_path": str(Path(args.audio).resolve()),
+        "subtitles": subtitles,
+        "assets_dir": str(Path(args.assets_dir).resolve()),
+        "output_id": args.output_id,
+        "backend": args.backend,
+        "parallel": args.parallel,
+        "workers": args.workers,
+        "chunk_size": args.chunk_size,
+        "preview": args.preview,
+        "seed": args.seed,
+        "profile": args.profile,
+        "captions": args.captions,
+    }
+    if args.worker:
+        submit_job("auto", params)
+    else:
+        job_id = f"{args.output_id}-preview" if args.preview else args.output_id
+        with render_job("auto", job_id, cprofile=args.cprofile):
+            auto_generate_video(**params)
 
 
 if __name__ == "__main__":
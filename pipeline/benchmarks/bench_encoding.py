@@ -0,0 +1,86 @@
+"""
+Benchmark: encode speed and output bitrate of every encoding profile.
+
+Each profile re-encodes the same 1080x1920 reference clip with the options
+the renderers use, and the table reports encode fps (frames / wall time),
+output bitrate and file size. Without --clip, a synthetic reference is
+generated with ffmpeg's testsrc2 source plus fixed grain (texture, so the
+numbers are closer to stock footage than a static pattern).
+
+Usage:
+    python pipeline/benchmarks/bench_encoding.py [--clip reference.mp4] [--seconds 10] [--profiles draft upload archive]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ['MOVIEPY_DOTENV'] = ''
+
+import ffmpeg
+
+from encoding_profiles import ENCODING_PROFILES, encoder_threads, ffmpeg_output_options, get_profile
+from ffmpeg_tools import get_ffmpeg_exe, probe_video, run_ffmpeg
+
+SIZE = (1080, 1920)
+FPS = 30
+
+
+def make_reference(path, seconds):
+    """Synthetic 1080x1920@30 clip, encoded near-losslessly so it does not bias the profiles."""
+    width, height = SIZE
+    run_ffmpeg([
+        "-f", "lavfi",
+        "-i", f"testsrc2=size={width}x{height}:rate={FPS}:duration={seconds}",
+        "-vf", "noise=alls=8",
+        "-c:v", "libx264", "-preset", "ultrafast", "-crf", "4",
+        "-pix_fmt", "yuv420p",
+        path,
+    ])
+    return path
+
+
+def encode(reference, output_path, profile):
+    """Re-encode reference with profile; returns wall seconds."""
+    stream = ffmpeg.output(
+        ffmpeg.input(str(reference)).video,
+        str(output_path),
+        an=None,
+        pix_fmt="yuv420p",
+        **ffmpeg_output_options(profile),
+    ).overwrite_output()
+    started = time.perf_counter()
+    stream.run(cmd=get_ffmpeg_exe(), capture_stdout=True, capture_stderr=True)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encode fps and bitrate per encoding profile")
+    parser.add_argument("--clip", help="Reference clip (default: synthetic testsrc2 clip)")
+    parser.add_argument("--seconds", type=float, default=10, help="Length of the synthetic reference clip")
+    parser.add_argument("--profiles", nargs="+", choices=ENCODING_PROFILES, default=list(ENCODING_PROFILES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench-encoding-") as work_dir:
+        reference = args.clip or make_reference(Path(work_dir) / "reference.mp4", args.seconds)
+        info = probe_video(reference)
+        frames = info["duration"] * info["fps"]
+        print(f"Reference: {Path(reference).name} {info['width']}x{info['height']}@{info['fps']:g} "
+              f"{info['duration']:.1f}s, {encoder_threads()} encoder thread(s)")
+
+        print(f"{'profile':>8} | {'preset':>9} | {'crf':>3} | {'encode fps':>10} | {'kbit/s':>7} | {'size MB':>7}")
+        print("-" * 61)
+        for name in args.profiles:
+            output_path = Path(work_dir) / f"{name}.mp4"
+            seconds = encode(reference, output_path, name)
+            size = output_path.stat().st_size
+            settings = get_profile(name)
+            print(f"{name:>8} | {settings['preset']:>9} | {settings['crf']:>3} | {frames / seconds:>10.1f} | "
+                  f"{size * 8 / info['duration'] / 1000:>7.0f} | {size / 1024 / 1024:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Offline end-to-end benchmark of the four renderers.
+
+Everything runs locally on the CPU with no network access:
+
+  - synthetic stock clips (several resolutions and lengths), narration and
+    subtitle/script JSON are generated with ffmpeg test sources
+  - a local HTTP server stands in for the Pexels search and file download
+    endpoints (PEXELS_API_URL points at it)
+  - every cache (clip, sprite, segment, asset index, keyword, search, raw
+    video store) lives in the benchmark's work directory, so the first run
+    of a scenario is cold and later runs measure the warm path
+
+auto_generate_video, render_short_with_pexels, render_wizard_video and
+render_video are each timed end to end and per stage (render_metrics) for
+every backend. Results can be stored as a baseline and compared against
+later runs; scenarios that passed in the baseline but fail now, and stages
+or totals slower than --threshold times the baseline, are reported as
+regressions (exit status 1). A renderer that cannot be imported fails its
+scenarios like any other error.
+
+Usage:
+    python pipeline/benchmarks/bench_pipeline.py [--seconds 8] [--runs 2] [--backends ffmpeg moviepy]
+    python pipeline/benchmarks/bench_pipeline.py --save-baseline
+    python pipeline/benchmarks/bench_pipeline.py --compare [pipeline/benchmarks/baselines/<host>.json]
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+PIPELINE_DIR = Path(__file__).resolve().parents[1]
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+sys.path.insert(0, str(PIPELINE_DIR))
+os.environ['MOVIEPY_DOTENV'] = ''
+
+# name -> (width, height, seconds, ffmpeg video source)
+SYNTHETIC_CLIPS = {
+    "landscape-720p": (1280, 720, 6, "testsrc2"),
+    "portrait-1080p": (1080, 1920, 3, "testsrc2"),
+    "small-360p": (640, 360, 10, "smptebars"),
+    "square-720": (720, 720, 4, "rgbtestsrc"),
+}
+
+RENDERERS = ("auto", "pexels", "wizard", "video")
+
+# --- Synthetic media --------------------------------------------------------
+
+
+def make_media(work_dir, seconds, subtitle_count):
+    """Generate clips, narration, subtitles and a script under work_dir."""
+    from ffmpeg_tools import run_ffmpeg
+
+    assets_dir = work_dir / "assets"
+    assets_dir.mkdir(parents=True, exist_ok=True)
+    for name, (width, height, length, source) in SYNTHETIC_CLIPS.items():
+        run_ffmpeg([
+            "-f", "lavfi", "-i", f"{source}=size={width}x{height}:rate=30:duration={length}",
+            "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+            assets_dir / f"{name}.mp4",
+        ])
+
+    audio_path = work_dir / "narration.m4a"
+    run_ffmpeg([
+        "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=44100:duration={seconds}",
+        "-c:a", "aac", audio_path,
+    ])
+
+    step = seconds / subtitle_count
+    subtitles = [
+        {
+            "start": round(i * step, 3),
+            "end": round((i + 1) * step, 3),
+            "text": f"Synthetic caption {i + 1}: ocean waves and city lights",
+        }
+        for i in range(subtitle_count)
+    ]
+    script_path = work_dir / "bench-script.json"
+    script_path.write_text(json.dumps({
+        "id": "bench-video",
+        "topic": "Benchmark",
+        "bullets": ["Did you know?", "Oceans cover most of the planet.", "Follow for more!"],
+        "tags": ["landscape"],
+        "audioPath": str(audio_path),
+    }), encoding="utf-8")
+
+    return {
+        "assets_dir": assets_dir,
+        "clips": sorted(assets_dir.glob("*.mp4")),
+        "audio": audio_path,
+        "subtitles": subtitles,
+        "script": script_path,
+        "script_text": " ".join(sub["text"] for sub in subtitles),
+    }
+
+
+# --- Mock Pexels server -----------------------------------------------------
+
+
+def _mock_handler(clips, base_url):
+    class MockPexelsHandler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/videos/search":
+                query = parse_qs(url.query).get("query", [""])[0]
+                # Deterministic pick so a keyword always maps to the same clip
+                index = sum(map(ord, query)) % len(clips)
+                clip = clips[index]
+                width, height, length, _ = SYNTHETIC_CLIPS[clip.stem]
+                self._json({"videos": [{
+                    "id": 1000 + index,
+                    "url": f"{base_url()}/video/{clip.stem}",
+                    "duration": length,
+                    "width": width,
+                    "height": height,
+                    "video_files": [{
+                        "id": 1,
+                        "link": f"{base_url()}/files/{clip.name}",
+                        "file_type": "video/mp4",
+                        "quality": "hd",
+                        "width": width,
+                        "height": height,
+                        "fps": 30,
+                    }],
+                }]})
+            elif url.path.startswith("/files/"):
+                path = next((clip for clip in clips if clip.name == url.path.rsplit("/", 1)[1]), None)
+                if not path:
+                    self.send_error(404)
+                    return
+                data = path.read_bytes()
+                self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self.send_error(404)
+
+        def _json(self, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MockPexelsHandler
+
+
+def start_mock_pexels(clips):
+    """Serve search + downloads on a free localhost port; returns (server, base_url)."""
+    holder = {}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _mock_handler(clips, lambda: holder["url"]))
+    holder["url"] = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, holder["url"]
+
+
+def isolate_environment(work_dir, pexels_url):
+    """Point every cache and the Pexels client at the work directory (before any pipeline import)."""
+    cache_dir = work_dir / "cache"
+    os.environ.update({
+        "PEXELS_API_URL": pexels_url,
+        "PEXELS_API_KEY": "offline-benchmark",
+        "NO_PROXY": "127.0.0.1,localhost",
+        "RAW_VIDEOS_DIR": str(work_dir / "raw_videos"),
+        "PEXELS_CACHE_DB": str(cache_dir / "pexels_search.sqlite3"),
+        "CLIP_CACHE_DIR": str(cache_dir / "clips"),
+        "SUBTITLE_SPRITE_DIR": str(cache_dir / "subtitles"),
+        "SEGMENT_CACHE_DIR": str(cache_dir / "segments"),
+        "ASSET_INDEX_DIR": str(cache_dir / "assets"),
+        "KEYWORD_CACHE_DIR": str(cache_dir / "keywords"),
+        "RENDER_REPORT_DIR": str(work_dir / "reports"),
+    })
+
+
+# --- Scenarios --------------------------------------------------------------
+
+
+def _redirect_outputs(module, work_dir):
+    """Renderers write to pipeline/videos by module constant; keep benchmark output out of it."""
+    module.VIDEOS_DIR = work_dir / "videos"
+    if hasattr(module, "ASSETS_DIR"):
+        module.ASSETS_DIR = work_dir / "assets"
+    if isinstance(getattr(module, "RAW_VIDEOS_DIR", None), Path):
+        module.RAW_VIDEOS_DIR = work_dir / "raw_videos"
+
+
+def run_scenario(renderer, backend, media, work_dir, profile, job_id):
+    """Call one renderer in-process; returns nothing, raises on failure."""
+    if renderer == "auto":
+        import auto_video_generator as module
+        _redirect_outputs(module, work_dir)
+        module.auto_generate_video(
+            media["audio"], media["subtitles"], media["assets_dir"], job_id,
+            backend=backend, seed=1, profile=profile,
+        )
+    elif renderer == "pexels":
+        import pexels_video_generator as module
+        _redirect_outputs(module, work_dir)
+        module.render_short_with_pexels(
+            job_id, media["audio"], media["subtitles"], script_text=media["script_text"],
+            use_pexels=True, backend=backend, seed=1, profile=profile,
+        )
+    elif renderer == "wizard":
+        import wizard_video_renderer as module
+        _redirect_outputs(module, work_dir)
+        module.render_wizard_video(
+            [str(clip) for clip in media["clips"]], media["audio"], media["subtitles"], job_id,
+            backend=backend, profile=profile,
+        )
+    elif renderer == "video":
+        import video_renderer as module
+        _redirect_outputs(module, work_dir)
+        module.render_video(SimpleNamespace(
+            script=str(media["script"]), audio=str(media["audio"]), backend=backend, profile=profile,
+        ))
+
+
+def run_benchmarks(args, work_dir):
+    isolate_environment(work_dir, "http://127.0.0.1:9")  # replaced once the server is up
+
+    print(f"🧪 Generating synthetic media ({args.seconds:g}s narration, {args.subtitles} subtitles)...")
+    media = make_media(work_dir, args.seconds, args.subtitles)
+    server, pexels_url = start_mock_pexels(media["clips"])
+    isolate_environment(work_dir, pexels_url)
+    print(f"🌐 Mock Pexels server on {pexels_url}")
+
+    from render_metrics import render_job, report_path
+
+    results = []
+    try:
+        for renderer in args.renderers:
+            for backend in args.backends:
+                for run in range(1, args.runs + 1):
+                    key = f"{renderer}/{backend}/run{run}"
+                    job_id = f"bench-{renderer}-{backend}-{run}"
+                    print(f"\n⏱️  {key}")
+                    result = {"key": key, "renderer": renderer, "backend": backend, "run": run}
+                    try:
+                        with render_job(renderer, job_id):
+                            run_scenario(renderer, backend, media, work_dir, args.profile, job_id)
+                        report = json.loads(report_path(renderer, job_id).read_text(encoding="utf-8"))
+                        result.update(
+                            status="ok",
+                            seconds=report["seconds"],
+                            stages={name: entry["seconds"] for name, entry in report["stages"].items()},
+                            peak_rss_mb=report["peak_rss_mb"],
+                        )
+                    except Exception as e:
+                        traceback.print_exc()
+                        result.update(status="error", error=f"{type(e).__name__}: {e}")
+                    results.append(result)
+    finally:
+        server.shutdown()
+    return results
+
+
+# --- Baselines --------------------------------------------------------------
+
+
+def default_baseline_path():
+    return BASELINE_DIR / f"{socket.gethostname() or 'local'}.json"
+
+
+def compare(results, baseline, threshold):
+    """
+    Lines describing scenarios that stopped working and totals/stages that
+    got slower than threshold x baseline.
+    """
+    previous = {result["key"]: result for result in baseline["results"] if result.get("status") == "ok"}
+    regressions = []
+    for result in results:
+        before = previous.get(result["key"])
+        if not before:
+            continue
+        if result.get("status") != "ok":
+            regressions.append(f"{result['key']}: ok -> {result.get('status')} ({result.get('error', '')})")
+            continue
+        measured = [("total", result["seconds"], before["seconds"])]
+        measured += [
+            (name, seconds, before["stages"][name])
+            for name, seconds in result["stages"].items()
+            if name in before["stages"]
+        ]
+        for name, now, then in measured:
+            # Ignore sub-50 ms stages, where timer noise dominates
+            if then >= 0.05 and now > then * threshold:
+                regressions.append(f"{result['key']} {name}: {then:.2f}s -> {now:.2f}s ({now / then:.2f}x)")
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'scenario':<28} | {'status':>7} | {'total s':>7} | slowest stages")
+    print("-" * 90)
+    for result in results:
+        if result["status"] != "ok":
+            print(f"{result['key']:<28} | {result['status']:>7} | {'-':>7} | {result['error'][:45]}")
+            continue
+        slowest = sorted(result["stages"].items(), key=lambda item: -item[1])[:3]
+        stages = ", ".join(f"{name} {seconds:.2f}" for name, seconds in slowest)
+        print(f"{result['key']:<28} | {'ok':>7} | {result['seconds']:>7.2f} | {stages}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the video renderers")
+    parser.add_argument("--seconds", type=float, default=8, help="Narration length of the synthetic job")
+    parser.add_argument("--subtitles", type=int, default=4, help="Subtitle lines in the synthetic job")
+    parser.add_argument("--runs", type=int, default=2, help="Runs per scenario (run 1 is cold, later runs hit the caches)")
+    parser.add_argument("--renderers", nargs="+", choices=RENDERERS, default=list(RENDERERS))
+    parser.add_argument("--backends", nargs="+", choices=("ffmpeg", "moviepy"), default=["ffmpeg", "moviepy"])
+    parser.add_argument("--profile", default="upload", help="Encoding profile for every render")
+    parser.add_argument("--workdir", help="Keep media, caches, outputs and reports here instead of a temp dir")
+    parser.add_argument("--output", help="Also write the results JSON here")
+    parser.add_argument("--save-baseline", nargs="?", const=str(default_baseline_path()),
+                        help="Store results as a baseline (default: baselines/<hostname>.json)")
+    parser.add_argument("--compare", nargs="?", const=str(default_baseline_path()),
+                        help="Compare against a stored baseline (default: baselines/<hostname>.json)")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown factor reported as a regression")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    started = time.time()
+    if args.workdir:
+        work_dir = Path(args.workdir).resolve()
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results = run_benchmarks(args, work_dir)
+    else:
+        with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as tmp:
+            results = run_benchmarks(args, Path(tmp))
+
+    print_table(results)
+    payload = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "seconds": args.seconds, "subtitles": args.subtitles,
+            "runs": args.runs, "profile": args.profile,
+        },
+        "results": results,
+    }
+    print(f"\nBenchmark finished in {time.time() - started:.0f}s")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(payload, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        path = Path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+        print(f"💾 Baseline saved to {path}")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        if baseline.get("settings") != payload["settings"]:
+            print("⚠️  Baseline was recorded with different settings; comparing anyway")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) against the baseline (threshold {args.threshold:g}x):")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print(f"✓ No regressions over {args.threshold:g}x baseline ({args.compare})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Content-addressed cache of pre-normalized stock clips.
+
+Every renderer scales and crops stock footage to 1080x1920 before use. This
+module does that work once per (source content, target geometry) with ffmpeg
+and keeps the result on disk, so repeat renders that reuse the same clip
+library skip the scale/crop entirely. The cache is size-bounded with LRU
+eviction.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+from cache_utils import file_lock, file_sha256, load_json, save_json_atomic
+from ffmpeg_tools import run_ffmpeg
+from render_metrics import stage
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+CLIP_CACHE_DIR = Path(os.getenv("CLIP_CACHE_DIR", ROOT_DIR / "pipeline" / "cache" / "clips"))
+CLIP_CACHE_MAX_MB = int(os.getenv("CLIP_CACHE_MAX_MB", "4096"))
+
+TARGET_WIDTH = 1080
+TARGET_HEIGHT = 1920
+TARGET_FPS = 30
+
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = ".lock"
+
+
+def _index_lock():
+    """Serialize index updates between concurrent render processes."""
+    return file_lock(CLIP_CACHE_DIR / LOCK_FILENAME)
+
+
+def _load_index():
+    index = load_json(CLIP_CACHE_DIR / INDEX_FILENAME, dict)
+    index.setdefault("clips", {})
+    index.setdefault("hashes", {})
+    return index
+
+
+def _save_index(index):
+    save_json_atomic(CLIP_CACHE_DIR / INDEX_FILENAME, index)
+
+
+def _source_digest(source, index):
+    """
+    Hash the source file, reusing the stored digest while size and mtime
+    are unchanged so large clips are not re-read on every render.
+    """
+    stat = source.stat()
+    cached = index["hashes"].get(str(source))
+    if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime:
+        return cached["sha256"]
+
+    digest = file_sha256(source)
+    index["hashes"][str(source)] = {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sha256": digest,
+    }
+    return digest
+
+
+def source_sha256(video_path):
+    """
+    SHA-256 of a source clip through the same size/mtime-keyed digest cache
+    the clip cache uses, so callers that fingerprint sources (incremental
+    segment renders) do not re-read unchanged files.
+    """
+    source = Path(video_path).resolve()
+    with _index_lock():
+        index = _load_index()
+        known = dict(index["hashes"].get(str(source)) or {})
+        digest = _source_digest(source, index)
+        if index["hashes"][str(source)] != known:
+            _save_index(index)
+    return digest
+
+
+def cache_key(source_digest, width, height, fps):
+    return f"{source_digest[:32]}-{width}x{height}-{fps}fps"
+
+
+def _evict(index, keep_key):
+    """Drop least recently used entries until the cache fits CLIP_CACHE_MAX_MB."""
+    max_bytes = CLIP_CACHE_MAX_MB * 1024 * 1024
+    clips = index["clips"]
+    total = sum(entry["size"] for entry in clips.values())
+
+    for key in sorted(clips, key=lambda k: clips[k]["last_used"]):
+        if total <= max_bytes:
+            break
+        if key == keep_key:
+            continue
+        entry = clips.pop(key)
+        total -= entry["size"]
+        try:
+            (CLIP_CACHE_DIR / entry["file"]).unlink()
+        except FileNotFoundError:
+            pass
+        print(f"  🧹 Evicted cached clip: {entry['file']}")
+
+
+@stage("normalize")
+def normalize_clip(source_path, output_path, width=TARGET_WIDTH, height=TARGET_HEIGHT, fps=TARGET_FPS):
+    """
+    Scale to cover width x height, center-crop and resample to fps.
+    Audio is dropped; the renderers always replace it with the narration.
+    """
+    video_filter = (
+        f"scale={width}:{height}:force_original_aspect_ratio=increase,"
+        f"crop={width}:{height},fps={fps},setsar=1"
+    )
+    run_ffmpeg([
+        "-i", source_path,
+        "-an",
+        "-vf", video_filter,
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-crf", "18",
+        "-pix_fmt", "yuv420p",
+        "-movflags", "+faststart",
+        output_path,
+    ])
+
+
+def get_normalized_clip(video_path, width=TARGET_WIDTH, height=TARGET_HEIGHT, fps=TARGET_FPS):
+    """
+    Return the path of a normalized width x height / fps copy of video_path,
+    creating it on a cache miss.
+
+    Args:
+        video_path: Source stock video
+        width, height, fps: Target geometry
+
+    Returns:
+        Path string of the cached intermediate, or None if caching is
+        disabled (CLIP_CACHE_MAX_MB=0) or ffmpeg failed.
+    """
+    if CLIP_CACHE_MAX_MB <= 0:
+        return None
+
+    source = Path(video_path).resolve()
+
+    with _index_lock():
+        index = _load_index()
+        key = cache_key(_source_digest(source, index), width, height, fps)
+        filename = f"{key}.mp4"
+        cached_path = CLIP_CACHE_DIR / filename
+        entry = index["clips"].get(key)
+
+        if entry and cached_path.exists():
+            entry["last_used"] = time.time()
+            _save_index(index)
+            print(f"  ⚡ Clip cache hit: {source.name}")
+            return str(cached_path)
+        _save_index(index)
+
+    # Normalize outside the lock so other renders are not blocked
+    print(f"  🔧 Normalizing {source.name} to {width}x{height}@{fps}fps (cached for reuse)")
+    # Unique per process and thread: prefetch threads may normalize the same clip at once
+    tmp_path = CLIP_CACHE_DIR / f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.mp4"
+    try:
+        normalize_clip(source, tmp_path, width, height, fps)
+        os.replace(tmp_path, cached_path)
+    except Exception as e:
+        print(f"  ⚠️  Clip normalization failed, using in-memory resize: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return None
+
+    with _index_lock():
+        index = _load_index()
+        now = time.time()
+        index["clips"][key] = {
+            "file": filename,
+            "source": str(source),
+            "size": cached_path.stat().st_size,
+            "created": now,
+            "last_used": now,
+        }
+        _evict(index, keep_key=key)
+        _save_index(index)
+
+    return str(cached_path)
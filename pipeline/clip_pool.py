@@ -0,0 +1,214 @@
+"""
+Per-render pool of decoded stock clips (MoviePy backend).
+
+Opening a VideoFileClip starts an ffmpeg reader subprocess with its own frame
+buffer. The MoviePy renderers used to open one per subtitle segment, even when
+segments shared a source, and kept all of them alive until the end of the
+render. The pool opens each distinct source once, hands out lightweight
+subclips at different offsets that pull frames through it, and keeps at most
+CLIP_POOL_MAX_READERS readers open (least recently used ones are closed and
+transparently reopened if needed again).
+
+Looping is lazy in both cases: frame t of a subclip maps to
+(offset + t) mod source length, so a short source is never copied or
+concatenated to fill a long slot.
+
+sequence_clips joins same-size segments by picking the active segment with a
+binary search over start times, instead of compositing every frame onto a
+canvas as concatenate_videoclips(method="compose") does. With a transition,
+consecutive segments overlap and only the overlapping frames are blended
+(vectorized NumPy); every other frame passes through untouched.
+"""
+import os
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+
+os.environ['MOVIEPY_DOTENV'] = ''
+
+import numpy as np
+
+try:
+    from moviepy import VideoClip, concatenate_videoclips
+except ImportError:
+    from moviepy.editor import VideoClip, concatenate_videoclips
+
+from render_metrics import reader_closed, reader_opened, stage
+
+CLIP_POOL_MAX_READERS = int(os.getenv("CLIP_POOL_MAX_READERS", "2"))
+
+
+def _loop_length(duration, frame_step):
+    # Stay one frame clear of the end so the reader never runs past EOF
+    return max(duration - frame_step, frame_step)
+
+
+def _lazy_clip(frame_function, duration, size):
+    clip = VideoClip(duration=duration)
+    clip.frame_function = frame_function  # MoviePy 2.x
+    clip.make_frame = frame_function      # MoviePy 1.x
+    clip.size = size
+    return clip
+
+
+def looped_subclip(clip, duration, offset=0.0):
+    """
+    `duration` seconds of an open clip starting at `offset`, wrapping around
+    to the start of the clip whenever it runs out.
+    """
+    loop_length = _loop_length(clip.duration, 1.0 / (getattr(clip, "fps", None) or 30))
+    offset = offset % loop_length
+
+    def frame_function(t):
+        return clip.get_frame((offset + t) % loop_length)
+
+    return _lazy_clip(frame_function, duration, tuple(clip.size))
+
+
+def _crossfade(previous, current, progress):
+    blended = previous.astype(np.float32) * (1.0 - progress) + current.astype(np.float32) * progress
+    return blended.astype(np.uint8)
+
+
+def _dip_to_black(previous, current, progress):
+    # Fade out to black over the first half, fade in from black over the second
+    if progress < 0.5:
+        return (previous.astype(np.float32) * (1.0 - 2 * progress)).astype(np.uint8)
+    return (current.astype(np.float32) * (2 * progress - 1.0)).astype(np.uint8)
+
+
+def _slide(previous, current, progress):
+    # The new segment pushes the old one out to the left
+    width = previous.shape[1]
+    shift = int(round(width * progress))
+    frame = np.empty_like(previous)
+    frame[:, :width - shift] = previous[:, shift:]
+    frame[:, width - shift:] = current[:, :shift]
+    return frame
+
+
+BLENDS = {
+    "crossfade": _crossfade,
+    "dip-to-black": _dip_to_black,
+    "slide": _slide,
+}
+
+
+def sequence_clips(clips, transition=None, transition_duration=0.5):
+    """
+    Play clips back to back. When they all share one size and carry no mask,
+    frame t is read straight from the segment found by bisecting the start
+    times; otherwise this falls back to compose concatenation.
+
+    transition (one of BLENDS) overlaps consecutive clips by
+    transition_duration, so the result is shorter by that much per cut.
+    """
+    overlap = transition_duration if transition and len(clips) > 1 else 0.0
+    sizes = {tuple(clip.size) for clip in clips}
+    if len(sizes) != 1 or any(getattr(clip, "mask", None) is not None for clip in clips):
+        if overlap:
+            print(f"  ⚠️  Segments differ in size, joining without {transition} transitions")
+        return concatenate_videoclips(clips, method="compose")
+
+    blend = BLENDS[transition] if overlap else None
+    starts = []
+    position = 0.0
+    for clip in clips:
+        starts.append(position)
+        position += clip.duration - overlap
+    last = len(clips) - 1
+
+    def frame_function(t):
+        index = min(max(bisect_right(starts, t) - 1, 0), last)
+        local_t = t - starts[index]
+        if blend and index > 0 and local_t < overlap:
+            previous = clips[index - 1].get_frame(t - starts[index - 1])
+            return blend(previous, clips[index].get_frame(local_t), local_t / overlap)
+        return clips[index].get_frame(local_t)
+
+    return _lazy_clip(frame_function, position + overlap, sizes.pop())
+
+
+def _close_clip(clip):
+    reader_closed()
+    try:
+        clip.close()
+    except Exception:
+        pass
+
+
+def _reader(pool, source):
+    """Open (or reuse) the reader for source, closing LRU readers over the cap."""
+    readers = pool["readers"]
+    if source in readers:
+        readers.move_to_end(source)
+        return readers[source]
+
+    with stage("clip_decode"):
+        clip = pool["opener"](source)
+    reader_opened()
+    pool["opened"] += 1
+    readers[source] = clip
+    while len(readers) > pool["max_readers"]:
+        _, evicted = readers.popitem(last=False)
+        _close_clip(evicted)
+    return clip
+
+
+def _source_info(pool, source):
+    """Duration, size and frame step of source, probed on first use."""
+    info = pool["sources"].get(source)
+    if info is None:
+        clip = _reader(pool, source)
+        fps = getattr(clip, "fps", None) or 30
+        info = {"duration": clip.duration, "size": tuple(clip.size), "frame_step": 1.0 / fps}
+        pool["sources"][source] = info
+    return info
+
+
+def pool_subclip(pool, source, duration, offset=0.0):
+    """
+    A clip of `duration` seconds reading source from `offset`, looping the
+    source when it is shorter than needed. Frames are fetched through the
+    pool, so no reader is held by the subclip itself.
+    """
+    source = str(source)
+    info = _source_info(pool, source)
+    loop_length = _loop_length(info["duration"], info["frame_step"])
+    offset = offset % loop_length
+
+    def frame_function(t):
+        return _reader(pool, source).get_frame((offset + t) % loop_length)
+
+    return _lazy_clip(frame_function, duration, info["size"])
+
+
+def open_clip_pool(opener, max_readers=None):
+    """
+    Create a pool. opener(path) must return a clip already normalized to the
+    output geometry (the renderers pass their process_video_clip).
+    """
+    return {
+        "opener": opener,
+        "max_readers": max(1, max_readers or CLIP_POOL_MAX_READERS),
+        "readers": OrderedDict(),
+        "sources": {},
+        "opened": 0,
+    }
+
+
+def close_clip_pool(pool):
+    while pool["readers"]:
+        _, clip = pool["readers"].popitem(last=False)
+        _close_clip(clip)
+
+
+@contextmanager
+def clip_pool(opener, max_readers=None):
+    """Pool scoped to one render; every reader is closed on exit."""
+    pool = open_clip_pool(opener, max_readers)
+    try:
+        yield pool
+    finally:
+        close_clip_pool(pool)
+        print(f"  🎞️  Clip pool: {len(pool['sources'])} source(s), {pool['opened']} reader open(s)")
@@ -0,0 +1,81 @@
+"""
+Named x264 encoding profiles shared by every renderer.
+
+Each profile fixes the speed/size tradeoff of the final encode:
+
+    draft    ultrafast, CRF 28     previews and quick checks
+    upload   veryfast,  CRF 21     default; YouTube re-encodes every upload,
+                                   so slower presets buy nothing visible
+    archive  slow,      CRF 18     master copies kept locally
+
+Thread count is auto-detected from the CPU count (ENCODING_THREADS
+overrides it). Profiles are applied through write_videofile keyword
+arguments (MoviePy backend) or ffmpeg-python output options (ffmpeg
+backend). `python pipeline/benchmarks/bench_encoding.py` measures encode fps
+and output bitrate of every profile on a reference clip.
+"""
+import os
+
+ENCODING_PROFILES = {
+    "draft": {"preset": "ultrafast", "crf": 28, "tune": None, "x264_params": None},
+    "upload": {"preset": "veryfast", "crf": 21, "tune": None, "x264_params": None},
+    "archive": {"preset": "slow", "crf": 18, "tune": "film", "x264_params": "aq-mode=3"},
+}
+
+ENCODING_PROFILE = os.getenv("ENCODING_PROFILE", "upload")
+ENCODING_THREADS = int(os.getenv("ENCODING_THREADS", "0"))  # 0: one per CPU core
+
+
+def encoder_threads():
+    return ENCODING_THREADS or os.cpu_count() or 1
+
+
+def get_profile(name=None):
+    """
+    Settings of a named profile (ENCODING_PROFILE when name is None).
+
+    Raises:
+        ValueError: for an unknown profile name
+    """
+    name = name or ENCODING_PROFILE
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile: {name} (choose from {', '.join(ENCODING_PROFILES)})")
+    return {"name": name, **ENCODING_PROFILES[name]}
+
+
+def ffmpeg_output_options(profile=None, threads=None):
+    """x264 options of a profile as ffmpeg-python output keyword arguments."""
+    settings = get_profile(profile)
+    options = {
+        "vcodec": "libx264",
+        "preset": settings["preset"],
+        "crf": settings["crf"],
+        "threads": threads or encoder_threads(),
+    }
+    if settings["tune"]:
+        options["tune"] = settings["tune"]
+    if settings["x264_params"]:
+        options["x264-params"] = settings["x264_params"]
+    return options
+
+
+def moviepy_write_options(profile=None, threads=None):
+    """The same profile as write_videofile keyword arguments."""
+    settings = get_profile(profile)
+    ffmpeg_params = ["-crf", str(settings["crf"])]
+    if settings["tune"]:
+        ffmpeg_params += ["-tune", settings["tune"]]
+    if settings["x264_params"]:
+        ffmpeg_params += ["-x264-params", settings["x264_params"]]
+    return {
+        "codec": "libx264",
+        "preset": settings["preset"],
+        "threads": threads or encoder_threads(),
+        "ffmpeg_params": ffmpeg_params,
+    }
+
+
+def fingerprint_settings(profile=None):
+    """Everything of a profile that changes the encoded bytes (threads excluded)."""
+    settings = get_profile(profile)
+    return {key: settings[key] for key in ("name", "preset", "crf", "tune", "x264_params")}
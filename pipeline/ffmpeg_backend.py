@@ -0,0 +1,318 @@
+"""
+FFmpeg filter-graph render backend.
+
+The MoviePy path composites every 1080x1920 frame in Python/NumPy before it
+reaches libx264. This backend takes the same render described as a plan and
+compiles it into one ffmpeg filter graph run by a single ffmpeg process.
+
+Plan format (plain dict, built by the renderers):
+
+    {
+        "size": (1080, 1920),
+        "fps": 30,
+        "duration": 42.0,                        # output length (audio length)
+        "segments": [                            # background, played in order
+            {"source": "clip.mp4", "offset": 0.0, "duration": 3.2, "fit": "cover"},
+        ],
+        "overlays": [                            # RGBA images shown in a time window
+            {"image": "sub-0.png", "x": "center", "y": 1400, "start": 0.0, "end": 3.2},
+        ],
+        "audio": "voice.mp3",                    # None for a video-only output
+        "music": {"path": "music.mp3", "volume": 0.25},   # optional
+        "transition": {"type": "crossfade", "duration": 0.5},  # optional
+    }
+
+Segments loop their source when it is shorter than the slot. `fit` is
+"cover" (scale + center crop, the default) or "blur" (blurred full-frame
+background behind a narrower foreground, as in video_renderer.py).
+With a transition, consecutive segments overlap by its duration and are
+joined with ffmpeg's xfade filter instead of concat.
+"""
+import os
+from collections import Counter
+from pathlib import Path
+
+# Disable MoviePy's .env loading to avoid permission issues
+os.environ['MOVIEPY_DOTENV'] = ''
+
+import ffmpeg
+
+from encoding_profiles import ffmpeg_output_options
+from ffmpeg_tools import get_ffmpeg_exe
+from render_metrics import count, stage
+from subtitle_sprites import SUBTITLE_POSITION, prepare_sprites, scaled_position, scaled_style
+
+BACKENDS = ("moviepy", "ffmpeg")
+
+# Transition name -> ffmpeg xfade transition
+TRANSITIONS = {
+    "crossfade": "fade",
+    "dip-to-black": "fadeblack",
+    "slide": "slideleft",
+}
+
+OUTPUT_SIZE = (1080, 1920)
+OUTPUT_FPS = 30
+
+# Preview renders: smaller frame, lower rate, fastest encoding profile
+PREVIEW_SCALE = float(os.getenv("PREVIEW_SCALE", "0.5"))
+PREVIEW_FPS = int(os.getenv("PREVIEW_FPS", "15"))
+PREVIEW_PROFILE = "draft"
+
+
+def _position_expr(value, axis):
+    """Translate a MoviePy-style position ("center" or pixels) to an overlay expression."""
+    if value == "center":
+        return "(W-w)/2" if axis == "x" else "(H-h)/2"
+    return str(int(value))
+
+
+def _segment_stream(segment, size, fps):
+    """Build the trimmed, looped and scaled video stream for one segment."""
+    width, height = size
+    duration = float(segment["duration"])
+    stream = ffmpeg.input(
+        str(segment["source"]),
+        stream_loop=-1,
+        ss=float(segment.get("offset", 0.0)),
+        t=duration,
+    ).video
+
+    if segment.get("fit") == "blur":
+        parts = stream.split()
+        background = (
+            parts[0]
+            .filter("scale", width, height)
+            .filter("boxblur", 15)
+            .filter("colorchannelmixer", rr=0.6, gg=0.6, bb=0.6)
+        )
+        foreground = parts[1].filter("scale", width * 5 // 6, -2)
+        stream = ffmpeg.overlay(background, foreground, x="(W-w)/2", y="(H-h)/2")
+    else:
+        stream = (
+            stream
+            .filter("scale", width, height, force_original_aspect_ratio="increase")
+            .filter("crop", width, height)
+        )
+
+    return (
+        stream
+        .filter("fps", fps=fps)
+        .filter("setsar", 1)
+        .filter("format", "yuv420p")
+        .trim(duration=duration)
+        .setpts("PTS-STARTPTS")
+    )
+
+
+def _fan_out(keys, make_stream):
+    """
+    Build one stream per key. ffmpeg-python merges identical nodes, so keys
+    that repeat (same segment or same sprite) are built once and split.
+    """
+    counts = Counter(keys)
+    split_nodes = {}
+    used = Counter()
+    streams = []
+    for key in keys:
+        if counts[key] == 1:
+            streams.append(make_stream(key))
+            continue
+        if key not in split_nodes:
+            split_nodes[key] = make_stream(key).split()
+        streams.append(split_nodes[key][used[key]])
+        used[key] += 1
+    return streams
+
+
+def _segment_key(segment):
+    return (
+        str(segment["source"]),
+        float(segment.get("offset", 0.0)),
+        float(segment["duration"]),
+        segment.get("fit", "cover"),
+    )
+
+
+def _xfade_chain(streams, segments, transition, fps):
+    """Join segment streams with xfade; each one starts `duration` before the previous ends."""
+    duration = float(transition.get("duration", 0.5))
+    # xfade needs an explicit constant frame rate, which trim/setpts leave unset
+    streams = [stream.filter("fps", fps=fps) for stream in streams]
+    video = streams[0]
+    elapsed = float(segments[0]["duration"])
+    for stream, segment in zip(streams[1:], segments[1:]):
+        video = ffmpeg.filter(
+            [video, stream], "xfade",
+            transition=TRANSITIONS[transition["type"]],
+            duration=duration,
+            offset=round(elapsed - duration, 6),
+        )
+        elapsed += float(segment["duration"]) - duration
+    return video, elapsed
+
+
+def compile_plan(plan, output_path, profile=None, threads=None):
+    """
+    Compile a render plan into an ffmpeg-python output node, encoded with
+    the named encoding profile (ENCODING_PROFILE by default).
+
+    Returns:
+        ffmpeg-python OutputStream; call .get_args() to inspect or run_plan() to execute
+    """
+    if not plan.get("segments"):
+        raise ValueError("Render plan has no segments")
+
+    size = tuple(plan.get("size", (1080, 1920)))
+    fps = plan.get("fps", 30)
+    total_duration = float(plan["duration"])
+
+    segments_by_key = {_segment_key(seg): seg for seg in plan["segments"]}
+    streams = _fan_out(
+        [_segment_key(seg) for seg in plan["segments"]],
+        lambda key: _segment_stream(segments_by_key[key], size, fps),
+    )
+    transition = plan.get("transition")
+    if transition and len(streams) > 1:
+        video, covered = _xfade_chain(streams, plan["segments"], transition, fps)
+    else:
+        video = streams[0] if len(streams) == 1 else ffmpeg.concat(*streams, v=1, a=0)
+        covered = sum(float(seg["duration"]) for seg in plan["segments"])
+
+    # Hold the last frame if the segments are shorter than the audio
+    if covered < total_duration:
+        video = video.filter("tpad", stop_mode="clone", stop_duration=total_duration - covered)
+
+    overlays = plan.get("overlays", [])
+    images = _fan_out(
+        [str(overlay["image"]) for overlay in overlays],
+        lambda image_path: ffmpeg.input(image_path).video,
+    )
+    for overlay, image in zip(overlays, images):
+        video = ffmpeg.overlay(
+            video,
+            image,
+            x=_position_expr(overlay.get("x", "center"), "x"),
+            y=_position_expr(overlay.get("y", "center"), "y"),
+            enable=f"between(t,{float(overlay['start']):.3f},{float(overlay['end']):.3f})",
+        )
+
+    output_kwargs = {
+        **ffmpeg_output_options(profile, threads),
+        "r": fps,
+        "pix_fmt": "yuv420p",
+        "t": total_duration,
+        "movflags": "+faststart",
+    }
+
+    # Video-only output (e.g. parallel chunks that get the audio muxed later)
+    if not plan.get("audio"):
+        return ffmpeg.output(video, str(output_path), an=None, **output_kwargs).overwrite_output()
+
+    audio = ffmpeg.input(str(plan["audio"])).audio
+    music = plan.get("music")
+    if music:
+        music_stream = (
+            ffmpeg.input(str(music["path"]), stream_loop=-1)
+            .audio
+            .filter("volume", music.get("volume", 0.25))
+        )
+        audio = ffmpeg.filter(
+            [audio, music_stream], "amix",
+            inputs=2, duration="first", dropout_transition=0, normalize=0,
+        )
+
+    return ffmpeg.output(video, audio, str(output_path), acodec="aac", **output_kwargs).overwrite_output()
+
+
+def run_plan(plan, output_path, profile=None, threads=None):
+    """
+    Render a plan to output_path with a single ffmpeg process.
+
+    Raises:
+        RuntimeError: with ffmpeg's stderr if the render fails
+    """
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    stream = compile_plan(plan, output_path, profile=profile, threads=threads)
+    count("ffmpeg_processes")
+    try:
+        with stage("encode"):
+            stream.run(cmd=get_ffmpeg_exe(), capture_stdout=True, capture_stderr=True)
+    except ffmpeg.Error as e:
+        stderr = (e.stderr or b"").decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg render failed: {stderr[-2000:]}") from e
+    return str(output_path)
+
+
+def build_subtitle_overlays(subtitles, style=None, scale=1.0):
+    """
+    Turn subtitle dicts ({start, end, text}) into overlay entries backed by
+    cached sprites. Lines that fail to render are skipped, matching the MoviePy path.
+    scale < 1 rasterizes smaller sprites and moves them for a scaled-down frame.
+    """
+    sprites = prepare_sprites([sub['text'] for sub in subtitles], scaled_style(style, scale))
+    x, y = scaled_position(SUBTITLE_POSITION, scale)
+    return [
+        {
+            "image": sprites[sub['text']],
+            "x": x,
+            "y": y,
+            "start": float(sub['start']),
+            "end": float(sub['end']),
+        }
+        for sub in subtitles
+        if sub['text'] in sprites
+    ]
+
+
+def scaled_size(scale):
+    """Output frame size for scale, rounded to even dimensions for yuv420p."""
+    width, height = OUTPUT_SIZE
+    return (max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2))
+
+
+def render_subtitled_video(segments, subtitles, audio_path, duration, output_path,
+                           scale=1.0, fps=OUTPUT_FPS, profile=None, transition=None):
+    """
+    Shared ffmpeg path of the subtitle renderers: background segments,
+    one overlay per subtitle line and the narration track.
+    transition ({"type", "duration"}) overlaps consecutive segments.
+    """
+    print("Adding subtitles...")
+    overlays = build_subtitle_overlays(subtitles, scale=scale)
+    print(f"  ✓ {len(overlays)} subtitles created")
+
+    plan = {
+        "size": scaled_size(scale),
+        "fps": fps,
+        "duration": duration,
+        "segments": segments,
+        "overlays": overlays,
+        "audio": str(audio_path),
+        "transition": transition,
+    }
+    print("Rendering final video (ffmpeg backend)...")
+    run_plan(plan, output_path, profile=profile)
+
+    print(f"\n✓ Video saved to {output_path}")
+    return str(output_path)
+
+
+def preview_path(output_path):
+    """videos/<id>.mp4 -> videos/<id>-preview.mp4"""
+    output_path = Path(output_path)
+    return output_path.with_name(f"{output_path.stem}-preview{output_path.suffix}")
+
+
+def render_preview(segments, subtitles, audio_path, duration, output_path, transition=None):
+    """
+    Quick preview of a subtitle render: PREVIEW_SCALE frame, PREVIEW_FPS and
+    the draft encoding profile, with subtitles scaled to match. Written next to
+    output_path as <id>-preview.mp4.
+    """
+    width, height = scaled_size(PREVIEW_SCALE)
+    print(f"👀 Rendering preview at {width}x{height}@{PREVIEW_FPS}fps...")
+    return render_subtitled_video(
+        segments, subtitles, audio_path, duration, preview_path(output_path),
+        scale=PREVIEW_SCALE, fps=PREVIEW_FPS, profile=PREVIEW_PROFILE, transition=transition,
+    )
@@ -0,0 +1,108 @@
+"""
+Shared FFmpeg helpers for the Python render pipeline.
+Locates the ffmpeg binary MoviePy already uses, runs it as a subprocess and
+probes media files.
+"""
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+
+def get_ffmpeg_exe():
+    """
+    Return the ffmpeg executable used by the pipeline.
+
+    Order of preference: FFMPEG_BINARY env var, the imageio-ffmpeg binary
+    bundled with MoviePy, then `ffmpeg` on PATH.
+    """
+    env_binary = os.getenv("FFMPEG_BINARY", "")
+    if env_binary and env_binary not in ("ffmpeg-imageio", "auto-detect"):
+        return env_binary
+
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        pass
+
+    return shutil.which("ffmpeg") or "ffmpeg"
+
+
+def run_ffmpeg(args, quiet=True):
+    """
+    Run ffmpeg with the given argument list (without the binary itself).
+
+    Raises:
+        RuntimeError: if ffmpeg exits with a non-zero status
+    """
+    cmd = [get_ffmpeg_exe(), "-y", "-hide_banner"]
+    if quiet:
+        cmd += ["-loglevel", "error"]
+    cmd += [str(arg) for arg in args]
+
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {stderr[-2000:]}")
+    return result
+
+
+def probe_video(path):
+    """
+    Read duration, resolution, fps and video codec from the container header
+    without decoding. Audio-only files report 0x0 at 0 fps and codec None.
+
+    Returns:
+        {"duration": float, "width": int, "height": int, "fps": float, "codec": str | None}
+    """
+    from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+    infos = ffmpeg_parse_infos(str(path))
+    width, height = infos.get("video_size") or (0, 0)
+    return {
+        "duration": float(infos.get("duration") or 0.0),
+        "width": int(width),
+        "height": int(height),
+        "fps": float(infos.get("video_fps") or 0.0),
+        "codec": infos.get("video_codec_name"),
+    }
+
+
+def check_mp4_container(path):
+    """
+    Cheap integrity probe for MP4/MOV files: walk the top-level ISO BMFF
+    boxes without decoding. A truncated download leaves a box that runs past
+    end-of-file, and a file without `moov` cannot be opened by ffmpeg.
+
+    Returns:
+        True if the top-level boxes tile the file exactly and `moov` is present
+    """
+    path = Path(path)
+    try:
+        file_size = path.stat().st_size
+        seen = set()
+        offset = 0
+        with open(path, "rb") as f:
+            while offset < file_size:
+                f.seek(offset)
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                box_size = int.from_bytes(header[:4], "big")
+                box_type = header[4:8]
+                if box_size == 1:  # 64-bit largesize follows the type
+                    large = f.read(8)
+                    if len(large) < 8:
+                        return False
+                    box_size = int.from_bytes(large, "big")
+                elif box_size == 0:  # box extends to end of file
+                    box_size = file_size - offset
+                if box_size < 8 or offset + box_size > file_size:
+                    return False
+                seen.add(box_type)
+                offset += box_size
+    except OSError:
+        return False
+
+    return b"moov" in seen
@@ -0,0 +1,192 @@
+"""
+Pexels search keywords from a script (Turkish or English).
+
+Each subtitle line is a document: words are lower-cased, stripped of
+punctuation, numbers and TR/EN stopwords, and scored with TF-IDF. Lines only
+query words from the script's top PEXELS_MAX_QUERIES keywords (occurrences
+times IDF), so one script issues a small set of distinct searches and lines
+about the same thing share one download instead of each searching for its
+first two raw words.
+
+Plans are memoized per script ID under KEYWORD_CACHE_DIR and reused as long
+as the script and subtitle text are unchanged.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+
+from cache_utils import load_json, save_json_atomic
+from render_metrics import stage
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+KEYWORD_CACHE_DIR = Path(os.getenv("KEYWORD_CACHE_DIR", ROOT_DIR / "pipeline" / "cache" / "keywords"))
+PEXELS_MAX_QUERIES = int(os.getenv("PEXELS_MAX_QUERIES", "6"))
+
+DEFAULT_KEYWORDS = ["nature", "abstract", "city"]
+MIN_WORD_LENGTH = 3
+
+STOPWORDS_TR = {
+    "acaba", "ama", "ancak", "artık", "aslında", "az", "bana", "bazen", "bazı", "belki", "ben",
+    "beni", "benim", "beri", "bile", "bir", "biraz", "biri", "birkaç", "birçok", "birşey",
+    "biz", "bize", "bizi", "bizim", "bu", "buna", "bunda", "bundan", "bunlar", "bunları",
+    "bunların", "bunu", "bunun", "burada", "böyle", "da", "daha", "dahi", "de", "defa", "değil",
+    "diye", "diğer", "dolayı", "en", "gerçekten", "gibi", "göre", "hala", "halde", "hangi",
+    "hatta", "hem", "hep", "hepsi", "her", "herkes", "hiç", "hiçbir", "ile", "ilk", "ise",
+    "için", "işte", "kadar", "kendi", "kez", "ki", "kim", "kimi", "mi", "mu", "mü", "mı",
+    "nasıl", "ne", "neden", "nedir", "nerede", "niye", "niçin", "o", "olan", "olarak", "oldu",
+    "olduğu", "olduğunu", "olmak", "olur", "ona", "ondan", "onlar", "onları", "onların", "onu",
+    "onun", "sadece", "sen", "seni", "senin", "siz", "sizin", "sonra", "tüm", "var", "ve",
+    "veya", "ya", "yani", "yine", "yok", "yüzden", "zaten", "çok", "çünkü", "önce", "öyle",
+    "üzere", "şekilde", "şey", "şimdi", "şu", "şöyle",
+}
+
+STOPWORDS_EN = {
+    "about", "after", "again", "all", "also", "and", "any", "are", "because", "been", "before",
+    "being", "but", "can", "could", "course", "did", "does", "doing", "down", "during", "each",
+    "even", "every", "few", "first", "for", "from", "further", "get", "going", "got", "had",
+    "has", "have", "her", "here", "hers", "him", "his", "how", "into", "its", "just", "kind",
+    "know", "let", "like", "look", "lot", "made", "make", "many", "more", "most", "much",
+    "must", "need", "not", "now", "off", "once", "one", "only", "other", "our", "out", "over",
+    "own", "really", "said", "same", "say", "see", "she", "should", "since", "some", "still",
+    "such", "than", "that", "the", "their", "them", "then", "there", "these", "they", "thing",
+    "things", "think", "this", "those", "through", "too", "under", "until", "very", "want",
+    "was", "way", "well", "were", "what", "when", "where", "which", "while", "who", "whom",
+    "why", "will", "with", "would", "yes", "you", "your", "yours",
+}
+
+STOPWORDS = STOPWORDS_TR | STOPWORDS_EN
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+
+# In-process memo: script ID -> (fingerprint, plan)
+_memo = {}
+
+
+def tokenize(text):
+    """Content words of text: lower-cased, punctuation/numbers and stopwords removed."""
+    # str.lower() turns Turkish 'İ' into 'i' + combining dot
+    text = str(text).replace("İ", "i").lower()
+    return [
+        word for word in _WORD_RE.findall(text)
+        if len(word) >= MIN_WORD_LENGTH and word not in STOPWORDS
+    ]
+
+
+def tfidf_scores(documents):
+    """
+    One {word: score} dict per tokenized document, scored as
+    term frequency times smoothed inverse document frequency.
+    """
+    document_frequency = Counter(word for words in documents for word in set(words))
+    count = len(documents)
+    scores = []
+    for words in documents:
+        term_frequency = Counter(words)
+        scores.append({
+            word: (freq / len(words)) * (math.log((1 + count) / (1 + document_frequency[word])) + 1)
+            for word, freq in term_frequency.items()
+        })
+    return scores
+
+
+def keyword_weights(documents):
+    """
+    Script-level weight of every word: occurrences across all documents
+    times smoothed inverse document frequency.
+    """
+    document_frequency = Counter(word for words in documents for word in set(words))
+    occurrences = Counter(word for words in documents for word in words)
+    count = len(documents)
+    return {
+        word: freq * (math.log((1 + count) / (1 + document_frequency[word])) + 1)
+        for word, freq in occurrences.items()
+    }
+
+
+def rank_keywords(documents, limit):
+    """Words of the whole script by weight, highest first (first occurrence breaks ties)."""
+    weights = keyword_weights(documents)
+    first_seen = {}
+    for words in documents:
+        for word in words:
+            first_seen.setdefault(word, len(first_seen))
+    return sorted(weights, key=lambda word: (-weights[word], first_seen[word]))[:limit]
+
+
+def extract_keywords(script_text, limit=10):
+    """Top script keywords, one document per sentence; DEFAULT_KEYWORDS when nothing is left."""
+    sentences = [tokenize(sentence) for sentence in re.split(r"[.!?\n]+", script_text or "")]
+    keywords = rank_keywords([words for words in sentences if words], limit)
+    return keywords or list(DEFAULT_KEYWORDS)
+
+
+def plan_queries(subtitles, script_text="", max_queries=None):
+    """
+    Pick one (primary, fallback) search per subtitle.
+
+    The primary query is the line's word among the script's top keywords
+    with the best line TF-IDF times script weight, so specific words win
+    within a line and shared words are reused across lines. Lines without
+    one take the keywords in turn. The fallback is the next keyword, so the
+    whole plan stays within max_queries terms.
+
+    Returns:
+        {"keywords": [...], "queries": [(primary, fallback), ...]}
+    """
+    max_queries = max(1, max_queries or PEXELS_MAX_QUERIES)
+    lines = [tokenize(sub.get("text", "")) for sub in subtitles]
+    script_words = [words for words in lines if words]
+    if script_text:
+        script_words += [tokenize(sentence) for sentence in re.split(r"[.!?\n]+", script_text)]
+        script_words = [words for words in script_words if words]
+
+    weights = keyword_weights(script_words)
+    keywords = rank_keywords(script_words, max_queries) or list(DEFAULT_KEYWORDS)
+    line_scores = tfidf_scores([words or [""] for words in lines])
+
+    queries = []
+    for i, scores in enumerate(line_scores):
+        candidates = [word for word in keywords if word in scores]
+        if candidates:
+            primary = max(candidates, key=lambda word: scores[word] * weights[word])
+        else:
+            primary = keywords[i % len(keywords)]
+        fallback = keywords[(keywords.index(primary) + 1) % len(keywords)]
+        queries.append((primary, fallback if fallback != primary else None))
+    return {"keywords": keywords, "queries": queries}
+
+
+def _fingerprint(subtitles, script_text, max_queries):
+    payload = json.dumps(
+        [script_text or "", [sub.get("text", "") for sub in subtitles], max_queries],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@stage("keywords")
+def cached_query_plan(script_id, subtitles, script_text="", max_queries=None):
+    """
+    plan_queries memoized per script ID (in process and on disk); the plan
+    is recomputed when the script or subtitle text changes.
+    """
+    max_queries = max(1, max_queries or PEXELS_MAX_QUERIES)
+    fingerprint = _fingerprint(subtitles, script_text, max_queries)
+    memo = _memo.get(script_id)
+    if memo and memo[0] == fingerprint:
+        return memo[1]
+
+    cache_path = KEYWORD_CACHE_DIR / f"{hashlib.sha1(str(script_id).encode('utf-8')).hexdigest()[:16]}.json"
+    cached = load_json(cache_path, dict)
+    if cached.get("fingerprint") == fingerprint:
+        plan = {"keywords": cached["keywords"], "queries": [tuple(query) for query in cached["queries"]]}
+        print(f"  ♻️  Reusing keyword plan for {script_id}")
+    else:
+        plan = plan_queries(subtitles, script_text, max_queries)
+        save_json_atomic(cache_path, {"script_id": script_id, "fingerprint": fingerprint, **plan})
+    _memo[script_id] = (fingerprint, plan)
+    return plan
@@ -0,0 +1,119 @@
+"""
+Persistent cache of Pexels search responses.
+
+Responses are stored in SQLite keyed by normalized query + orientation, with
+a TTL for hits and a shorter one for empty results (negative caching), so a
+retried render repeats no searches and "No videos found" queries are not
+re-sent on every run. Hit/miss counters are kept per process and persisted.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+PEXELS_CACHE_DB = Path(os.getenv("PEXELS_CACHE_DB", ROOT_DIR / "pipeline" / "cache" / "pexels_search.sqlite3"))
+PEXELS_SEARCH_TTL_HOURS = float(os.getenv("PEXELS_SEARCH_TTL_HOURS", "168"))
+PEXELS_NEGATIVE_TTL_HOURS = float(os.getenv("PEXELS_NEGATIVE_TTL_HOURS", "24"))
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+
+def normalize_query(query):
+    """Lowercase and collapse whitespace so 'Ocean  Waves' and 'ocean waves' share an entry."""
+    return " ".join(str(query).lower().split())
+
+
+@contextmanager
+def _connection():
+    """Short-lived connection per operation; safe across prefetch threads and processes."""
+    conn = _connect()
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _connect():
+    PEXELS_CACHE_DB.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(PEXELS_CACHE_DB), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS searches (
+            query TEXT NOT NULL,
+            orientation TEXT NOT NULL,
+            response TEXT NOT NULL,
+            is_empty INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            PRIMARY KEY (query, orientation)
+        )
+        """
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+    return conn
+
+
+def _count(conn, name):
+    with _stats_lock:
+        _stats[name] += 1
+    conn.execute(
+        "INSERT INTO counters (name, value) VALUES (?, 1) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,),
+    )
+
+
+def get(query, orientation="portrait"):
+    """
+    Return the cached search response dict, or None on a miss / expired entry.
+    An empty result ({"videos": []}) is a valid (negative) hit.
+    """
+    key = normalize_query(query)
+    with _connection() as conn:
+        row = conn.execute(
+            "SELECT response, is_empty, fetched_at FROM searches WHERE query = ? AND orientation = ?",
+            (key, orientation),
+        ).fetchone()
+
+        if row:
+            response, is_empty, fetched_at = row
+            ttl_hours = PEXELS_NEGATIVE_TTL_HOURS if is_empty else PEXELS_SEARCH_TTL_HOURS
+            if time.time() - fetched_at <= ttl_hours * 3600:
+                _count(conn, "negative_hits" if is_empty else "hits")
+                return json.loads(response)
+
+        _count(conn, "misses")
+        return None
+
+
+def put(query, response, orientation="portrait"):
+    """Store a successful search response (empty results included)."""
+    key = normalize_query(query)
+    is_empty = not response.get("videos")
+    with _connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO searches (query, orientation, response, is_empty, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, orientation, json.dumps(response), int(is_empty), time.time()),
+        )
+
+
+def stats(persistent=False):
+    """
+    Hit/miss counters for this process, or the all-time totals with persistent=True.
+    """
+    if not persistent:
+        with _stats_lock:
+            return dict(_stats)
+
+    totals = {name: 0 for name in _stats}
+    with _connection() as conn:
+        for name, value in conn.execute("SELECT name, value FROM counters"):
+            totals[name] = value
+    return totals
@@ -1,54 +1,228 @@
 import os
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 
 # Disable MoviePy's .env loading to avoid sandbox issues
 os.environ['MOVIEPY_DOTENV'] = ''
 
 try:
     from dotenv import load_dotenv
-    # Load environment variables (may fail in sandbox)
+    # Load environment variables (may fail in sandbox); before the cache/store
+    # modules below, which read their settings at import
     load_dotenv()
 except Exception as e:
     print(f"Warning: Could not load .env file: {e}")
 
+import pexels_search_cache
+import raw_video_store
+from ffmpeg_tools import check_mp4_container
+from render_metrics import count, stage
+
 PEXELS_API_KEY = os.getenv("PEXELS_API_KEY", "")
+PEXELS_API_URL = os.getenv("PEXELS_API_URL", "https://api.pexels.com").rstrip("/")
+PEXELS_MAX_CONCURRENCY = int(os.getenv("PEXELS_MAX_CONCURRENCY", "4"))
 RAW_VIDEOS_DIR = os.getenv("RAW_VIDEOS_DIR", "./pipeline/raw_videos")
 
 # Pexels API headers
 HEADERS = {"Authorization": PEXELS_API_KEY}
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = int(os.getenv("PEXELS_DOWNLOAD_RETRIES", "3"))
+
+# Rendition selection: min-cover (smallest file covering the target), exact, max
+RENDITION_POLICIES = ("min-cover", "exact", "max")
+PEXELS_RENDITION_POLICY = os.getenv("PEXELS_RENDITION_POLICY", "min-cover")
+TARGET_SIZE = (1080, 1920)
+TARGET_FPS = 30
+
+_session = None
 
-def fetch_video_for_keyword(keyword, output_dir=None):
+
+def get_session():
+    """
+    Shared requests.Session so searches and downloads reuse pooled
+    keep-alive connections instead of opening one per request.
+    """
+    global _session
+    if _session is None:
+        pool_size = max(PEXELS_MAX_CONCURRENCY, 1) * 2
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        _session = requests.Session()
+        _session.mount("http://", adapter)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def select_rendition(video_files, policy=None, target_size=TARGET_SIZE, target_fps=TARGET_FPS):
+    """
+    Pick which Pexels rendition to download.
+    
+    Policies:
+        min-cover: smallest rendition that still covers target_size after a
+                   cover-scale (no upscaling), preferring fps >= target_fps and
+                   smaller files; falls back to the largest if none covers
+        exact:     a rendition with exactly target_size, else min-cover
+        max:       the highest resolution (previous behavior)
+    
+    Args:
+        video_files: The "video_files" list of a Pexels video
+        policy: One of RENDITION_POLICIES (default: PEXELS_RENDITION_POLICY)
+    
+    Returns:
+        The chosen video_files entry, or None if the list is empty
+    """
+    policy = policy or PEXELS_RENDITION_POLICY
+    if policy not in RENDITION_POLICIES:
+        print(f"⚠️  Unknown rendition policy '{policy}', using min-cover")
+        policy = "min-cover"
+    
+    candidates = [vf for vf in video_files if vf.get("link")]
+    mp4_files = [vf for vf in candidates if vf.get("file_type", "video/mp4") == "video/mp4"]
+    candidates = mp4_files or candidates
+    
+    # Portrait renditions first; size is chosen below
+    portrait_files = [vf for vf in candidates if (vf.get("width") or 0) < (vf.get("height") or 0)]
+    candidates = portrait_files or candidates
+    if not candidates:
+        return None
+    
+    def pixels(vf):
+        return (vf.get("width") or 0) * (vf.get("height") or 0)
+    
+    if policy == "max":
+        return max(candidates, key=pixels)
+    
+    target_width, target_height = target_size
+    if policy == "exact":
+        exact = [vf for vf in candidates if (vf.get("width"), vf.get("height")) == (target_width, target_height)]
+        if exact:
+            candidates = exact
+    
+    def fps_cost(vf):
+        fps = vf.get("fps") or 0
+        if not fps:
+            return 0
+        # Dropping below the output rate costs more than decoding extra frames
+        return (target_fps - fps) * 2 if fps < target_fps else fps - target_fps
+    
+    covering = [
+        vf for vf in candidates
+        if (vf.get("width") or 0) >= target_width and (vf.get("height") or 0) >= target_height
+    ]
+    if not covering:
+        return max(candidates, key=lambda vf: (pixels(vf), -fps_cost(vf)))
+    return min(covering, key=lambda vf: (pixels(vf), fps_cost(vf), vf.get("size") or 0))
+
+
+def _total_from_content_range(content_range):
+    """Total size from a 'bytes start-end/total' header, or None if unknown."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+@stage("pexels_download")
+def download_file(session, url, part_path, show_progress=True):
+    """
+    Download url into part_path, resuming an earlier partial download with an
+    HTTP Range request and retrying interrupted transfers.
+    
+    Returns:
+        True once the file size matches the length reported by the server
+    """
+    part_path = Path(part_path)
+    
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        offset = part_path.stat().st_size if part_path.exists() else 0
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=60) as response:
+                if response.status_code == 416:
+                    # Nothing left to fetch if the partial file is already complete
+                    if _total_from_content_range(response.headers.get("content-range")) == offset:
+                        return True
+                    part_path.unlink(missing_ok=True)
+                    continue
+                response.raise_for_status()
+                
+                content_length = int(response.headers.get("content-length", 0))
+                if offset and response.status_code == 206:
+                    print(f"   Resuming download at {offset / 1024 / 1024:.1f} MB")
+                    mode = "ab"
+                    total_size = _total_from_content_range(response.headers.get("content-range"))
+                    if total_size is None and content_length:
+                        total_size = offset + content_length
+                else:
+                    # Server ignored the Range header: start over
+                    mode = "wb"
+                    offset = 0
+                    total_size = content_length or None
+                
+                downloaded = offset
+                with open(part_path, mode) as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            downloaded += len(chunk)
+                            if show_progress and total_size:
+                                progress = (downloaded / total_size) * 100
+                                print(f"\r   Progress: {progress:.1f}%", end="")
+            
+            size = part_path.stat().st_size
+            if total_size is None or size == total_size:
+                return True
+            print(f"\n⚠️  Incomplete download ({size}/{total_size} bytes), attempt {attempt}/{DOWNLOAD_RETRIES}")
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            print(f"\n⚠️  Download interrupted ({e}), attempt {attempt}/{DOWNLOAD_RETRIES}")
+        
+        if attempt < DOWNLOAD_RETRIES:
+            time.sleep(min(2 ** attempt, 10))
+    
+    return False
+
+
+def fetch_video_for_keyword(keyword, output_dir=None, show_progress=True):
     """
     Fetch a vertical (portrait) video from Pexels API for given keyword.
-    Downloads to RAW_VIDEOS_DIR if not already exists.
+    Downloads into the content-addressed store under RAW_VIDEOS_DIR unless
+    the keyword (or the Pexels video it resolves to) is already stored.
     
     Args:
         keyword: Search keyword (e.g., "science", "technology", "space")
         output_dir: Optional custom output directory
+        show_progress: Print per-chunk download progress (off for concurrent prefetch)
     
     Returns:
         Path to downloaded video file, or None if failed
     """
-    if not PEXELS_API_KEY or PEXELS_API_KEY == "your_pexels_api_key_here":
-        print("⚠️  PEXELS_API_KEY not configured in .env file")
-        return None
-    
     # Create output directory
     video_dir = Path(output_dir) if output_dir else Path(RAW_VIDEOS_DIR)
     video_dir.mkdir(parents=True, exist_ok=True)
     
-    # Check if video already exists
-    filename = f"{keyword.replace(' ', '_').replace('/', '_')}.mp4"
-    filepath = video_dir / filename
+    # Check if this keyword already resolved to a stored video
+    stored_path = raw_video_store.lookup_alias(keyword, video_dir)
+    if stored_path:
+        print(f"✓ Video already exists: {stored_path}")
+        return stored_path
     
-    if filepath.exists():
-        print(f"✓ Video already exists: {filepath}")
-        return str(filepath)
+    # Keyword-named downloads from before the content-addressed store
+    legacy_path = video_dir / f"{keyword.replace(' ', '_').replace('/', '_')}.mp4"
+    if legacy_path.exists():
+        if check_mp4_container(legacy_path):
+            print(f"✓ Video already exists: {legacy_path}")
+            return str(legacy_path)
+        print(f"⚠️  Discarding truncated video: {legacy_path}")
+        legacy_path.unlink()
     
     # Search Pexels API
-    search_url = f"https://api.pexels.com/videos/search"
+    search_url = f"{PEXELS_API_URL}/videos/search"
     params = {
         "query": keyword,
         "per_page": 5,  # Get multiple results
@@ -56,49 +230,61 @@ def fetch_video_for_keyword(keyword, output_dir=None):
     }
     
     try:
-        print(f"🔍 Searching Pexels for: {keyword}")
-        response = requests.get(search_url, headers=HEADERS, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        session = get_session()
+        data = pexels_search_cache.get(keyword, params["orientation"])
+        if data is not None:
+            print(f"⚡ Search cache hit for: {keyword}")
+        elif not PEXELS_API_KEY or PEXELS_API_KEY == "your_pexels_api_key_here":
+            print("⚠️  PEXELS_API_KEY not configured in .env file")
+            return None
+        else:
+            print(f"🔍 Searching Pexels for: {keyword}")
+            count("pexels_searches")
+            with stage("pexels_search"):
+                response = session.get(search_url, headers=HEADERS, params=params, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+            pexels_search_cache.put(keyword, data, params["orientation"])
         
         if not data.get("videos") or len(data["videos"]) == 0:
             print(f"⚠️  No videos found for keyword: {keyword}")
             return None
         
-        # Find best quality video file (prefer HD)
+        # Pick the cheapest rendition that still covers 1080x1920
         video = data["videos"][0]
-        video_files = video.get("video_files", [])
-        
-        # Sort by quality - prefer HD portrait videos
-        portrait_files = [vf for vf in video_files if vf.get("width", 0) < vf.get("height", 0)]
-        if not portrait_files:
-            portrait_files = video_files
-        
-        # Get highest quality
-        best_video = max(portrait_files, key=lambda x: x.get("width", 0) * x.get("height", 0))
+        best_video = select_rendition(video.get("video_files", []))
+        if not best_video:
+            print(f"⚠️  No downloadable files for keyword: {keyword}")
+            return None
         video_url = best_video["link"]
+        asset_id = raw_video_store.asset_id_for(video, best_video)
         
-        print(f"⬇️  Downloading video: {video['url']}")
-        print(f"   Resolution: {best_video.get('width')}x{best_video.get('height')}")
-        
-        # Download video
-        video_response = requests.get(video_url, stream=True, timeout=60)
-        video_response.raise_for_status()
-        
-        total_size = int(video_response.headers.get('content-length', 0))
-        downloaded = 0
-        
-        with open(filepath, "wb") as f:
-            for chunk in video_response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    if total_size > 0:
-                        progress = (downloaded / total_size) * 100
-                        print(f"\r   Progress: {progress:.1f}%", end="")
+        # Another keyword may already have downloaded this exact rendition
+        with raw_video_store.asset_lock(asset_id, video_dir):
+            stored_path = raw_video_store.get_asset(asset_id, keyword, video_dir)
+            if stored_path:
+                print(f"♻️  Reusing stored video {asset_id} for: {keyword}")
+                return stored_path
+            
+            print(f"⬇️  Downloading video: {video['url']}")
+            print(f"   Resolution: {best_video.get('width')}x{best_video.get('height')}")
+            
+            # Download into a .part file; it is only renamed into the store once verified
+            part_path = raw_video_store.object_path(asset_id, video_dir).with_suffix(".part")
+            part_path.parent.mkdir(parents=True, exist_ok=True)
+            if not download_file(session, video_url, part_path, show_progress):
+                print(f"\n❌ Download incomplete, partial file kept for resume: {part_path}")
+                return None
+            
+            if not check_mp4_container(part_path):
+                print(f"\n❌ Downloaded file is not a valid video container: {video_url}")
+                part_path.unlink(missing_ok=True)
+                return None
+            
+            filepath = raw_video_store.admit(asset_id, part_path, keyword, video.get('url'), video_dir)
         
         print(f"\n✅ Video downloaded: {filepath}")
-        return str(filepath)
+        return filepath
         
     except requests.RequestException as e:
         print(f"❌ Error fetching video: {e}")
@@ -133,26 +319,60 @@ def create_placeholder_video(output_path, duration=5):
         return None
 
 
-def fetch_multiple_videos(keywords, output_dir=None):
+@stage("pexels_prefetch")
+def prefetch_videos(keywords, output_dir=None, max_workers=None):
     """
-    Fetch multiple videos for a list of keywords.
+    Resolve and download videos for all keywords up front, concurrently.
+    Duplicate keywords are fetched once; searches and downloads share the
+    pooled session and run at most max_workers at a time.
     
     Args:
-        keywords: List of keywords
+        keywords: Iterable of keywords (falsy entries are ignored)
         output_dir: Optional custom output directory
+        max_workers: Concurrency limit (default: PEXELS_MAX_CONCURRENCY)
     
     Returns:
-        Dictionary mapping keywords to video paths
+        Dictionary mapping each distinct keyword to a video path (or None)
     """
-    results = {}
+    unique_keywords = list(dict.fromkeys(k for k in keywords if k))
+    if not unique_keywords:
+        return {}
+    
+    max_workers = max(1, min(max_workers or PEXELS_MAX_CONCURRENCY, len(unique_keywords)))
+    print(f"📦 Prefetching {len(unique_keywords)} Pexels keyword(s) with {max_workers} worker(s)...")
     
-    for keyword in keywords:
-        video_path = fetch_video_for_keyword(keyword, output_dir)
-        results[keyword] = video_path
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = executor.map(
+            lambda keyword: fetch_video_for_keyword(keyword, output_dir, show_progress=False),
+            unique_keywords,
+        )
+        results = dict(zip(unique_keywords, paths))
     
+    found = sum(1 for path in results.values() if path)
+    cache_stats = pexels_search_cache.stats()
+    print(f"✓ Prefetch complete: {found}/{len(unique_keywords)} keyword(s) resolved")
+    print(
+        f"  Search cache: {cache_stats['hits']} hit(s), "
+        f"{cache_stats['negative_hits']} negative hit(s), {cache_stats['misses']} miss(es)"
+    )
     return results
 
 
+def fetch_multiple_videos(keywords, output_dir=None, max_workers=None):
+    """
+    Fetch multiple videos for a list of keywords.
+    
+    Args:
+        keywords: List of keywords
+        output_dir: Optional custom output directory
+        max_workers: Concurrent downloads (default: PEXELS_MAX_CONCURRENCY)
+    
+    Returns:
+        Dictionary mapping keywords to video paths
+    """
+    return prefetch_videos(keywords, output_dir, max_workers=max_workers)
+
+
 if __name__ == "__main__":
     # Test the fetcher
     import sys
@@ -11,12 +11,30 @@ from pathlib import Path
 # Disable MoviePy's .env loading BEFORE importing anything else
 os.environ['MOVIEPY_DOTENV'] = ''
 
-from pexels_video_fetcher import fetch_video_for_keyword, create_placeholder_video
+try:
+    from dotenv import load_dotenv
+    # Load .env before the pipeline modules read their settings at import
+    load_dotenv()
+except Exception as e:
+    print(f"Warning: Could not load .env file: {e}")
+
+from asset_index import choose_clip, list_assets
+from clip_cache import get_normalized_clip
+from clip_pool import clip_pool, pool_subclip, sequence_clips
+from encoding_profiles import ENCODING_PROFILE, ENCODING_PROFILES, moviepy_write_options
+from ffmpeg_backend import BACKENDS, render_preview, render_subtitled_video
+from keyword_extractor import cached_query_plan, extract_keywords
+from render_metrics import render_job, stage
+from render_worker import submit_job
+from segment_renderer import render_segments_parallel
+from subtitle_sprites import apply_subtitle_track
+from word_captions import CAPTION_MODE, CAPTION_MODES, build_caption_track
+from pexels_video_fetcher import create_placeholder_video, prefetch_videos
 
 try:
-    from moviepy import AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips
+    from moviepy import AudioFileClip, VideoFileClip
 except ImportError:
-    from moviepy.editor import AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips
+    from moviepy.editor import AudioFileClip, VideoFileClip
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 VIDEOS_DIR = ROOT_DIR / "pipeline" / "videos"
@@ -24,7 +42,11 @@ RAW_VIDEOS_DIR = ROOT_DIR / "pipeline" / "raw_videos"
 
 
 def process_video_clip(video_path):
-    """Process a single video: resize, crop to 1080x1920"""
+    """Process a single video: resize, crop to 1080x1920 (served from clip cache when possible)"""
+    cached_path = get_normalized_clip(video_path)
+    if cached_path:
+        return VideoFileClip(cached_path, audio=False)
+    
     video_clip = VideoFileClip(str(video_path))
     
     try:
@@ -56,16 +78,13 @@ def process_video_clip(video_path):
 
 
 def extract_keywords_from_script(script_text):
-    """Extract potential keywords from script for Pexels search"""
-    # Simple keyword extraction - you can improve this
-    words = script_text.lower().split()
-    # Filter common words
-    common_words = {'bir', 've', 'ile', 'için', 'bu', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at'}
-    keywords = [w for w in words if len(w) > 3 and w not in common_words]
-    return keywords[:10] if keywords else ['nature', 'abstract', 'city']
+    """Extract potential keywords from script for Pexels search (TF-IDF, TR/EN stopwords)"""
+    return extract_keywords(script_text)
 
 
-def render_short_with_pexels(video_id, audio_path, subtitles, script_text="", use_pexels=True):
+def render_short_with_pexels(video_id, audio_path, subtitles, script_text="", use_pexels=True, backend="moviepy",
+                             parallel=False, workers=None, chunk_size=1, preview=False, seed=None,
+                             profile=None, captions=None):
     """
     Render video using Pexels API or local stock videos.
     
@@ -75,7 +94,15 @@ def render_short_with_pexels(video_id, audio_path, subtitles, script_text="", us
         subtitles: List of subtitle dicts
         script_text: Full script text for keyword extraction
         use_pexels: If True, fetch from Pexels. If False, use local assets
+        backend: "moviepy" (default) or "ffmpeg" for a single filter-graph render
+        parallel: Encode chunks of chunk_size segments on `workers` processes
+            (ffmpeg backend per chunk) and join them by stream copy
+        preview: Write a fast low-resolution <video_id>-preview.mp4 instead
+        seed: Random seed for local asset picks (preview and full render match)
+        profile: Encoding profile (draft, upload, archive; default ENCODING_PROFILE)
+        captions: "line" or "word" (karaoke highlight; MoviePy backend only, default CAPTION_MODE)
     """
+    rng = random.Random(seed)
     audio_clip = AudioFileClip(str(audio_path))
     total_duration = audio_clip.duration
     
@@ -85,46 +112,51 @@ def render_short_with_pexels(video_id, audio_path, subtitles, script_text="", us
     print(f"Use Pexels: {use_pexels}")
     print("="*30)
     
-    # Extract keywords for Pexels search
-    if use_pexels and script_text:
-        keywords = extract_keywords_from_script(script_text)
-        print(f"Extracted keywords: {keywords}")
+    # Batch prefetch: one TF-IDF query per subtitle, deduplicated across the
+    # script (memoized per video ID), resolved before rendering
+    search_plan = []
+    fetched = {}
+    if use_pexels:
+        query_plan = cached_query_plan(video_id, subtitles, script_text)
+        search_plan = query_plan["queries"]
+        distinct = sorted({primary for primary, _ in search_plan})
+        print(f"Extracted keywords: {query_plan['keywords']}")
+        print(f"  {len(distinct)} distinct search(es) for {len(search_plan)} subtitles")
+        
+        fetched = prefetch_videos(distinct)
+        # If Pexels fails, try with general keywords
+        retry_keywords = [
+            fallback for primary, fallback in search_plan
+            if not fetched.get(primary) and fallback and fallback not in fetched
+        ]
+        if retry_keywords:
+            print(f"  Retrying with keywords: {retry_keywords}")
+            fetched.update(prefetch_videos(retry_keywords))
     
-    # Create video segments for each subtitle
-    video_segments = []
-    used_videos = []
+    # Resolve a source video for each subtitle
+    segment_sources = []
     last_successful_video_path = None  # Track last successful video to avoid black screens
+    local_assets = None  # assets/ index, loaded on the first fallback
     
     for i, sub in enumerate(subtitles):
         start = float(sub['start'])
         end = float(sub['end'])
         segment_duration = end - start
-        text = sub.get('text', '')
         
         video_path = None
         
         if use_pexels:
-            # Try to fetch from Pexels using subtitle text or keywords
-            search_keyword = text.split()[:2]  # Use first 2 words
-            search_keyword = ' '.join(search_keyword) if search_keyword else keywords[i % len(keywords)]
-            
-            print(f"\n  Subtitle {i+1}/{len(subtitles)}: Searching Pexels for '{search_keyword}'")
-            video_path = fetch_video_for_keyword(search_keyword)
-            
-            # If Pexels fails, try with general keywords
-            if not video_path and keywords:
-                keyword = keywords[i % len(keywords)]
-                print(f"  Retrying with keyword: {keyword}")
-                video_path = fetch_video_for_keyword(keyword)
+            search_keyword, fallback_keyword = search_plan[i]
+            video_path = fetched.get(search_keyword) or fetched.get(fallback_keyword)
+            print(f"\n  Subtitle {i+1}/{len(subtitles)}: Pexels '{search_keyword}' -> {video_path or 'not found'}")
         
         # Fallback to local assets if Pexels fails or disabled
         if not video_path:
-            assets_dir = ROOT_DIR / "assets"
-            if assets_dir.exists():
-                stock_videos = list(assets_dir.glob("*.mp4")) + list(assets_dir.glob("*.mov"))
-                if stock_videos:
-                    video_path = str(random.choice(stock_videos))
-                    print(f"  Using local asset: {Path(video_path).name}")
+            if local_assets is None:
+                local_assets = list_assets(ROOT_DIR / "assets", "video", {".mp4", ".mov"})
+            if local_assets:
+                video_path = str(choose_clip(local_assets, rng, min_duration=segment_duration)["path"])
+                print(f"  Using local asset: {Path(video_path).name}")
         
         # If still no video, use previous successful video to avoid black screen
         if not video_path and last_successful_video_path:
@@ -150,93 +182,73 @@ def render_short_with_pexels(video_id, audio_path, subtitles, script_text="", us
         if video_path and video_path != str(RAW_VIDEOS_DIR / "placeholder.mp4"):
             last_successful_video_path = video_path
         
-        # Process the video
         if not video_path or not Path(video_path).exists():
             raise FileNotFoundError(f"Video file not found: {video_path}")
         
-        clip = process_video_clip(video_path)
-        used_videos.append(clip)
-        
-        # Loop if needed
-        if clip.duration < segment_duration:
-            loops_needed = int(segment_duration / clip.duration) + 1
-            clip = concatenate_videoclips([clip] * loops_needed)
-        
-        # Extract segment
-        segment = clip.with_start(0).with_duration(segment_duration)
-        video_segments.append(segment)
-        print(f"  ✓ Segment {i+1}: {segment_duration:.2f}s")
-    
-    # Concatenate all segments
-    print("\n🎬 Merging video segments...")
-    final_video_bg = concatenate_videoclips(video_segments, method="compose")
-    final_video_bg = final_video_bg.with_duration(total_duration)
+        segment_sources.append((video_path, segment_duration))
     
-    # Add subtitles
-    print("📝 Adding Turkish subtitles...")
-    subtitle_clips = []
-    for sub in subtitles:
-        try:
-            start = float(sub['start'])
-            end = float(sub['end'])
-            text = sub['text']
-            
-            txt_clip = TextClip(
-                text=text,
-                font_size=55,
-                color='white',
-                font='/System/Library/Fonts/Supplemental/Arial Bold.ttf',
-                stroke_color='black',
-                stroke_width=3,
-                method='caption',
-                text_align='center',
-                size=(950, 300),
+    if backend == "ffmpeg" or parallel or preview:
+        if (captions or CAPTION_MODE) == "word":
+            print("⚠️  Word captions need the MoviePy backend; rendering line captions")
+        audio_clip.close()
+        segments = [
+            {"source": str(path), "offset": 0.0, "duration": duration}
+            for path, duration in segment_sources
+        ]
+        VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+        output_path = VIDEOS_DIR / f"{video_id}.mp4"
+        if preview:
+            return render_preview(segments, subtitles, audio_path, total_duration, output_path)
+        if parallel:
+            return render_segments_parallel(
+                segments, subtitles, audio_path, total_duration, output_path,
+                workers=workers, chunk_size=chunk_size, profile=profile,
             )
-            
-            txt_clip = (
-                txt_clip
-                .with_position(('center', 1400))
-                .with_start(start)
-                .with_duration(end - start)
-            )
-            subtitle_clips.append(txt_clip)
-        except Exception as e:
-            print(f"  Warning: Failed to create subtitle: {e}")
-            continue
-    
-    print(f"  ✓ {len(subtitle_clips)} subtitles created")
+        return render_subtitled_video(segments, subtitles, audio_path, total_duration, output_path,
+                                      profile=profile)
     
-    # Composite
-    if subtitle_clips:
-        final_video = CompositeVideoClip([final_video_bg, *subtitle_clips], size=(1080, 1920))
-    else:
-        final_video = final_video_bg
-    
-    # Add audio
-    print("🎵 Adding audio...")
-    final_video = final_video.with_audio(audio_clip)
-    
-    # Render
-    print("🎥 Rendering final video...")
     VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
     output_path = VIDEOS_DIR / f"{video_id}.mp4"
     
-    final_video.write_videofile(
-        str(output_path),
-        codec="libx264",
-        audio_codec="aac",
-        fps=30,
-        preset="medium",
-        threads=4,
-    )
-    
-    # Cleanup
-    final_video.close()
-    for clip in used_videos:
-        try:
-            clip.close()
-        except:
-            pass
+    # Each distinct source is decoded by one pooled reader shared by its segments
+    with clip_pool(process_video_clip) as pool:
+        video_segments = []
+        for i, (video_path, segment_duration) in enumerate(segment_sources):
+            # Loops the source if it is shorter than the segment
+            segment = pool_subclip(pool, video_path, segment_duration)
+            video_segments.append(segment)
+            print(f"  ✓ Segment {i+1}: {segment_duration:.2f}s")
+        
+        # Concatenate all segments
+        print("\n🎬 Merging video segments...")
+        final_video_bg = sequence_clips(video_segments)
+        final_video_bg = final_video_bg.with_duration(total_duration)
+        
+        # Add subtitles
+        print("📝 Adding Turkish subtitles...")
+        subtitle_track = build_caption_track(subtitles, final_video_bg.size, captions)
+        
+        print(f"  ✓ {subtitle_track['lines']} subtitles created")
+        
+        # Composite (one track clip; only the active cue is blended per frame)
+        final_video = apply_subtitle_track(final_video_bg, subtitle_track)
+        
+        # Add audio
+        print("🎵 Adding audio...")
+        final_video = final_video.with_audio(audio_clip)
+        
+        # Render
+        print("🎥 Rendering final video...")
+        with stage("compose_encode"):
+            final_video.write_videofile(
+                str(output_path),
+                audio_codec="aac",
+                fps=30,
+                **moviepy_write_options(profile),
+            )
+        
+        # Cleanup
+        final_video.close()
     audio_clip.close()
     
     print(f"\n✅ Video saved to {output_path}")
@@ -251,6 +263,16 @@ def parse_args():
     parser.add_argument("--script", default="", help="Full script text for keywords")
     parser.add_argument("--use-pexels", action="store_true", help="Fetch videos from Pexels API")
     parser.add_argument("--local-only", action="store_true", help="Use only local assets")
+    parser.add_argument("--backend", choices=BACKENDS, default="moviepy", help="Render backend (ffmpeg skips MoviePy frame compositing)")
+    parser.add_argument("--parallel", action="store_true", help="Render segment chunks on a process pool and join by stream copy")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=1, help="Subtitle segments per parallel chunk")
+    parser.add_argument("--preview", action="store_true", help="Render a quick low-resolution preview (<id>-preview.mp4) instead of the full video")
+    parser.add_argument("--profile", choices=ENCODING_PROFILES, default=ENCODING_PROFILE, help="Encoding profile: draft, upload or archive")
+    parser.add_argument("--captions", choices=CAPTION_MODES, default=CAPTION_MODE, help="Caption style: whole lines, or word-by-word karaoke highlight (MoviePy backend)")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for clip selection (same seed -> same clips, e.g. preview and full render)")
+    parser.add_argument("--cprofile", action="store_true", help="Also run the render under cProfile and save <report>.prof next to the timing report")
+    parser.add_argument("--worker", action="store_true", help="Submit the job to a running render_worker.py instead of rendering in-process")
     return parser.parse_args()
 
 
@@ -262,13 +284,27 @@ def main():
     
     use_pexels = args.use_pexels and not args.local_only
     
-    render_short_with_pexels(
-        video_id=args.output_id,
-        audio_path=args.audio,
-        subtitles=subtitles,
-        script_text=args.script,
-        use_pexels=use_pexels
-    )
+    params = {
+        "video_id": args.output_id,
+        "audio_path": str(Path(args.audio).resolve()),
+        "subtitles": subtitles,
+        "script_text": args.script,
+        "use_pexels": use_pexels,
+        "backend": args.backend,
+        "parallel": args.parallel,
+        "workers": args.workers,
+        "chunk_size": args.chunk_size,
+        "preview": args.preview,
+        "seed": args.seed,
+        "profile": args.profile,
+        "captions": args.captions,
+    }
+    if args.worker:
+        submit_job("pexels", params)
+    else:
+        job_id = f"{args.output_id}-preview" if args.preview else args.output_id
+        with render_job("pexels", job_id, cprofile=args.cprofile):
+            render_short_with_pexels(**params)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+"""
+Content-addressed store for downloaded stock videos.
+
+Files live under RAW_VIDEOS_DIR/objects and are keyed by Pexels asset ID
+(video + rendition). Keywords are only aliases pointing at an asset, so two
+keywords that resolve to the same Pexels video share one download, and a
+second copy with identical bytes under another ID is collapsed by SHA-256.
+The store has a total-size quota (RAW_VIDEOS_MAX_MB) enforced by LRU GC.
+Assets resolved within the last RAW_VIDEOS_GC_GRACE_MINUTES are never
+evicted, since another render (worker process, batch job) may still be
+reading them.
+"""
+import os
+import time
+from pathlib import Path
+
+from cache_utils import file_lock, file_sha256, load_json, save_json_atomic
+
+RAW_VIDEOS_DIR = os.getenv("RAW_VIDEOS_DIR", "./pipeline/raw_videos")
+RAW_VIDEOS_MAX_MB = int(os.getenv("RAW_VIDEOS_MAX_MB", "10240"))
+RAW_VIDEOS_GC_GRACE_MINUTES = float(os.getenv("RAW_VIDEOS_GC_GRACE_MINUTES", "60"))
+
+OBJECTS_DIRNAME = "objects"
+INDEX_FILENAME = "store.json"
+LOCK_FILENAME = ".store.lock"
+
+
+def normalize_alias(keyword):
+    return " ".join(str(keyword).lower().split())
+
+
+def asset_id_for(video, video_file):
+    """Stable ID of one Pexels rendition: video ID plus file ID (or its resolution)."""
+    file_part = video_file.get("id") or f"{video_file.get('width')}x{video_file.get('height')}"
+    return f"pexels-{video.get('id')}-{file_part}"
+
+
+def asset_lock(asset_id, root_dir=None):
+    """
+    Lock one asset across threads and processes so concurrent fetches that
+    resolve to the same video wait for a single (resumable) download.
+    """
+    objects_dir, _, _ = _store_paths(root_dir)
+    return file_lock(objects_dir / f"{asset_id}.lock")
+
+
+def _store_paths(root_dir=None):
+    root = Path(root_dir or RAW_VIDEOS_DIR)
+    return root / OBJECTS_DIRNAME, root / INDEX_FILENAME, root / LOCK_FILENAME
+
+
+def _load_index(index_path):
+    index = load_json(index_path, dict)
+    index.setdefault("assets", {})
+    index.setdefault("aliases", {})
+    return index
+
+
+def object_path(asset_id, root_dir=None):
+    objects_dir, _, _ = _store_paths(root_dir)
+    return objects_dir / f"{asset_id}.mp4"
+
+
+def _resolve(index, objects_dir, asset_id):
+    """Return the stored file for asset_id, dropping stale entries."""
+    entry = index["assets"].get(asset_id)
+    if not entry:
+        return None
+    path = objects_dir / entry["file"]
+    if not path.exists():
+        index["assets"].pop(asset_id, None)
+        return None
+    entry["last_used"] = time.time()
+    return path
+
+
+def lookup_alias(keyword, root_dir=None):
+    """Path of the asset a keyword was previously resolved to, if still stored."""
+    objects_dir, index_path, lock_path = _store_paths(root_dir)
+    with file_lock(lock_path):
+        index = _load_index(index_path)
+        asset_id = index["aliases"].get(normalize_alias(keyword))
+        path = _resolve(index, objects_dir, asset_id) if asset_id else None
+        save_json_atomic(index_path, index)
+    return str(path) if path else None
+
+
+def get_asset(asset_id, keyword=None, root_dir=None):
+    """Path of a stored asset (aliasing keyword to it), or None."""
+    objects_dir, index_path, lock_path = _store_paths(root_dir)
+    with file_lock(lock_path):
+        index = _load_index(index_path)
+        path = _resolve(index, objects_dir, asset_id)
+        if path and keyword:
+            index["aliases"][normalize_alias(keyword)] = asset_id
+        save_json_atomic(index_path, index)
+    return str(path) if path else None
+
+
+def admit(asset_id, downloaded_path, keyword=None, source_url=None, root_dir=None):
+    """
+    Move a finished download into the store and alias keyword to it.
+    If identical bytes are already stored under another ID, the new file
+    is discarded and the existing asset is reused.
+
+    Returns:
+        Path string of the stored asset
+    """
+    objects_dir, index_path, lock_path = _store_paths(root_dir)
+    downloaded_path = Path(downloaded_path)
+    digest = file_sha256(downloaded_path)
+    objects_dir.mkdir(parents=True, exist_ok=True)
+
+    with file_lock(lock_path):
+        index = _load_index(index_path)
+        duplicate_id = next(
+            (aid for aid, entry in index["assets"].items()
+             if entry.get("sha256") == digest and (objects_dir / entry["file"]).exists()),
+            None,
+        )
+
+        now = time.time()
+        if duplicate_id:
+            downloaded_path.unlink(missing_ok=True)
+            stored_id = duplicate_id
+            print(f"  ♻️  Identical video already stored as {duplicate_id}")
+        else:
+            stored_id = asset_id
+            target = objects_dir / f"{asset_id}.mp4"
+            os.replace(downloaded_path, target)
+            index["assets"][asset_id] = {
+                "file": target.name,
+                "size": target.stat().st_size,
+                "sha256": digest,
+                "source": source_url,
+                "created": now,
+            }
+
+        index["assets"][stored_id]["last_used"] = now
+        if keyword:
+            index["aliases"][normalize_alias(keyword)] = stored_id
+        _gc(index, objects_dir, keep_id=stored_id)
+        save_json_atomic(index_path, index)
+
+    return str(objects_dir / index["assets"][stored_id]["file"])
+
+
+def _gc(index, objects_dir, keep_id=None):
+    """
+    Evict least recently used assets until the store fits RAW_VIDEOS_MAX_MB,
+    keeping keep_id and anything resolved within the grace window.
+    """
+    if RAW_VIDEOS_MAX_MB <= 0:
+        return
+    max_bytes = RAW_VIDEOS_MAX_MB * 1024 * 1024
+    in_use_since = time.time() - RAW_VIDEOS_GC_GRACE_MINUTES * 60
+    assets = index["assets"]
+    total = sum(entry["size"] for entry in assets.values())
+
+    for asset_id in sorted(assets, key=lambda aid: assets[aid].get("last_used", 0)):
+        if total <= max_bytes:
+            break
+        if asset_id == keep_id or assets[asset_id].get("last_used", 0) >= in_use_since:
+            continue
+        entry = assets.pop(asset_id)
+        total -= entry["size"]
+        (objects_dir / entry["file"]).unlink(missing_ok=True)
+        print(f"  🧹 Evicted raw video: {entry['file']}")
+
+    index["aliases"] = {
+        alias: aid for alias, aid in index["aliases"].items() if aid in assets
+    }
+
+
+def gc(root_dir=None):
+    """Run garbage collection against the current quota."""
+    objects_dir, index_path, lock_path = _store_paths(root_dir)
+    with file_lock(lock_path):
+        index = _load_index(index_path)
+        _gc(index, objects_dir)
+        save_json_atomic(index_path, index)
@@ -0,0 +1,197 @@
+"""
+Per-job timing and resource instrumentation for the renderers.
+
+Stages are wrapped with `stage("name")` (context manager or decorator) and
+accumulate wall time and call count for the current job. Stages run from
+several threads at once (Pexels prefetch) add up their time, so a stage
+can exceed the job's wall time. Counters and peak gauges record things like
+searches, downloads and the number of ffmpeg readers open at once.
+
+`render_job(renderer, job_id)` scopes one job and writes a JSON report to
+RENDER_REPORT_DIR when it ends (also on failure):
+
+    {
+        "job": "topic-123", "renderer": "wizard", "status": "done",
+        "seconds": 41.2,
+        "stages": {"subtitles": {"seconds": 0.8, "calls": 1}, "encode": {...}},
+        "counters": {"ffmpeg_readers_opened": 3, ...},
+        "peaks": {"ffmpeg_readers_open": 2, ...},
+        "peak_rss_mb": 812.4,             # this process during the job (Linux)
+        "peak_rss_growth_mb": 96.0,       # how far the process lifetime peak rose
+        "children_peak_rss_mb": 301.0,    # largest ffmpeg child of this job
+    }
+
+getrusage's ru_maxrss is a lifetime high-water mark, so on its own it says
+nothing about one job in a long-lived worker. On Linux the job start resets
+the peak (VmHWM, through /proc/self/clear_refs) and "peak_rss_mb" is the
+job's own peak; elsewhere it is null and only the growth is known.
+"children_peak_rss_mb" is null unless a child finished during the job
+outgrew every earlier one.
+
+With cprofile=True the job also runs under cProfile and the stats are saved
+next to the report as <report>.prof (open with `python -m pstats`).
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from cache_utils import save_json_atomic
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage
+    resource = None
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+RENDER_REPORT_DIR = Path(os.getenv("RENDER_REPORT_DIR", ROOT_DIR / "pipeline" / "reports"))
+
+_lock = threading.Lock()
+_job = {"stages": {}, "counters": {}, "peaks": {}, "gauges": {}, "rss": {}}
+
+
+def _reset():
+    with _lock:
+        for key in ("stages", "counters", "peaks", "gauges"):
+            _job[key] = {}
+        _job["rss"] = {
+            "job_peak": _reset_peak_rss(),
+            "self": _maxrss_mb(resource.RUSAGE_SELF) if resource else None,
+            "children": _maxrss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        }
+
+
+@contextmanager
+def stage(name):
+    """Time a block (or, as a decorator, every call of a function) under name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            entry = _job["stages"].setdefault(name, {"seconds": 0.0, "calls": 0})
+            entry["seconds"] += elapsed
+            entry["calls"] += 1
+
+
+def count(name, amount=1):
+    with _lock:
+        _job["counters"][name] = _job["counters"].get(name, 0) + amount
+
+
+def gauge(name, delta):
+    """Move a level (e.g. open readers) up or down and remember its peak."""
+    with _lock:
+        value = _job["gauges"].get(name, 0) + delta
+        _job["gauges"][name] = value
+        _job["peaks"][name] = max(_job["peaks"].get(name, 0), value)
+
+
+def reader_opened():
+    count("ffmpeg_readers_opened")
+    gauge("ffmpeg_readers_open", 1)
+
+
+def reader_closed():
+    gauge("ffmpeg_readers_open", -1)
+
+
+def _maxrss_mb(who):
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _reset_peak_rss():
+    """Reset this process's VmHWM to its current RSS (Linux); False where unsupported."""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def _vmhwm_mb():
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _rss():
+    baseline = _job["rss"]
+    peak_self = _maxrss_mb(resource.RUSAGE_SELF) if resource else None
+    peak_children = _maxrss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    return {
+        "peak_rss_mb": _vmhwm_mb() if baseline.get("job_peak") else None,
+        "peak_rss_growth_mb": (
+            round(peak_self - baseline["self"], 1)
+            if peak_self is not None and baseline.get("self") is not None else None
+        ),
+        "children_peak_rss_mb": (
+            peak_children
+            if peak_children is not None and peak_children > (baseline.get("children") or 0) else None
+        ),
+    }
+
+
+def snapshot():
+    """Current job's measurements as a JSON-ready dict."""
+    with _lock:
+        return {
+            "stages": {
+                name: {"seconds": round(entry["seconds"], 3), "calls": entry["calls"]}
+                for name, entry in _job["stages"].items()
+            },
+            "counters": dict(_job["counters"]),
+            "peaks": dict(_job["peaks"]),
+            **_rss(),
+        }
+
+
+def report_path(renderer, job_id):
+    return RENDER_REPORT_DIR / f"{job_id}-{renderer}.json"
+
+
+@contextmanager
+def render_job(renderer, job_id, cprofile=False):
+    """
+    Measure one render job and write its report (and cProfile stats when
+    cprofile=True) when the block exits.
+    """
+    _reset()
+    profiler = cProfile.Profile() if cprofile else None
+    started = time.perf_counter()
+    status = "failed"
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+        status = "done"
+    finally:
+        if profiler:
+            profiler.disable()
+        report = {
+            "job": job_id,
+            "renderer": renderer,
+            "status": status,
+            "seconds": round(time.perf_counter() - started, 3),
+            **snapshot(),
+        }
+        path = report_path(renderer, job_id)
+        save_json_atomic(path, report)
+        if profiler:
+            profiler.dump_stats(str(path.with_suffix(".prof")))
+            print(f"🔬 cProfile stats: {path.with_suffix('.prof')}")
+        slowest = sorted(report["stages"].items(), key=lambda item: -item[1]["seconds"])[:3]
+        summary = ", ".join(f"{name} {entry['seconds']:.1f}s" for name, entry in slowest)
+        print(f"📊 {renderer} job {job_id}: {report['seconds']:.1f}s ({summary}), report: {path}")
@@ -0,0 +1,346 @@
+"""
+Long-running render worker.
+
+Keeps a pool of Python processes with MoviePy, NumPy, ffmpeg discovery and the
+renderer modules already imported, and accepts render jobs over a local TCP
+socket, so the dashboard does not pay a cold interpreter start per request and
+several renders can run side by side without blocking the API.
+
+Protocol: the client sends one JSON line and reads JSON lines back.
+
+    {"op": "render", "renderer": "wizard" | "auto" | "pexels", "params": {...}}
+        -> {"event": "accepted", "job": ...}
+           {"event": "progress", "job": ..., "message": ...}   (one per log line)
+           {"event": "done", "job": ..., "output": ...} | {"event": "error", "job": ..., "error": ...}
+    {"op": "status"} -> {"event": "status", "jobs": [...]}
+    {"op": "ping"}   -> {"event": "pong"}
+
+params are the keyword arguments of the renderer function (see RENDERERS).
+
+Usage:
+    python pipeline/render_worker.py [--processes 2] [--port 8790]
+    python pipeline/render_worker.py --status
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from dotenv import load_dotenv
+    # Same .env as the dashboard, so both sides agree on host and port
+    load_dotenv()
+except Exception as e:
+    print(f"Warning: Could not load .env file: {e}")
+
+from render_metrics import render_job
+
+RENDER_WORKER_HOST = os.getenv("RENDER_WORKER_HOST", "127.0.0.1")
+RENDER_WORKER_PORT = int(os.getenv("RENDER_WORKER_PORT", "8790"))
+RENDER_WORKER_PROCESSES = int(os.getenv("RENDER_WORKER_PROCESSES", "2"))
+
+# renderer name -> (module, function); params are passed as keyword arguments
+RENDERERS = {
+    "wizard": ("wizard_video_renderer", "render_wizard_video"),
+    "auto": ("auto_video_generator", "auto_generate_video"),
+    "pexels": ("pexels_video_generator", "render_short_with_pexels"),
+}
+
+# --- Client -----------------------------------------------------------------
+
+
+def _request(message, host=None, port=None, timeout=None):
+    sock = socket.create_connection((host or RENDER_WORKER_HOST, port or RENDER_WORKER_PORT), timeout=timeout)
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+    return sock
+
+
+def worker_available(host=None, port=None):
+    """True if a render worker answers on host:port."""
+    try:
+        with _request({"op": "ping"}, host, port, timeout=1) as sock:
+            return json.loads(sock.makefile("r", encoding="utf-8").readline()).get("event") == "pong"
+    except (OSError, ValueError):
+        return False
+
+
+def submit_job(renderer, params, host=None, port=None, on_progress=print):
+    """
+    Run a render on the worker and block until it finishes, passing every
+    progress line to on_progress.
+
+    Returns:
+        The renderer's return value (output video path)
+    """
+    with _request({"op": "render", "renderer": renderer, "params": params}, host, port) as sock:
+        for line in sock.makefile("r", encoding="utf-8"):
+            event = json.loads(line)
+            if event["event"] == "progress" and on_progress:
+                on_progress(event["message"])
+            elif event["event"] == "done":
+                return event["output"]
+            elif event["event"] == "error":
+                raise RuntimeError(f"Render job {event.get('job')} failed: {event['error']}")
+    raise RuntimeError("Render worker closed the connection before the job finished")
+
+
+def job_status(host=None, port=None):
+    with _request({"op": "status"}, host, port, timeout=5) as sock:
+        return json.loads(sock.makefile("r", encoding="utf-8").readline())["jobs"]
+
+
+# --- Worker processes -------------------------------------------------------
+
+_progress_queue = None
+
+
+class _ProgressWriter:
+    """stdout replacement that forwards complete lines of a job's log to the daemon."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.buffer = ""
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        sys.__stdout__.write(text)
+        with self.lock:
+            self.buffer += text
+            while "\n" in self.buffer:
+                line, self.buffer = self.buffer.split("\n", 1)
+                if line.strip():
+                    _progress_queue.put((self.job_id, line))
+        return len(text)
+
+    def flush(self):
+        sys.__stdout__.flush()
+
+
+def _init_worker(progress_queue):
+    """Process initializer: import every renderer once so jobs start warm."""
+    global _progress_queue
+    _progress_queue = progress_queue
+    os.environ['MOVIEPY_DOTENV'] = ''
+    for module_name, _ in RENDERERS.values():
+        importlib.import_module(module_name)
+    from ffmpeg_tools import get_ffmpeg_exe
+    get_ffmpeg_exe()
+
+
+def _warmup():
+    return os.getpid()
+
+
+def _run_job(job_id, renderer, params):
+    module_name, function_name = RENDERERS[renderer]
+    render = getattr(importlib.import_module(module_name), function_name)
+    sys.stdout = _ProgressWriter(job_id)
+    try:
+        with render_job(renderer, job_id):
+            return render(**params)
+    except Exception as e:
+        traceback.print_exc()
+        # Re-raise as a plain RuntimeError so it always pickles back to the daemon
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    finally:
+        sys.stdout.flush()
+        sys.stdout = sys.__stdout__
+
+
+# --- Daemon -----------------------------------------------------------------
+
+_jobs = {}
+_listeners = {}
+_jobs_lock = threading.Lock()
+
+
+def _route_progress(progress_queue):
+    """Fan progress lines from the worker processes out to the connected clients."""
+    while True:
+        item = progress_queue.get()
+        if item is None:
+            return
+        job_id, message = item
+        with _jobs_lock:
+            if job_id in _jobs:
+                _jobs[job_id]["message"] = message
+            listener = _listeners.get(job_id)
+        if listener:
+            listener.put({"event": "progress", "job": job_id, "message": message})
+
+
+def _finish_job(job_id, future=None, error=None, server=None, executor=None):
+    """
+    Record a job's outcome and tell its client; error is set when the job
+    could not be submitted to executor.
+    """
+    if future is not None:
+        error = future.exception()
+    if isinstance(error, BrokenProcessPool):
+        # A render process died (OOM kill, segfault in ffmpeg/MoviePy); later jobs need a new pool
+        error = RuntimeError(f"Render process died ({error or 'process pool broken'})")
+        if server is not None:
+            _replace_executor(server, executor)
+    with _jobs_lock:
+        job = _jobs[job_id]
+        job["finished"] = time.time()
+        if error:
+            job["state"] = "failed"
+            job["error"] = str(error)
+            event = {"event": "error", "job": job_id, "error": str(error)}
+        else:
+            job["state"] = "done"
+            job["output"] = future.result()
+            event = {"event": "done", "job": job_id, "output": job["output"]}
+        listener = _listeners.pop(job_id, None)
+    status = "✓" if not error else "❌"
+    print(f"{status} Job {job_id} {job['state']} in {job['finished'] - job['submitted']:.1f}s")
+    if listener:
+        listener.put(event)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def send(self, event):
+        self.wfile.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            self.send({"event": "error", "error": "Invalid JSON request"})
+            return
+
+        op = request.get("op")
+        if op == "ping":
+            self.send({"event": "pong"})
+        elif op == "status":
+            with _jobs_lock:
+                jobs = [{"job": job_id, **job} for job_id, job in _jobs.items()]
+            self.send({"event": "status", "jobs": jobs})
+        elif op == "render":
+            self.handle_render(request)
+        else:
+            self.send({"event": "error", "error": f"Unknown op: {op}"})
+
+    def handle_render(self, request):
+        renderer = request.get("renderer")
+        if renderer not in RENDERERS:
+            self.send({"event": "error", "error": f"Unknown renderer: {renderer}"})
+            return
+
+        job_id = f"{renderer}-{uuid.uuid4().hex[:8]}"
+        listener = queue.Queue()
+        with _jobs_lock:
+            _jobs[job_id] = {"renderer": renderer, "state": "running", "message": "", "submitted": time.time()}
+            _listeners[job_id] = listener
+        print(f"🎬 Job {job_id} accepted")
+
+        with self.server.executor_lock:
+            executor = self.server.executor
+        try:
+            future = executor.submit(_run_job, job_id, renderer, request.get("params") or {})
+        except RuntimeError as e:
+            # BrokenProcessPool, or the pool was shut down by a concurrent _replace_executor
+            _finish_job(job_id, error=e, server=self.server, executor=executor)
+        else:
+            future.add_done_callback(lambda f: _finish_job(job_id, f, server=self.server, executor=executor))
+
+        try:
+            self.send({"event": "accepted", "job": job_id})
+            while True:
+                event = listener.get()
+                self.send(event)
+                if event["event"] in ("done", "error"):
+                    return
+        except OSError:
+            # Client went away; the job keeps running and stays visible in status
+            with _jobs_lock:
+                _listeners.pop(job_id, None)
+
+
+class _WorkerServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def _start_executor(processes, progress_queue):
+    """A process pool whose workers import the renderers; returns it with its warm-up futures."""
+    executor = ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context(),
+        initializer=_init_worker,
+        initargs=(progress_queue,),
+    )
+    return executor, [executor.submit(_warmup) for _ in range(processes)]
+
+
+def _replace_executor(server, broken):
+    """Swap a broken pool for a fresh one (warming in the background; queued jobs wait behind it)."""
+    with server.executor_lock:
+        if server.executor is not broken:
+            return  # Already replaced after another job on the same pool failed
+        print("⚠️  A render process died; starting a fresh process pool...")
+        server.executor, _ = _start_executor(server.processes, server.progress_queue)
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(host=None, port=None, processes=None):
+    host = host or RENDER_WORKER_HOST
+    port = port or RENDER_WORKER_PORT
+    processes = max(1, processes or RENDER_WORKER_PROCESSES)
+
+    progress_queue = multiprocessing.get_context().Queue()
+    threading.Thread(target=_route_progress, args=(progress_queue,), daemon=True).start()
+
+    print(f"🔥 Warming up {processes} render process(es)...")
+    executor, warmups = _start_executor(processes, progress_queue)
+    for future in warmups:
+        future.result()
+
+    with _WorkerServer((host, port), _RequestHandler) as server:
+        server.executor = executor
+        server.executor_lock = threading.Lock()
+        server.processes = processes
+        server.progress_queue = progress_queue
+        print(f"🚀 Render worker listening on {host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nShutting down render worker...")
+        finally:
+            server.executor.shutdown(wait=True)
+            progress_queue.put(None)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Persistent render worker for the video renderers")
+    parser.add_argument("--host", default=RENDER_WORKER_HOST, help="Listen address")
+    parser.add_argument("--port", type=int, default=RENDER_WORKER_PORT, help="Listen port")
+    parser.add_argument("--processes", type=int, default=RENDER_WORKER_PROCESSES, help="Concurrent render processes")
+    parser.add_argument("--status", action="store_true", help="Print the jobs of a running worker and exit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.status:
+        for job in job_status(args.host, args.port):
+            print(f"{job['job']}: {job['state']} - {job.get('message', '')}")
+        return
+    serve(args.host, args.port, args.processes)
+
+
+if __name__ == "__main__":
+    main()
@@ -87,6 +87,7 @@ async function renderPendingVideos(pythonExec = 'python3') {
     return;
   }
 
+  const manifest = [];
   for (const record of candidates) {
     const audioPath =
       resolveRelativePath(record.data.audioPath) ?? findAudioForId(record.id);
@@ -94,13 +95,31 @@ async function renderPendingVideos(pythonExec = 'python3') {
       console.warn(`Missing audio for ${record.id}, skipping.`);
       continue;
     }
-    const scriptPath = record.path;
-    try {
-      run(
-        `${pythonExec} pipeline/video_renderer.py --audio "${audioPath}" --script "${scriptPath}"`
-      );
-    } catch (error) {
-      console.error(`Video render failed for ${record.id}:`, error.message);
+    manifest.push({ id: record.id, script: record.path, audio: audioPath });
+  }
+
+  if (!manifest.length) return;
+
+  // Render every pending script in one Python process (bounded worker pool)
+  const tempDir = resolve(ROOT_DIR, 'pipeline', 'temp');
+  await fs.mkdir(tempDir, { recursive: true });
+  const manifestPath = resolve(tempDir, 'render-batch.json');
+  const reportPath = resolve(tempDir, 'render-batch-report.json');
+  await fs.writeFile(manifestPath, JSON.stringify(manifest, null, 2));
+
+  try {
+    run(
+      `${pythonExec} pipeline/video_renderer.py --batch "${manifestPath}" --report "${reportPath}"`
+    );
+  } catch (error) {
+    console.error('Batch video render failed:', error.message);
+    return;
+  }
+
+  const report = JSON.parse(await fs.readFile(reportPath, 'utf8'));
+  for (const result of report) {
+    if (result.status !== 'rendered') {
+      console.error(`Video render failed for ${result.id}:`, result.error);
     }
   }
 }
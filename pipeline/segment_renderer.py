@@ -0,0 +1,383 @@
+"""
+Parallel segment rendering with stream-copy concatenation.
+
+The timeline is cut at segment boundaries into chunks (one or more subtitle
+segments each). Every chunk is encoded as a video-only file by its own ffmpeg
+process on a ProcessPoolExecutor, all with identical codec parameters, then
+the chunks are joined with the concat demuxer (-c:v copy) and the narration
+is muxed once. Chunk boundaries are snapped to the frame grid so the joined
+video does not drift against the audio.
+
+Incremental mode cuts the timeline at every subtitle boundary as well, keys
+each encoded chunk by a fingerprint of what it shows (source content, source
+time range, subtitle sprite and position, encoder settings) and keeps the
+chunks under SEGMENT_CACHE_DIR, so a re-render after editing one line only
+encodes the chunks that line touches. Transitions between segments become
+their own atomic chunks (both sources, joined with xfade) that are never cut.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from clip_cache import source_sha256
+from encoding_profiles import fingerprint_settings
+from ffmpeg_backend import build_subtitle_overlays, run_plan
+from ffmpeg_tools import probe_video, run_ffmpeg
+from render_metrics import stage
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SEGMENT_CACHE_DIR = Path(os.getenv("SEGMENT_CACHE_DIR", ROOT_DIR / "pipeline" / "cache" / "segments"))
+SEGMENT_CACHE_MAX_MB = int(os.getenv("SEGMENT_CACHE_MAX_MB", "2048"))
+
+TARGET_SIZE = (1080, 1920)
+TARGET_FPS = 30
+
+# Bump when the chunk plan -> ffmpeg graph translation changes output
+FINGERPRINT_VERSION = 1
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def plan_chunks(segments, overlays, duration, fps=TARGET_FPS, chunk_size=1):
+    """
+    Group consecutive segments into chunk plans.
+
+    Args:
+        segments: Plan segments ({source, offset, duration, ...}) in timeline order
+        overlays: Plan overlays in output time; they are clipped and shifted per chunk
+        duration: Total output duration (audio length)
+        fps: Output frame rate, used to snap chunk boundaries
+        chunk_size: Number of segments per chunk
+
+    Returns:
+        List of video-only plan dicts, one per chunk
+    """
+    chunk_size = max(1, int(chunk_size))
+    if any("pair" in segment for segment in segments):
+        # A transition pair carries its own plan segments; keep it alone in its chunk
+        chunk_size = 1
+    chunks = []
+    timeline_pos = 0.0
+
+    for first in range(0, len(segments), chunk_size):
+        group = segments[first:first + chunk_size]
+        chunk_start = timeline_pos
+        timeline_pos += sum(float(seg["duration"]) for seg in group)
+        is_last = first + chunk_size >= len(segments)
+        chunk_end = max(timeline_pos, duration) if is_last else timeline_pos
+
+        start_frame = round(chunk_start * fps)
+        end_frame = round(chunk_end * fps)
+        if end_frame <= start_frame:
+            continue
+        t0 = start_frame / fps
+        t1 = end_frame / fps
+
+        chunk_overlays = []
+        for overlay in overlays:
+            start = max(float(overlay["start"]), t0)
+            end = min(float(overlay["end"]), t1)
+            if end > start:
+                chunk_overlays.append({**overlay, "start": start - t0, "end": end - t0})
+
+        chunks.append({
+            "size": TARGET_SIZE,
+            "fps": fps,
+            "duration": t1 - t0,
+            "segments": group[0]["pair"] if "pair" in group[0] else group,
+            "overlays": chunk_overlays,
+            "audio": None,
+            "transition": group[0].get("transition"),
+        })
+
+    return chunks
+
+
+def _render_chunk(job):
+    """Worker entry point; module-level so it can be pickled for the process pool."""
+    plan, chunk_path, profile, threads = job
+    return run_plan(plan, chunk_path, profile=profile, threads=threads)
+
+
+@stage("concat")
+def concat_chunks(chunk_paths, audio_path, duration, output_path, work_dir):
+    """Join chunks by stream copy and mux the narration once."""
+    list_path = Path(work_dir) / "chunks.txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for chunk_path in chunk_paths:
+            escaped = str(Path(chunk_path).resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    run_ffmpeg([
+        "-f", "concat",
+        "-safe", "0",
+        "-i", list_path,
+        "-i", audio_path,
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-c:v", "copy",
+        "-c:a", "aac",
+        "-t", f"{duration:.3f}",
+        "-movflags", "+faststart",
+        output_path,
+    ])
+    return str(output_path)
+
+
+def render_segments_parallel(segments, subtitles, audio_path, duration, output_path,
+                             workers=None, chunk_size=1, profile=None):
+    """
+    Render subtitle segments as independent chunks in parallel and join them.
+
+    Args:
+        segments: Plan segments in timeline order
+        subtitles: Subtitle dicts ({start, end, text})
+        audio_path: Narration muxed once after concatenation
+        duration: Total output duration
+        output_path: Final mp4 path
+        workers: Process count (default: all CPU cores)
+        chunk_size: Segments per chunk
+        profile: Encoding profile shared by every chunk
+
+    Returns:
+        Path string of the rendered video
+    """
+    workers = workers or default_workers()
+
+    print("Adding subtitles...")
+    overlays = build_subtitle_overlays(subtitles)
+    print(f"  ✓ {len(overlays)} subtitles created")
+
+    chunks = plan_chunks(segments, overlays, duration, chunk_size=chunk_size)
+    pool_size = max(1, min(workers, len(chunks)))
+    # Split the cores between concurrent encoders instead of oversubscribing
+    threads = max(1, default_workers() // pool_size)
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="render-chunks-") as work_dir:
+        jobs = [
+            (chunk, str(Path(work_dir) / f"chunk-{i:04d}.mp4"), profile, threads)
+            for i, chunk in enumerate(chunks)
+        ]
+        print(f"🧩 Rendering {len(jobs)} chunk(s) on {pool_size} worker(s), {threads} thread(s) each...")
+        with stage("chunk_encode"), ProcessPoolExecutor(max_workers=pool_size) as executor:
+            chunk_paths = list(executor.map(_render_chunk, jobs))
+
+        print("🔗 Joining chunks (stream copy) and muxing audio...")
+        concat_chunks(chunk_paths, audio_path, duration, output_path, work_dir)
+
+    print(f"\n✓ Video saved to {output_path}")
+    return str(output_path)
+
+
+def transition_pieces(segments, transition):
+    """
+    Split overlapping segments into solo pieces and transition pairs.
+
+    Each cut becomes one {"duration", "transition", "pair": [tail, head]}
+    piece holding the last `duration` seconds of the outgoing segment and the
+    first `duration` seconds of the incoming one; the rest of every segment
+    stays a plain piece.
+    """
+    if not transition or len(segments) < 2:
+        return list(segments)
+
+    overlap = float(transition["duration"])
+    pieces = []
+    for i, segment in enumerate(segments):
+        offset = float(segment.get("offset", 0.0))
+        duration = float(segment["duration"])
+        if i > 0:
+            previous = segments[i - 1]
+            pieces.append({
+                "duration": overlap,
+                "transition": transition,
+                "pair": [
+                    {**previous, "offset": float(previous.get("offset", 0.0)) + float(previous["duration"]) - overlap,
+                     "duration": overlap},
+                    {**segment, "offset": offset, "duration": overlap},
+                ],
+            })
+        head = overlap if i > 0 else 0.0
+        tail = overlap if i < len(segments) - 1 else 0.0
+        if duration - head - tail > 0:
+            pieces.append({**segment, "offset": offset + head, "duration": duration - head - tail})
+    return pieces
+
+
+def split_at_cues(segments, cut_times, fps=TARGET_FPS):
+    """
+    Split segments at cut_times (timeline seconds, snapped to the frame grid),
+    advancing each piece's source offset so the pieces play back unchanged.
+    Transition pairs are never split.
+    """
+    cuts = sorted({round(float(t) * fps) / fps for t in cut_times})
+    pieces = []
+    timeline_pos = 0.0
+
+    for segment in segments:
+        segment_start = timeline_pos
+        segment_end = segment_start + float(segment["duration"])
+        if "pair" in segment:
+            pieces.append(segment)
+            timeline_pos = segment_end
+            continue
+        bounds = [segment_start] + [cut for cut in cuts if segment_start < cut < segment_end] + [segment_end]
+        for piece_start, piece_end in zip(bounds, bounds[1:]):
+            pieces.append({
+                **segment,
+                "offset": float(segment.get("offset", 0.0)) + piece_start - segment_start,
+                "duration": piece_end - piece_start,
+            })
+        timeline_pos = segment_end
+
+    return pieces
+
+
+def chunk_fingerprint(plan, source_digests, encoder):
+    """
+    Hash everything that determines a chunk's encoded bytes. Sources are
+    identified by content, sprites by their content-keyed file name.
+    """
+    payload = {
+        "version": FINGERPRINT_VERSION,
+        "size": list(plan["size"]),
+        "fps": plan["fps"],
+        "duration": round(float(plan["duration"]), 4),
+        "segments": [
+            {
+                "source": source_digests[str(segment["source"])],
+                "offset": round(float(segment.get("offset", 0.0)), 4),
+                "duration": round(float(segment["duration"]), 4),
+                "fit": segment.get("fit", "cover"),
+            }
+            for segment in plan["segments"]
+        ],
+        "overlays": [
+            {
+                "image": Path(overlay["image"]).name,
+                "x": overlay.get("x", "center"),
+                "y": overlay.get("y", "center"),
+                "start": round(float(overlay["start"]), 4),
+                "end": round(float(overlay["end"]), 4),
+            }
+            for overlay in plan["overlays"]
+        ],
+        "transition": plan.get("transition"),
+        "encoder": encoder,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:40]
+
+
+def _render_cached_chunk(job):
+    """Encode a chunk next to its cache path and move it in atomically."""
+    plan, chunk_path, profile, threads = job
+    tmp_path = Path(chunk_path).with_name(f"{Path(chunk_path).stem}.{os.getpid()}.tmp.mp4")
+    try:
+        run_plan(plan, tmp_path, profile=profile, threads=threads)
+        os.replace(tmp_path, chunk_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return str(chunk_path)
+
+
+def _evict_segments(keep_paths):
+    """Drop least recently used chunk artifacts until the cache fits SEGMENT_CACHE_MAX_MB."""
+    if SEGMENT_CACHE_MAX_MB <= 0:
+        return
+    max_bytes = SEGMENT_CACHE_MAX_MB * 1024 * 1024
+    keep = {Path(path).name for path in keep_paths}
+    entries = []
+    for path in SEGMENT_CACHE_DIR.glob("*.mp4"):
+        if ".tmp." in path.name:
+            continue
+        stat = path.stat()
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path.name in keep:
+            continue
+        path.unlink(missing_ok=True)
+        total -= size
+
+
+def render_segments_incremental(segments, subtitles, audio_path, duration, output_path,
+                                workers=None, profile=None, transition=None):
+    """
+    Render like render_segments_parallel, but cut at subtitle boundaries and
+    reuse every chunk whose fingerprint is already in SEGMENT_CACHE_DIR.
+
+    Args:
+        segments: Plan segments in timeline order
+        subtitles: Subtitle dicts ({start, end, text})
+        audio_path: Narration muxed once after concatenation
+        duration: Total output duration
+        output_path: Final mp4 path
+        workers: Processes for the chunks that need encoding (default: all CPU cores)
+        profile: Encoding profile (its settings are part of the fingerprint)
+        transition: Optional {"type", "duration"} between consecutive segments
+
+    Returns:
+        Path string of the rendered video
+    """
+    workers = workers or default_workers()
+
+    print("Adding subtitles...")
+    overlays = build_subtitle_overlays(subtitles)
+    print(f"  ✓ {len(overlays)} subtitles created")
+
+    sources = sorted({str(segment["source"]) for segment in segments})
+    source_durations = {source: probe_video(source)["duration"] for source in sources}
+    source_digests = {source: source_sha256(source) for source in sources}
+
+    cut_times = [time for overlay in overlays for time in (overlay["start"], overlay["end"])]
+    pieces = split_at_cues(transition_pieces(segments, transition), cut_times)
+    for piece in pieces:
+        # Inputs loop from the offset, so keep it inside the first pass of the source
+        for plan_segment in piece.get("pair", [piece]):
+            source_duration = source_durations[str(plan_segment["source"])]
+            if source_duration:
+                plan_segment["offset"] %= source_duration
+    chunks = plan_chunks(pieces, overlays, duration)
+
+    encoder = {"vcodec": "libx264", "pix_fmt": "yuv420p", **fingerprint_settings(profile)}
+    SEGMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    chunk_paths = []
+    pending = {}
+    for chunk in chunks:
+        chunk_path = SEGMENT_CACHE_DIR / f"{chunk_fingerprint(chunk, source_digests, encoder)}.mp4"
+        chunk_paths.append(chunk_path)
+        if chunk_path.exists():
+            os.utime(chunk_path)
+        else:
+            pending.setdefault(chunk_path, chunk)
+
+    print(f"♻️  {len(chunks) - len(pending)}/{len(chunks)} segment(s) unchanged, encoding {len(pending)}")
+    if pending:
+        pool_size = max(1, min(workers, len(pending)))
+        threads = max(1, default_workers() // pool_size)
+        jobs = [(chunk, str(chunk_path), profile, threads) for chunk_path, chunk in pending.items()]
+        with stage("chunk_encode"):
+            if pool_size == 1:
+                for job in jobs:
+                    _render_cached_chunk(job)
+            else:
+                with ProcessPoolExecutor(max_workers=pool_size) as executor:
+                    list(executor.map(_render_cached_chunk, jobs))
+
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="render-chunks-") as work_dir:
+        print("🔗 Joining segments (stream copy) and muxing audio...")
+        concat_chunks(chunk_paths, audio_path, duration, output_path, work_dir)
+    _evict_segments(chunk_paths)
+
+    print(f"\n✓ Video saved to {output_path}")
+    return str(output_path)
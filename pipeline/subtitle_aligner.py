@@ -0,0 +1,227 @@
+"""
+Offline subtitle alignment against the TTS narration.
+
+We already know the exact script text, so there is nothing to transcribe:
+the audio is decoded once to a mono float32 array, an RMS energy envelope
+(20 ms windows, 10 ms hop) marks speech and silence, and the script's
+words are spread over the speech regions by character count. Sentence ends
+snap to nearby pauses, so a new line appears when the voice actually starts
+it. Everything is vectorized NumPy; no network, no model.
+
+Output is the subtitle JSON the renderers consume: lines of at most
+ALIGN_WORDS_PER_LINE words that tile the narration from 0 to its end, each
+with the "words" timings used by word-level captions (word_captions.py):
+
+    [{"start": 0.0, "end": 1.84, "text": "Merhaba dünya bu bir test",
+      "words": [{"word": "Merhaba", "start": 0.05, "end": 0.41}, ...]}, ...]
+
+Usage:
+    python pipeline/subtitle_aligner.py --audio narration.mp3 --script-file script.txt [--output subs.json]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from ffmpeg_tools import run_ffmpeg
+from render_metrics import stage
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.02
+HOP_SECONDS = 0.01
+
+ALIGN_WORDS_PER_LINE = int(os.getenv("ALIGN_WORDS_PER_LINE", "5"))
+ALIGN_SILENCE_DB = float(os.getenv("ALIGN_SILENCE_DB", "30"))  # below the loud level of the voice
+ALIGN_MIN_SILENCE = float(os.getenv("ALIGN_MIN_SILENCE", "0.2"))  # shorter gaps are breaths inside speech
+ALIGN_MIN_SPEECH = 0.08  # shorter bursts are clicks
+ALIGN_MAX_SNAP = 0.75  # seconds a sentence end may move to reach a pause
+
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+@stage("audio_decode")
+def decode_audio(audio_path, sample_rate=SAMPLE_RATE):
+    """Decode any ffmpeg-readable audio to a mono float32 array at sample_rate."""
+    result = run_ffmpeg([
+        "-i", audio_path, "-vn", "-ac", 1, "-ar", sample_rate, "-f", "f32le", "-",
+    ])
+    return np.frombuffer(result.stdout, dtype="<f4")
+
+
+def energy_envelope(samples, sample_rate=SAMPLE_RATE, frame_seconds=FRAME_SECONDS, hop_seconds=HOP_SECONDS):
+    """RMS level in dBFS of overlapping windows, one value per hop."""
+    frame = max(int(sample_rate * frame_seconds), 1)
+    hop = max(int(sample_rate * hop_seconds), 1)
+    if len(samples) < frame:
+        samples = np.pad(samples, (0, frame - len(samples)))
+    windows = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop]
+    rms = np.sqrt(np.mean(np.square(windows, dtype=np.float64), axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def speech_regions(envelope, hop_seconds=HOP_SECONDS, silence_db=ALIGN_SILENCE_DB,
+                   min_silence=ALIGN_MIN_SILENCE, min_speech=ALIGN_MIN_SPEECH):
+    """
+    Speech regions of an energy envelope as (starts, ends) arrays in seconds.
+
+    A window is speech when it is within silence_db of the loud level (95th
+    percentile) and clearly above the noise floor; pauses shorter than
+    min_silence are bridged and bursts shorter than min_speech dropped.
+    """
+    loud, floor = np.percentile(envelope, [95, 5])
+    threshold = max(loud - silence_db, floor + 6.0)
+    voiced = np.concatenate(([0], (envelope > threshold).astype(np.int8), [0]))
+    edges = np.diff(voiced)
+    starts = np.flatnonzero(edges == 1) * hop_seconds
+    ends = np.flatnonzero(edges == -1) * hop_seconds
+    if not len(starts):
+        return starts, ends
+
+    keep_gap = starts[1:] - ends[:-1] >= min_silence
+    starts = starts[np.concatenate(([True], keep_gap))]
+    ends = ends[np.concatenate((keep_gap, [True]))]
+    long_enough = ends - starts >= min_speech
+    return starts[long_enough], ends[long_enough]
+
+
+def split_lines(script_text, words_per_line=ALIGN_WORDS_PER_LINE):
+    """
+    Break the script into subtitle lines: sentences first, then each sentence
+    into evenly sized lines of at most words_per_line words.
+
+    Returns:
+        List of word lists; a list ending a sentence is followed by a sentence break
+    """
+    lines, sentence_ends = [], set()
+    for sentence in SENTENCE_END.split(script_text.strip()):
+        words = sentence.split()
+        if not words:
+            continue
+        count = -(-len(words) // words_per_line)
+        size = -(-len(words) // count)
+        lines += [words[i:i + size] for i in range(0, len(words), size)]
+        sentence_ends.add(len(lines) - 1)
+    return lines, sentence_ends
+
+
+def _to_real_time(speech_times, starts, ends, side):
+    """Map time measured along the concatenated speech regions back to narration time."""
+    elapsed = np.concatenate(([0.0], np.cumsum(ends - starts)))
+    index = np.clip(np.searchsorted(elapsed[1:], speech_times, side=side), 0, len(starts) - 1)
+    return starts[index] + (speech_times - elapsed[index])
+
+
+def align_words(words, sentence_breaks, starts, ends):
+    """
+    Start/end times for words spread over speech regions by character count,
+    with the given word indices (sentence ends) snapped to the nearest pause.
+    """
+    lengths = np.array([len(word) + 1 for word in words], dtype=np.float64)
+    char_ends = np.cumsum(lengths)
+    char_starts = char_ends - lengths
+    speech_total = float(np.sum(ends - starts))
+    scale = speech_total / char_ends[-1]
+
+    # Anchors (character offset -> speech time): sentence ends move onto pauses
+    pauses = np.cumsum(ends - starts)[:-1]
+    anchor_chars, anchor_times = [0.0], [0.0]
+    for index in sorted(sentence_breaks):
+        if index >= len(words) - 1 or not len(pauses):
+            continue
+        estimate = char_ends[index] * scale
+        pause = pauses[np.argmin(np.abs(pauses - estimate))]
+        if abs(pause - estimate) <= ALIGN_MAX_SNAP and pause > anchor_times[-1]:
+            anchor_chars.append(char_ends[index])
+            anchor_times.append(pause)
+    anchor_chars.append(char_ends[-1])
+    anchor_times.append(speech_total)
+
+    word_starts = np.interp(char_starts, anchor_chars, anchor_times)
+    word_ends = np.interp(char_ends - 1, anchor_chars, anchor_times)  # trailing space is not spoken
+    return (
+        _to_real_time(word_starts, starts, ends, "right"),
+        _to_real_time(word_ends, starts, ends, "left"),
+    )
+
+
+def align_script(audio_path, script_text, words_per_line=ALIGN_WORDS_PER_LINE):
+    """
+    Subtitle dicts for script_text timed against the narration in audio_path.
+
+    Raises:
+        ValueError: if the script has no words
+    """
+    lines, sentence_ends = split_lines(script_text, words_per_line)
+    if not lines:
+        raise ValueError("Script text has no words to align")
+
+    samples = decode_audio(audio_path)
+    duration = len(samples) / SAMPLE_RATE
+    with stage("align"):
+        starts, ends = speech_regions(energy_envelope(samples))
+        if not len(starts):
+            starts, ends = np.array([0.0]), np.array([duration])
+        print(f"  ✓ {len(starts)} speech region(s) in {duration:.2f}s of narration")
+
+        words = [word for line in lines for word in line]
+        line_firsts = np.cumsum([0] + [len(line) for line in lines])
+        sentence_breaks = {line_firsts[index + 1] - 1 for index in sentence_ends}
+        word_starts, word_ends = align_words(words, sentence_breaks, starts, ends)
+
+    subtitles = []
+    for index, line in enumerate(lines):
+        first, last = line_firsts[index], line_firsts[index + 1]
+        # Lines tile the narration so clip slots add up to the audio length
+        start = 0.0 if index == 0 else float(word_starts[first])
+        end = duration if index == len(lines) - 1 else float(word_starts[last])
+        subtitles.append({
+            "start": round(start, 2),
+            "end": round(end, 2),
+            "text": " ".join(line),
+            "words": [
+                {"word": word, "start": round(float(word_start), 3), "end": round(float(word_end), 3)}
+                for word, word_start, word_end in zip(line, word_starts[first:last], word_ends[first:last])
+            ],
+        })
+    return subtitles
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Align known script text to narration audio offline")
+    parser.add_argument("--audio", required=True, help="Narration audio path")
+    text = parser.add_mutually_exclusive_group(required=True)
+    text.add_argument("--script-text", help="Script text")
+    text.add_argument("--script-file", help="File with the script text")
+    parser.add_argument("--words-per-line", type=int, default=ALIGN_WORDS_PER_LINE, help="Maximum words per subtitle line")
+    parser.add_argument("--output", help="Write the subtitles JSON here instead of stdout")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    script_text = args.script_text
+    if script_text is None:
+        script_text = Path(args.script_file).read_text(encoding="utf-8")
+
+    # Progress goes to stderr so stdout stays pure JSON
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        subtitles = align_script(args.audio, script_text, args.words_per_line)
+    finally:
+        sys.stdout = stdout
+
+    payload = json.dumps(subtitles, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(payload, encoding="utf-8")
+        print(f"✓ {len(subtitles)} subtitles written to {args.output}")
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Pre-rasterized subtitle sprite cache.
+
+Each (text, font, size, style) combination is rendered once with TextClip into
+an RGBA PNG under SUBTITLE_SPRITE_DIR and recorded in a persistent index.
+Renderers composite those sprites as static image overlays, so re-renders of
+the same script (or repeated lines such as CTAs) only rasterize new text.
+
+On the MoviePy backend all cues form one subtitle track: the timeline is cut
+into intervals at every cue boundary, each interval lists the cues active in
+it, and frame t bisects the boundaries to find them. Only the cues found are
+blended into the frame, each within its sprite's bounding box (transparent
+padding cropped off), so the per-frame cost does not grow with the number
+of cues.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Disable MoviePy's .env loading to avoid permission issues
+os.environ['MOVIEPY_DOTENV'] = ''
+
+try:
+    # MoviePy 2.x
+    from moviepy import TextClip
+except ImportError:
+    # MoviePy 1.x fallback
+    from moviepy.editor import TextClip
+
+from cache_utils import file_lock, load_json, save_json_atomic
+from render_metrics import stage
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+SUBTITLE_SPRITE_DIR = Path(os.getenv("SUBTITLE_SPRITE_DIR", ROOT_DIR / "pipeline" / "cache" / "subtitles"))
+SUBTITLE_SPRITE_MAX_MB = int(os.getenv("SUBTITLE_SPRITE_MAX_MB", "512"))
+
+INDEX_FILENAME = "index.json"
+LOCK_FILENAME = ".lock"
+
+# Tried in order when SUBTITLE_FONT is not set
+FONT_CANDIDATES = [
+    "/System/Library/Fonts/Supplemental/Arial Bold.ttf",  # macOS - Türkçe karakter desteği
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",  # Debian/Ubuntu
+    "C:/Windows/Fonts/arialbd.ttf",
+]
+
+SUBTITLE_POSITION = ('center', 1400)  # 1500'den 1400'e düşürüldü
+
+
+def resolve_font():
+    """Return SUBTITLE_FONT if set, otherwise the first installed candidate font."""
+    env_font = os.getenv("SUBTITLE_FONT")
+    if env_font:
+        return env_font
+    for candidate in FONT_CANDIDATES:
+        if Path(candidate).exists():
+            return candidate
+    return FONT_CANDIDATES[0]
+
+
+def default_style():
+    """The caption style shared by the subtitle renderers."""
+    return {
+        "font": resolve_font(),
+        "font_size": 55,
+        "color": "white",
+        "stroke_color": "black",
+        "stroke_width": 3,
+        "method": "caption",
+        "text_align": "center",
+        "size": [950, 300],  # Yükseklik belirtildi - alt kısım kesik olmasın
+    }
+
+
+def scaled_style(style, scale):
+    """Caption style for a frame scaled by `scale` (e.g. 0.5 for a 540x960 preview)."""
+    style = dict(style or default_style())
+    if scale == 1:
+        return style
+    style["font_size"] = max(1, round(style["font_size"] * scale))
+    style["stroke_width"] = max(1, round(style["stroke_width"] * scale)) if style["stroke_width"] else 0
+    style["size"] = [max(1, round(value * scale)) for value in style["size"]]
+    return style
+
+
+def scaled_position(position, scale):
+    """Scale the pixel parts of a MoviePy-style position, keeping "center"."""
+    return tuple(value if isinstance(value, str) else round(value * scale) for value in position)
+
+
+def _index_lock():
+    return file_lock(SUBTITLE_SPRITE_DIR / LOCK_FILENAME)
+
+
+def _load_index():
+    return load_json(SUBTITLE_SPRITE_DIR / INDEX_FILENAME, dict)
+
+
+def _save_index(index):
+    save_json_atomic(SUBTITLE_SPRITE_DIR / INDEX_FILENAME, index)
+
+
+def _sprite_size(entry):
+    try:
+        return (SUBTITLE_SPRITE_DIR / entry["file"]).stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _evict(index, keep_keys):
+    """Drop least recently used sprites until the cache fits SUBTITLE_SPRITE_MAX_MB."""
+    if SUBTITLE_SPRITE_MAX_MB <= 0:
+        return
+    max_bytes = SUBTITLE_SPRITE_MAX_MB * 1024 * 1024
+    for entry in index.values():
+        if "size" not in entry:  # indexed before sizes were recorded
+            entry["size"] = _sprite_size(entry)
+    total = sum(entry["size"] for entry in index.values())
+
+    for key in sorted(index, key=lambda k: index[k].get("last_used", 0)):
+        if total <= max_bytes:
+            break
+        if key in keep_keys:
+            continue
+        entry = index.pop(key)
+        total -= entry["size"]
+        (SUBTITLE_SPRITE_DIR / entry["file"]).unlink(missing_ok=True)
+        print(f"  🧹 Evicted subtitle sprite: {entry['text']}")
+
+
+def sprite_key(text, style):
+    """Hash of the text and every style field; the font file's mtime invalidates on font updates."""
+    font_path = Path(style["font"])
+    font_mtime = font_path.stat().st_mtime if font_path.exists() else 0
+    payload = json.dumps({"text": text, "style": style, "font_mtime": font_mtime}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def rasterize_sprite(text, style, image_path):
+    """Render text with TextClip and save it as an RGBA PNG."""
+    txt_clip = TextClip(
+        text=text,
+        font_size=style["font_size"],
+        color=style["color"],
+        font=style["font"],
+        stroke_color=style["stroke_color"],
+        stroke_width=style["stroke_width"],
+        method=style["method"],
+        text_align=style["text_align"],
+        size=tuple(style["size"]),
+    )
+    txt_clip.save_frame(str(image_path), t=0, with_mask=True)
+    txt_clip.close()
+
+
+def _rasterize_to_temp(text, style, image_path):
+    """Rasterize into a temp file next to image_path; returns its path, or None on failure."""
+    tmp_path = image_path.with_name(f"{image_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.png")
+    try:
+        rasterize_sprite(text, style, tmp_path)
+    except Exception as e:
+        tmp_path.unlink(missing_ok=True)
+        print(f"  Warning: Failed to create subtitle: {e}")
+        return None
+    return tmp_path
+
+
+@stage("subtitle_sprites")
+def prepare_sprites(texts, style=None):
+    """
+    Make sure a sprite exists for every text, rasterizing only cache misses.
+
+    The index lock is held only to look up and record entries: misses are
+    rasterized outside it, so concurrent renders do not queue behind each
+    other's TextClip calls.
+
+    Args:
+        texts: Subtitle strings (duplicates are rendered once)
+        style: Caption style dict, defaults to default_style()
+
+    Returns:
+        Dict mapping text -> PNG path. Texts that failed to render are left out.
+    """
+    style = style or default_style()
+    texts = list(dict.fromkeys(texts))
+    paths = {text: SUBTITLE_SPRITE_DIR / f"{sprite_key(text, style)}.png" for text in texts}
+
+    def cached(index, text):
+        entry = index.get(paths[text].stem)
+        return entry if entry and paths[text].exists() else None
+
+    with _index_lock():
+        index = _load_index()
+        misses = [text for text in texts if not cached(index, text)]
+
+    rendered = {text: _rasterize_to_temp(text, style, paths[text]) for text in misses}
+
+    sprites = {}
+    rasterized = 0
+    with _index_lock():
+        index = _load_index()
+        now = time.time()
+
+        for text in texts:
+            image_path = paths[text]
+            entry = cached(index, text)
+            if not entry and text not in rendered:
+                # Evicted by another render since the lookup (rare): rasterize it again
+                rendered[text] = _rasterize_to_temp(text, style, image_path)
+            tmp_path = rendered.get(text)
+
+            if tmp_path and entry:
+                # Another render stored the same sprite meanwhile
+                tmp_path.unlink(missing_ok=True)
+            elif tmp_path:
+                os.replace(tmp_path, image_path)
+                entry = {
+                    "file": image_path.name,
+                    "text": text,
+                    "created": now,
+                    "size": image_path.stat().st_size,
+                }
+                index[image_path.stem] = entry
+                rasterized += 1
+            if not entry:
+                continue
+
+            entry["last_used"] = now
+            sprites[text] = str(image_path)
+
+        _evict(index, keep_keys={Path(path).stem for path in sprites.values()})
+        _save_index(index)
+
+    reused = len(sprites) - rasterized
+    print(f"  ✓ Subtitle sprites: {rasterized} rasterized, {reused} reused from cache")
+    return sprites
+
+
+def load_sprite(image_path):
+    """
+    Decode a sprite PNG cropped to its visible pixels.
+
+    Returns:
+        Dict with "offset" (x, y of the crop inside the sprite), "size" of the
+        full sprite, "rgb" (premultiplied by alpha) and "inverse_alpha", both
+        float32 arrays of the cropped box; None for a fully transparent sprite
+    """
+    with Image.open(image_path) as image:
+        image = image.convert("RGBA")
+        size = image.size
+        bbox = image.getchannel("A").getbbox()
+        if not bbox:
+            return None
+        pixels = np.asarray(image.crop(bbox), dtype=np.float32)
+    alpha = pixels[:, :, 3:] / 255.0
+    return {
+        "offset": bbox[:2],
+        "size": size,
+        "rgb": pixels[:, :, :3] * alpha,
+        "inverse_alpha": 1.0 - alpha,
+    }
+
+
+def _resolve_position(position, frame_size, sprite_size):
+    """Top-left pixel of a sprite placed MoviePy-style ("center", "left", ..., or pixels)."""
+    anchors = (
+        {"left": 0, "center": (frame_size[0] - sprite_size[0]) / 2, "right": frame_size[0] - sprite_size[0]},
+        {"top": 0, "center": (frame_size[1] - sprite_size[1]) / 2, "bottom": frame_size[1] - sprite_size[1]},
+    )
+    return tuple(
+        int(anchors[axis][value]) if isinstance(value, str) else int(value)
+        for axis, value in enumerate(position)
+    )
+
+
+def place_sprite(sprite, frame_size, position):
+    """Frame rectangle and sprite window of a sprite at position, clipped to the frame."""
+    x, y = _resolve_position(position, frame_size, sprite["size"])
+    x += sprite["offset"][0]
+    y += sprite["offset"][1]
+    height, width = sprite.get("rgb", sprite.get("delta")).shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, frame_size[0]), min(y + height, frame_size[1])
+    if x0 >= x1 or y0 >= y1:
+        return None
+    window = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+    placed = {"box": (slice(y0, y1), slice(x0, x1))}
+    for key in ("rgb", "inverse_alpha", "delta"):
+        if key in sprite:
+            placed[key] = sprite[key][window]
+    return placed
+
+
+def build_subtitle_track(subtitles, frame_size, style=None, position=SUBTITLE_POSITION):
+    """
+    Index subtitle dicts ({start, end, text}) into one subtitle track.
+
+    Returns:
+        Track dict (see index_cues) with one placed sprite per rendered line
+        and the number of "lines"
+    """
+    sprites = prepare_sprites([sub['text'] for sub in subtitles], style)
+    decoded = {}
+    cues = []
+
+    for sub in subtitles:
+        image_path = sprites.get(sub['text'])
+        if not image_path:
+            continue
+        if image_path not in decoded:
+            sprite = load_sprite(image_path)
+            decoded[image_path] = sprite and place_sprite(sprite, frame_size, position)
+        start, end = float(sub['start']), float(sub['end'])
+        if decoded[image_path] and end > start:
+            cues.append({"start": start, "end": end, **decoded[image_path]})
+
+    return {**index_cues(cues), "lines": len(cues)}
+
+
+def index_cues(cues):
+    """
+    Interval index over placed cues ({start, end, box, rgb, inverse_alpha}
+    or {start, end, box, delta}).
+
+    Returns:
+        Dict with "cues", "boundaries" (sorted cue start/end times) and
+        "active" (indices of the cues active between boundaries[i] and
+        boundaries[i + 1], in list order, which is also the drawing order)
+    """
+    boundaries = sorted({cue["start"] for cue in cues} | {cue["end"] for cue in cues})
+    active = [[] for _ in boundaries]
+    for index, cue in enumerate(cues):
+        for slot in range(bisect_right(boundaries, cue["start"]) - 1, bisect_right(boundaries, cue["end"]) - 1):
+            active[slot].append(index)
+
+    return {"cues": cues, "boundaries": boundaries, "active": active}
+
+
+def active_cues(track, t):
+    """Cues of the track showing at time t (start <= t < end)."""
+    slot = bisect_right(track["boundaries"], t) - 1
+    if slot < 0:
+        return []
+    return [track["cues"][index] for index in track["active"][slot]]
+
+
+def blit_cues(frame, cues):
+    """
+    Alpha-blend cues into a copy of frame, touching only their bounding boxes.
+    Cues with a "delta" instead of "rgb" are added to what is already drawn
+    (recoloring an earlier cue in place, e.g. a highlighted word).
+    """
+    if not cues:
+        return frame
+    frame = frame.copy()
+    for cue in cues:
+        region = frame[cue["box"]]
+        if "delta" in cue:
+            region[...] = np.clip(region + cue["delta"] + 0.5, 0, 255)
+        else:
+            region[...] = cue["rgb"] + region * cue["inverse_alpha"] + 0.5
+    return frame
+
+
+def apply_subtitle_track(clip, track):
+    """The clip with the track's cues burned into its frames (clip itself if there are none)."""
+    if not track["cues"]:
+        return clip
+
+    def burn(get_frame, t):
+        return blit_cues(get_frame(t), active_cues(track, t))
+
+    transform = getattr(clip, "transform", None) or clip.fl  # MoviePy 2.x / 1.x
+    return transform(burn, apply_to=[])
@@ -1,95 +1,134 @@
 import argparse
 import json
+import os
 import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from types import SimpleNamespace
+
+# Disable MoviePy's .env loading to avoid permission issues
+os.environ['MOVIEPY_DOTENV'] = ''
+
+import numpy as np
+from PIL import Image, ImageFilter
 
 try:
     # MoviePy 2.x
-    from moviepy import AudioFileClip, CompositeAudioClip, CompositeVideoClip, TextClip, VideoFileClip
-    from moviepy import audio_fx as afx
-    from moviepy import video_fx as vfx
+    from moviepy import AudioFileClip, CompositeAudioClip, CompositeVideoClip, ImageClip, VideoFileClip, afx
 except ImportError:
     # MoviePy 1.x fallback
     from moviepy.editor import (
         AudioFileClip,
         CompositeAudioClip,
         CompositeVideoClip,
-        TextClip,
+        ImageClip,
         VideoFileClip,
         afx,
-        vfx,
     )
 
+from asset_index import (
+    AUDIO_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    choose_clip,
+    list_assets,
+    load_asset_index,
+)
+from cache_utils import save_json_atomic
+from clip_cache import get_normalized_clip
+from clip_pool import looped_subclip
+from encoding_profiles import (
+    ENCODING_PROFILE,
+    ENCODING_PROFILES,
+    encoder_threads,
+    moviepy_write_options,
+)
+from ffmpeg_backend import BACKENDS, run_plan
+from ffmpeg_tools import probe_video
+from render_metrics import reader_closed, reader_opened, render_job, report_path, stage
+from subtitle_sprites import default_style, prepare_sprites
+
 ROOT_DIR = Path(__file__).resolve().parents[1]
 ASSETS_DIR = ROOT_DIR / "assets"
 SCRIPTS_DIR = ROOT_DIR / "pipeline" / "scripts"
 AUDIO_DIR = ROOT_DIR / "pipeline" / "audio"
 VIDEOS_DIR = ROOT_DIR / "pipeline" / "videos"
 
-VIDEO_EXTENSIONS = {".mp4", ".mov", ".mkv", ".webm"}
-AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".aac"}
+RENDER_BATCH_WORKERS = int(os.getenv("RENDER_BATCH_WORKERS", "2"))
+
+# HOOK/FACT/CTA blocks: caption on a translucent black box
+TEXT_BOX_WIDTH = 980
+TEXT_BOX_PADDING = 16  # px above and below the text
+TEXT_BOX_OPACITY = 0.45
+
+# Asset index shared by every job of a batch (None: refresh on each call)
+_asset_index = None
 
 
 def list_asset_files(extensions):
-    return [path for path in ASSETS_DIR.glob("*") if path.suffix.lower() in extensions]
+    return list_assets(ASSETS_DIR, extensions=extensions, index=_asset_index)
 
 
-def select_stock_clip(tags):
+def select_stock_clip(tags, min_duration=None):
+    """
+    Pick a stock clip from the asset index, preferring clips whose name
+    matches a tag and, among those, clips long enough to cover
+    min_duration seconds without looping.
+    """
     clips = list_asset_files(VIDEO_EXTENSIONS)
     if not clips:
         raise FileNotFoundError(
             "No stock video clips found in /assets. Add at least one video file."
         )
 
-    if tags:
-        tagged = [
-            clip
-            for clip in clips
-            if any(tag.lower() in clip.name.lower() for tag in tags)
-        ]
-        if tagged:
-            return random.choice(tagged)
-
-    return random.choice(clips)
+    return choose_clip(clips, random, tags=tags, min_duration=min_duration)["path"]
 
 
 def select_background_music():
-    music_files = [
-        path for path in list_asset_files(AUDIO_EXTENSIONS) if "music" in path.name.lower()
-    ]
+    audio_files = list_asset_files(AUDIO_EXTENSIONS)
+    music_files = [entry["path"] for entry in audio_files if "music" in entry["path"].name.lower()]
     if music_files:
         return random.choice(music_files)
 
     # fallback: allow any audio file that is not obviously a voice track
     generic_audio = [
-        path
-        for path in list_asset_files(AUDIO_EXTENSIONS)
-        if "voice" not in path.name.lower()
+        entry["path"]
+        for entry in audio_files
+        if "voice" not in entry["path"].name.lower()
     ]
     return random.choice(generic_audio) if generic_audio else None
 
 
-def fit_clip_to_vertical(clip, duration):
-    looped = clip.fx(vfx.loop, duration=duration + 0.25)
-    if looped.duration < duration:
-        looped = looped.fx(vfx.loop, duration=duration + 1)
-
-    resized = looped.resize(height=1920)
-    if resized.w < 1080:
-        # create blurred background to fill sides
-        blurred = (
-            resized.fx(vfx.gaussian_blur, sigma=15)
-            .resize((1080, 1920))
-            .set_opacity(0.6)
-        )
-        foreground = resized.resize(width=900)
-        foreground = foreground.set_position("center")
-        return CompositeVideoClip([blurred, foreground], size=(1080, 1920))
+def _blur_frame(frame):
+    return np.asarray(Image.fromarray(frame).filter(ImageFilter.GaussianBlur(15)))
 
-    cropped = resized.crop(
-        width=1080, height=1920, x_center=resized.w / 2, y_center=resized.h / 2
-    )
-    return cropped
+
+def fit_clip_to_vertical(clip, duration):
+    # Loop lazily (frame t reads t mod clip length) instead of concatenating copies
+    looped = looped_subclip(clip, duration)
+
+    if tuple(looped.size) == (1080, 1920):
+        # Already normalized (clip cache): nothing to scale or crop
+        return looped
+
+    try:
+        # MoviePy 2.x
+        resized = looped.resized(height=1920)
+        if resized.w < 1080:
+            # create blurred background to fill sides
+            blurred = resized.image_transform(_blur_frame).resized((1080, 1920)).with_opacity(0.6)
+            foreground = resized.resized(width=900).with_position("center")
+            return CompositeVideoClip([blurred, foreground], size=(1080, 1920))
+        return resized.cropped(width=1080, height=1920, x_center=resized.w / 2, y_center=resized.h / 2)
+    except AttributeError:
+        # MoviePy 1.x fallback
+        resized = looped.resize(height=1920)
+        if resized.w < 1080:
+            blurred = resized.fl_image(_blur_frame).resize((1080, 1920)).set_opacity(0.6)
+            foreground = resized.resize(width=900).set_position("center")
+            return CompositeVideoClip([blurred, foreground], size=(1080, 1920))
+        return resized.crop(width=1080, height=1920, x_center=resized.w / 2, y_center=resized.h / 2)
 
 
 def build_text_blocks(script_data):
@@ -110,54 +149,105 @@ def build_text_blocks(script_data):
     return blocks
 
 
-def create_text_clip(text, start, duration, label):
-    caption = f"{label}:\n{text}"
-    clip = (
-        TextClip(
-            caption,
-            fontsize=70 if label == "HOOK" else 58,
-            font="Arial-Bold",
-            color="white",
-            stroke_color="black",
-            stroke_width=2,
-            method="caption",
-            align="center",
-            size=(900, None),
-        )
-        .on_color(
-            size=(980, None),
-            color=(0, 0, 0),
-            pos=("center", "center"),
-            col_opacity=0.45,
-        )
-        .set_position(("center", 200 if label == "HOOK" else "center"))
-        .set_start(start)
-        .set_duration(duration)
-    )
-    return clip
-
-
-def build_text_layer(script_data, duration):
+def text_block_timings(script_data, duration):
     blocks = build_text_blocks(script_data)
     section_duration = max(2.5, duration / len(blocks))
-    clips = []
+    timings = []
     current_start = 0.0
 
     for label, text in blocks:
-        clip = create_text_clip(text, current_start, section_duration, label)
-        clips.append(clip)
+        timings.append((label, text, current_start, section_duration))
         current_start += section_duration * 0.9  # slight overlap for smoother transitions
 
-    return clips
+    return timings
+
+
+def text_block_style(label):
+    """Caption style of a text block: the subtitle style, larger for the HOOK."""
+    style = default_style()
+    # Fixed height with room to spare (an open height clips descenders); the box crops it
+    style.update(font_size=70 if label == "HOOK" else 58, stroke_width=2, size=[900, 640])
+    return style
+
+
+def _boxed_image(sprite_path, image_path):
+    """Center a sprite's visible rows on a TEXT_BOX_WIDTH-wide translucent black box."""
+    with Image.open(sprite_path) as sprite:
+        sprite = sprite.convert("RGBA")
+    _, top, _, bottom = sprite.getchannel("A").getbbox() or (0, 0, 0, 0)
+    sprite = sprite.crop((0, top, sprite.width, bottom))
+    box = Image.new(
+        "RGBA", (TEXT_BOX_WIDTH, sprite.height + 2 * TEXT_BOX_PADDING),
+        (0, 0, 0, round(255 * TEXT_BOX_OPACITY)),
+    )
+    box.alpha_composite(sprite, ((TEXT_BOX_WIDTH - sprite.width) // 2, TEXT_BOX_PADDING))
+    box.save(image_path)
+
+
+@stage("text_clips")
+def build_text_overlays(script_data, duration, work_dir):
+    """
+    Boxed HOOK/FACT/CTA images rasterized through the subtitle sprite cache,
+    as overlays ({"image", "x", "y", "start", "end"}) shared by both backends.
+
+    Raises:
+        RuntimeError: if a block could not be rasterized
+    """
+    timings = text_block_timings(script_data, duration)
+    captions = [f"{label}:\n{text}" for label, text, _, _ in timings]
+    hook_captions = [caption for caption, (label, *_) in zip(captions, timings) if label == "HOOK"]
+    other_captions = [caption for caption, (label, *_) in zip(captions, timings) if label != "HOOK"]
+    # One sprite lookup per style; the HOOK is set larger than the other blocks
+    sprites = {
+        **prepare_sprites(other_captions, text_block_style("FACT")),
+        **prepare_sprites(hook_captions, text_block_style("HOOK")),
+    }
+
+    overlays = []
+    for i, (caption, (label, _, start, section_duration)) in enumerate(zip(captions, timings)):
+        sprite_path = sprites.get(caption)
+        if not sprite_path:
+            raise RuntimeError(f"Failed to create {label} text block")
+        image_path = Path(work_dir) / f"text-{i:02d}.png"
+        _boxed_image(sprite_path, image_path)
+        overlays.append({
+            "image": str(image_path),
+            "x": "center",
+            "y": 200 if label == "HOOK" else "center",
+            "start": start,
+            "end": start + section_duration,
+        })
+    return overlays
+
+
+def build_text_layer(overlays):
+    """ImageClips of the text overlays for the MoviePy backend."""
+    layers = []
+    for overlay in overlays:
+        clip = ImageClip(overlay["image"])
+        position = (overlay["x"], overlay["y"])
+        try:
+            # MoviePy 2.x
+            clip = clip.with_position(position).with_start(overlay["start"]).with_duration(overlay["end"] - overlay["start"])
+        except AttributeError:
+            # MoviePy 1.x fallback
+            clip = clip.set_position(position).set_start(overlay["start"]).set_duration(overlay["end"] - overlay["start"])
+        layers.append(clip)
+    return layers
 
 
 def mix_audio_tracks(voice_clip, background_path):
     tracks = [voice_clip]
     if background_path:
         music = AudioFileClip(str(background_path))
-        music_loop = moviepy_audio.fx.all.audio_loop(
-            music.volumex(0.25), duration=voice_clip.duration
-        )
+        try:
+            # MoviePy 2.x
+            music_loop = music.with_effects([
+                afx.MultiplyVolume(0.25), afx.AudioLoop(duration=voice_clip.duration),
+            ])
+        except AttributeError:
+            # MoviePy 1.x fallback
+            music_loop = afx.audio_loop(music.volumex(0.25), duration=voice_clip.duration)
         tracks.append(music_loop)
     return CompositeAudioClip(tracks)
 
@@ -177,54 +267,305 @@ def render_video(args):
     topic_id = script_data.get("id") or script_path.stem
 
     voice_audio = AudioFileClip(str(audio_path))
-    stock_clip_path = select_stock_clip(script_data.get("tags"))
-    stock_clip = VideoFileClip(str(stock_clip_path))
-    background_clip = fit_clip_to_vertical(stock_clip, voice_audio.duration)
+    stock_clip_path = getattr(args, "stock_clip", None) or select_stock_clip(
+        script_data.get("tags"), min_duration=voice_audio.duration
+    )
 
-    text_layers = build_text_layer(script_data, voice_audio.duration)
+    if getattr(args, "backend", "moviepy") == "ffmpeg":
+        duration = voice_audio.duration
+        voice_audio.close()
+        return render_video_ffmpeg(
+            script_data, audio_path, duration, stock_clip_path, topic_id,
+            profile=getattr(args, "profile", None), threads=getattr(args, "threads", None),
+        )
+    if stock_clip_fit(stock_clip_path) == "cover":
+        # Same shared normalized copy as the ffmpeg backend (and the batch pre-pass)
+        stock_clip_path = get_normalized_clip(stock_clip_path) or stock_clip_path
+    with stage("clip_decode"):
+        stock_clip = VideoFileClip(str(stock_clip_path))
+    reader_opened()
+    background_clip = fit_clip_to_vertical(stock_clip, voice_audio.duration)
 
     bg_music_path = select_background_music()
     mixed_audio = mix_audio_tracks(voice_audio, bg_music_path)
 
-    final_clip = CompositeVideoClip(
-        [background_clip, *text_layers], size=(1080, 1920)
-    ).set_audio(mixed_audio)
-
     VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
     output_path = VIDEOS_DIR / f"{topic_id}.mp4"
 
-    final_clip.write_videofile(
-        str(output_path),
-        codec="libx264",
-        audio_codec="aac",
-        fps=30,
-        preset="medium",
-        threads=4,
-    )
+    with tempfile.TemporaryDirectory(prefix="text-blocks-") as work_dir:
+        text_layers = build_text_layer(build_text_overlays(script_data, voice_audio.duration, work_dir))
+        final_clip = CompositeVideoClip([background_clip, *text_layers], size=(1080, 1920))
+        # Text blocks overlap and may run past the narration; end with it, as the ffmpeg backend does
+        try:
+            # MoviePy 2.x
+            final_clip = final_clip.with_duration(voice_audio.duration).with_audio(mixed_audio)
+        except AttributeError:
+            # MoviePy 1.x fallback
+            final_clip = final_clip.set_duration(voice_audio.duration).set_audio(mixed_audio)
+
+        with stage("compose_encode"):
+            final_clip.write_videofile(
+                str(output_path),
+                audio_codec="aac",
+                fps=30,
+                **moviepy_write_options(getattr(args, "profile", None), getattr(args, "threads", None)),
+            )
 
     final_clip.close()
     background_clip.close()
     stock_clip.close()
+    reader_closed()
     voice_audio.close()
 
     print(f"Rendered video saved to {output_path}")
+    return str(output_path)
+
+
+def stock_clip_fit(stock_clip_path):
+    """"cover" if the clip fills 1080x1920 when scaled to full height, else "blur"."""
+    info = probe_video(stock_clip_path)
+    scaled_width = info["width"] * 1920 / info["height"] if info["height"] else 1080
+    return "blur" if scaled_width < 1080 else "cover"
+
+
+def render_video_ffmpeg(script_data, audio_path, duration, stock_clip_path, topic_id, profile=None, threads=None):
+    """Render the same short as render_video with a single ffmpeg filter graph."""
+    fit = stock_clip_fit(stock_clip_path)
+    source = stock_clip_path
+    if fit == "cover":
+        # Cover clips are cropped anyway: decode the shared normalized copy instead
+        source = get_normalized_clip(stock_clip_path) or stock_clip_path
+
+    VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = VIDEOS_DIR / f"{topic_id}.mp4"
+
+    with tempfile.TemporaryDirectory(prefix="text-blocks-") as work_dir:
+        overlays = build_text_overlays(script_data, duration, work_dir)
+
+        bg_music_path = select_background_music()
+        plan = {
+            "size": (1080, 1920),
+            "fps": 30,
+            "duration": duration,
+            "segments": [
+                {"source": str(source), "offset": 0.0, "duration": duration, "fit": fit}
+            ],
+            "overlays": overlays,
+            "audio": str(audio_path),
+            "music": {"path": str(bg_music_path), "volume": 0.25} if bg_music_path else None,
+        }
+        run_plan(plan, output_path, profile=profile, threads=threads)
+
+    print(f"Rendered video saved to {output_path}")
+    return str(output_path)
+
+
+def _find_audio(script_path, script_data):
+    audio_path = script_data.get("audioPath")
+    if audio_path:
+        candidate = (ROOT_DIR / audio_path).resolve()
+        if candidate.exists():
+            return candidate
+    topic_id = script_data.get("id") or script_path.stem
+    for ext in sorted(AUDIO_EXTENSIONS):
+        candidate = AUDIO_DIR / f"{topic_id}{ext}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def load_batch(source):
+    """
+    Build the job list of a batch.
+
+    Args:
+        source: A directory of script JSON files (audio is taken from each
+            script's audioPath or pipeline/audio/<id>.*), or a JSON manifest:
+            [{"script": ..., "audio": ...}, ...] with paths relative to the repo root
+
+    Returns:
+        List of {"id", "script", "audio"} dicts; audio is None when missing
+    """
+    source = Path(source)
+    jobs = []
+    if source.is_dir():
+        for script_path in sorted(source.glob("*.json")):
+            try:
+                with open(script_path, "r", encoding="utf-8") as fp:
+                    script_data = json.load(fp)
+            except (OSError, ValueError) as e:
+                print(f"Skipping malformed script {script_path.name}: {e}")
+                continue
+            audio_path = _find_audio(script_path, script_data)
+            jobs.append({
+                "id": script_data.get("id") or script_path.stem,
+                "script": str(script_path.resolve()),
+                "audio": str(audio_path) if audio_path else None,
+            })
+        return jobs
+
+    with open(source, "r", encoding="utf-8") as fp:
+        entries = json.load(fp)
+    for entry in entries:
+        script_path = (ROOT_DIR / entry["script"]).resolve()
+        audio_path = (ROOT_DIR / entry["audio"]).resolve() if entry.get("audio") else None
+        jobs.append({
+            "id": entry.get("id") or script_path.stem,
+            "script": str(script_path),
+            "audio": str(audio_path) if audio_path else None,
+        })
+    return jobs
+
+
+def _init_batch_worker(asset_index):
+    global _asset_index
+    _asset_index = asset_index
+
+
+def _prepare_stock_clip(stock_clip_path):
+    """Normalize a cover clip once before the jobs that share it start; returns an error message or None."""
+    try:
+        if stock_clip_fit(stock_clip_path) == "cover":
+            get_normalized_clip(stock_clip_path)
+    except Exception as e:
+        return str(e)
+    return None
+
+
+def _render_batch_job(job):
+    started = time.time()
+    result = {"id": job["id"], "script": job["script"], "audio": job["audio"]}
+    try:
+        with render_job("video", job["id"]):
+            output = render_video(SimpleNamespace(
+                script=job["script"],
+                audio=job["audio"],
+                backend=job["backend"],
+                stock_clip=job["stock_clip"],
+                profile=job["profile"],
+                threads=job["threads"],
+            ))
+        result.update(status="rendered", output=output)
+    except Exception as e:
+        print(f"❌ Render failed for {job['id']}: {e}")
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+    result["seconds"] = round(time.time() - started, 2)
+    result["metrics"] = str(report_path("video", job["id"]))
+    return result
+
+
+def render_batch(source, manifest_report_path=None, workers=None, backend="moviepy", profile=None):
+    """
+    Render every (script, audio) pair of a batch in one invocation.
+
+    Jobs run on a bounded process pool that shares one asset index, and
+    the cover stock clips they use are normalized once up front (clip
+    cache); both backends render from that copy, so jobs picking the same
+    clip do not repeat the scale/crop.
+
+    Returns:
+        List of per-job result dicts, also written to manifest_report_path
+    """
+    global _asset_index
+    workers = max(1, workers or RENDER_BATCH_WORKERS)
+    manifest_report_path = Path(manifest_report_path) if manifest_report_path else VIDEOS_DIR / "batch-report.json"
+    _asset_index = load_asset_index(ASSETS_DIR)
+
+    results = []
+    jobs = []
+    for job in load_batch(source):
+        if not job["audio"] or not Path(job["audio"]).exists():
+            print(f"Missing audio for {job['id']}, skipping.")
+            results.append({**job, "status": "skipped", "error": "audio not found"})
+            continue
+        try:
+            with open(job["script"], "r", encoding="utf-8") as fp:
+                tags = json.load(fp).get("tags")
+            job["stock_clip"] = str(select_stock_clip(tags, min_duration=probe_video(job["audio"])["duration"]))
+        except (OSError, ValueError) as e:
+            results.append({**job, "status": "failed", "error": f"{type(e).__name__}: {e}"})
+            continue
+        job["backend"] = backend
+        job["profile"] = profile
+        jobs.append(job)
+
+    pool_size = min(workers, max(len(jobs), 1))
+    # Split the cores between concurrent encoders instead of oversubscribing
+    for job in jobs:
+        job["threads"] = max(1, encoder_threads() // pool_size)
+    print(f"🎬 Batch: {len(jobs)} job(s) on {pool_size} worker(s)")
+    VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+    if jobs:
+        with ProcessPoolExecutor(
+            max_workers=pool_size,
+            initializer=_init_batch_worker,
+            initargs=(_asset_index,),
+        ) as executor:
+            stock_clips = sorted({job["stock_clip"] for job in jobs})
+            for stock_clip, error in zip(stock_clips, executor.map(_prepare_stock_clip, stock_clips)):
+                if error:
+                    print(f"Warning: could not pre-normalize {Path(stock_clip).name}: {error}")
+            results.extend(executor.map(_render_batch_job, jobs))
+
+    save_json_atomic(manifest_report_path, results)
+    rendered = sum(1 for result in results if result["status"] == "rendered")
+    print(f"✓ Batch done: {rendered}/{len(results)} rendered, report: {manifest_report_path}")
+    return results
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Render a vertical short from audio + script.")
-    parser.add_argument("--audio", required=True, help="Path to the narrated audio file.")
+    parser.add_argument("--audio", help="Path to the narrated audio file.")
     parser.add_argument(
         "--script",
-        required=True,
         help="Path to the script JSON generated by script-generator.",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="moviepy",
+        help="Render backend (ffmpeg skips MoviePy frame compositing).",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=ENCODING_PROFILES,
+        default=ENCODING_PROFILE,
+        help="Encoding profile: draft, upload or archive.",
+    )
+    parser.add_argument(
+        "--batch",
+        help="Scripts directory or JSON manifest of {script, audio} pairs to render in one run.",
+    )
+    parser.add_argument(
+        "--batch-workers",
+        type=int,
+        default=RENDER_BATCH_WORKERS,
+        help="Concurrent render processes for --batch.",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store_true",
+        help="Also run the render under cProfile and save <report>.prof next to the timing report.",
+    )
+    parser.add_argument(
+        "--report",
+        dest="manifest_report_path",
+        help="Where --batch writes its per-job result manifest (default: pipeline/videos/batch-report.json).",
+    )
+    args = parser.parse_args()
+    if not args.batch and not (args.audio and args.script):
+        parser.error("--audio and --script are required unless --batch is given")
+    return args
 
 
 def main():
     args = parse_args()
     VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
-    render_video(args)
+    if args.batch:
+        render_batch(args.batch, args.manifest_report_path, args.batch_workers, args.backend, args.profile)
+        return
+    with render_job("video", Path(args.script).stem, cprofile=args.cprofile):
+        render_video(args)
 
 
 if __name__ == "__main__":
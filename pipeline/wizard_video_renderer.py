@@ -8,19 +8,38 @@ os.environ['MOVIEPY_DOTENV'] = ''
 
 try:
     # MoviePy 2.x
-    from moviepy import AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips
+    from moviepy import AudioFileClip, VideoFileClip
 except ImportError:
     # MoviePy 1.x fallback
-    from moviepy.editor import AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips
+    from moviepy.editor import AudioFileClip, VideoFileClip
+
+from clip_cache import get_normalized_clip
+from clip_pool import looped_subclip, sequence_clips
+from encoding_profiles import ENCODING_PROFILE, ENCODING_PROFILES, moviepy_write_options
+from ffmpeg_backend import BACKENDS, TRANSITIONS, render_preview, render_subtitled_video
+from ffmpeg_tools import probe_video
+from render_metrics import reader_closed, reader_opened, render_job, stage
+from render_worker import submit_job
+from segment_renderer import render_segments_incremental
+from subtitle_sprites import apply_subtitle_track
+from word_captions import CAPTION_MODE, CAPTION_MODES, build_caption_track
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 VIDEOS_DIR = ROOT_DIR / "pipeline" / "videos"
 
+WIZARD_TRANSITION = os.getenv("WIZARD_TRANSITION", "crossfade")
+WIZARD_TRANSITION_DURATION = float(os.getenv("WIZARD_TRANSITION_DURATION", "0.5"))
+
 
 def process_video_clip(video_path):
     """
-    Process a single video: resize, crop to 1080x1920
+    Process a single video: resize, crop to 1080x1920.
+    Uses the shared normalized-clip cache and falls back to in-memory resize.
     """
+    cached_path = get_normalized_clip(video_path)
+    if cached_path:
+        return VideoFileClip(cached_path, audio=False)
+    
     video_clip = VideoFileClip(str(video_path))
     
     # Resize and crop video to 1080x1920 (9:16 aspect ratio)
@@ -52,35 +71,86 @@ def process_video_clip(video_path):
     return video_cropped
 
 
-def render_wizard_video(video_paths, audio_path, subtitles, output_id):
+def centered_offset(source_duration, clip_duration):
+    """Start of a clip_duration window in the middle of the source (better quality usually)."""
+    return max(0.0, (source_duration - clip_duration) / 2)
+
+
+def slot_timing(total_duration, count, transition_duration):
+    """
+    Per-video slot length and the effective transition length. Consecutive
+    slots overlap by the transition, so slots grow to still fill the audio;
+    the transition is capped at half a slot.
+    """
+    if count < 2 or not transition_duration:
+        return total_duration / count, 0.0
+    transition_duration = min(transition_duration, total_duration / count / 2)
+    return (total_duration + (count - 1) * transition_duration) / count, transition_duration
+
+
+def render_wizard_video(video_paths, audio_path, subtitles, output_id, backend="moviepy", incremental=False,
+                        preview=False, transition=WIZARD_TRANSITION,
+                        transition_duration=WIZARD_TRANSITION_DURATION, profile=None, captions=None):
     """
     Combine multiple user-uploaded videos with generated audio and subtitles.
-    Videos are split into equal segments and crossfaded together.
+    Videos are split into equal segments joined by a transition
+    (crossfade, dip-to-black, slide or "none"); only the overlapping frames
+    of two segments are blended.
+    backend="ffmpeg" renders the same timeline as one ffmpeg filter graph.
+    incremental=True encodes the timeline as cached per-subtitle chunks and
+    only re-encodes the chunks whose fingerprint changed since the last render.
+    preview=True writes a fast low-resolution <output_id>-preview.mp4 instead.
+    profile names the encoding profile (draft, upload, archive; default ENCODING_PROFILE).
+    captions is "line" or "word" (karaoke highlight; MoviePy backend only, default CAPTION_MODE).
     """
     audio_clip = AudioFileClip(str(audio_path))
     total_duration = audio_clip.duration
     
+    if transition not in TRANSITIONS:
+        transition = None
+    clip_duration, crossfade_duration = slot_timing(
+        total_duration, len(video_paths), transition_duration if transition else 0.0
+    )
+    plan_transition = {"type": transition, "duration": crossfade_duration} if crossfade_duration else None
+    
+    if backend == "ffmpeg" or incremental or preview:
+        if (captions or CAPTION_MODE) == "word":
+            print("⚠️  Word captions need the MoviePy backend; rendering line captions")
+        audio_clip.close()
+        segments = [
+            {
+                "source": str(vp),
+                "offset": centered_offset(probe_video(vp)["duration"], clip_duration),
+                "duration": clip_duration,
+            }
+            for vp in video_paths
+        ]
+        print(f"Planning {len(segments)} segment(s) of {clip_duration:.2f}s...")
+        VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
+        output_path = VIDEOS_DIR / f"{output_id}.mp4"
+        if preview:
+            return render_preview(segments, subtitles, audio_path, total_duration, output_path,
+                                  transition=plan_transition)
+        if incremental:
+            return render_segments_incremental(segments, subtitles, audio_path, total_duration, output_path,
+                                               profile=profile, transition=plan_transition)
+        return render_subtitled_video(segments, subtitles, audio_path, total_duration, output_path,
+                                      profile=profile, transition=plan_transition)
+    
     # Process all videos
     print(f"Processing {len(video_paths)} video(s)...")
-    processed_clips = [process_video_clip(vp) for vp in video_paths]
-    
-    # Calculate duration per video clip
-    clip_duration = total_duration / len(processed_clips)
-    crossfade_duration = 0.5  # 0.5 seconds crossfade between clips
+    with stage("clip_decode"):
+        processed_clips = [process_video_clip(vp) for vp in video_paths]
+    for _ in processed_clips:
+        reader_opened()
     
     # Extract clips from each video
     video_segments = []
     for i, clip in enumerate(processed_clips):
-        # Get a segment from the middle of the video (better quality usually)
-        start_time = max(0, (clip.duration - clip_duration) / 2)
-        end_time = min(clip.duration, start_time + clip_duration)
-        
-        # If video is too short, loop it
-        if clip.duration < clip_duration:
-            loops_needed = int(clip_duration / clip.duration) + 1
-            clip = concatenate_videoclips([clip] * loops_needed)
-        
-        segment = clip.with_start(0).with_duration(clip_duration)
+        # Get a segment from the middle of the video (better quality usually);
+        # a video shorter than the slot is looped lazily from its start
+        start_time = centered_offset(clip.duration, clip_duration)
+        segment = looped_subclip(clip, clip_duration, offset=start_time)
         video_segments.append(segment)
         print(f"  ✓ Video {i+1}/{len(processed_clips)}: {clip_duration:.2f}s segment extracted")
     
@@ -90,55 +160,20 @@ def render_wizard_video(video_paths, audio_path, subtitles, output_id):
         # Single video
         final_video_bg = video_segments[0]
     else:
-        # Multiple videos: concatenate with smooth transitions
-        # Use method="compose" for smooth transitions
-        final_video_bg = concatenate_videoclips(video_segments, method="compose")
+        # Multiple videos: same-size segments; only the transition overlaps are blended
+        final_video_bg = sequence_clips(video_segments, transition, crossfade_duration)
     
     # Ensure exact duration match
     final_video_bg = final_video_bg.with_duration(total_duration)
     
-    # Create subtitle clips
+    # Create the subtitle track
     print("Adding subtitles...")
-    subtitle_clips = []
-    for sub in subtitles:
-        try:
-            start = float(sub['start'])
-            end = float(sub['end'])
-            text = sub['text']
-            
-            # Create text clip with Turkish character support
-            # Using full font path for Turkish characters
-            txt_clip = TextClip(
-                text=text,
-                font_size=55,
-                color='white',
-                font='/System/Library/Fonts/Supplemental/Arial Bold.ttf',  # Tam path - Türkçe karakter desteği
-                stroke_color='black',
-                stroke_width=3,
-                method='caption',
-                text_align='center',
-                size=(950, 300),  # Yükseklik belirtildi - alt kısım kesik olmasın
-            )
-            
-            # Add timing and position (biraz daha yukarıda)
-            txt_clip = (
-                txt_clip
-                .with_position(('center', 1400))  # 1500'den 1400'e düşürüldü
-                .with_start(start)
-                .with_duration(end - start)
-            )
-            subtitle_clips.append(txt_clip)
-        except Exception as e:
-            print(f"  Warning: Failed to create subtitle: {e}")
-            continue
-    
-    print(f"  ✓ {len(subtitle_clips)} subtitles created")
-    
-    # Composite video with subtitles
-    if subtitle_clips:
-        final_video = CompositeVideoClip([final_video_bg, *subtitle_clips], size=(1080, 1920))
-    else:
-        final_video = final_video_bg
+    subtitle_track = build_caption_track(subtitles, final_video_bg.size, captions)
+    
+    print(f"  ✓ {subtitle_track['lines']} subtitles created")
+    
+    # Composite video with subtitles (one track clip; only the active cue is blended per frame)
+    final_video = apply_subtitle_track(final_video_bg, subtitle_track)
     
     # Add audio (MoviePy 2.x uses with_audio)
     print("Adding audio...")
@@ -149,19 +184,19 @@ def render_wizard_video(video_paths, audio_path, subtitles, output_id):
     VIDEOS_DIR.mkdir(parents=True, exist_ok=True)
     output_path = VIDEOS_DIR / f"{output_id}.mp4"
     
-    final_video.write_videofile(
-        str(output_path),
-        codec="libx264",
-        audio_codec="aac",
-        fps=30,
-        preset="medium",
-        threads=4,
-    )
+    with stage("compose_encode"):
+        final_video.write_videofile(
+            str(output_path),
+            audio_codec="aac",
+            fps=30,
+            **moviepy_write_options(profile),
+        )
     
     # Cleanup
     final_video.close()
     for clip in processed_clips:
         clip.close()
+        reader_closed()
     audio_clip.close()
     
     print(f"\n✓ Video saved to {output_path}")
@@ -174,6 +209,15 @@ def parse_args():
     parser.add_argument("--audio", required=True, help="Generated audio path")
     parser.add_argument("--subtitles-file", required=True, help="Subtitles JSON file path")
     parser.add_argument("--output-id", required=True, help="Output video ID")
+    parser.add_argument("--backend", choices=BACKENDS, default="moviepy", help="Render backend (ffmpeg skips MoviePy frame compositing)")
+    parser.add_argument("--transition", choices=[*TRANSITIONS, "none"], default=WIZARD_TRANSITION, help="Transition between videos")
+    parser.add_argument("--transition-duration", type=float, default=WIZARD_TRANSITION_DURATION, help="Transition length in seconds")
+    parser.add_argument("--incremental", action="store_true", help="Reuse cached encoded segments and only re-encode changed ones")
+    parser.add_argument("--preview", action="store_true", help="Render a quick low-resolution preview (<id>-preview.mp4) instead of the full video")
+    parser.add_argument("--profile", choices=ENCODING_PROFILES, default=ENCODING_PROFILE, help="Encoding profile: draft, upload or archive")
+    parser.add_argument("--captions", choices=CAPTION_MODES, default=CAPTION_MODE, help="Caption style: whole lines, or word-by-word karaoke highlight (MoviePy backend)")
+    parser.add_argument("--cprofile", action="store_true", help="Also run the render under cProfile and save <report>.prof next to the timing report")
+    parser.add_argument("--worker", action="store_true", help="Submit the job to a running render_worker.py instead of rendering in-process")
     return parser.parse_args()
 
 
@@ -186,9 +230,28 @@ def main():
     print(f"Videos: {len(args.videos)}")
     print(f"Audio: {args.audio}")
     print(f"Output ID: {args.output_id}")
+    print(f"Backend: {args.backend}")
     print("="*30)
     
-    render_wizard_video(args.videos, args.audio, subtitles, args.output_id)
+    params = {
+        "video_paths": [str(Path(v).resolve()) for v in args.videos],
+        "audio_path": str(Path(args.audio).resolve()),
+        "subtitles": subtitles,
+        "output_id": args.output_id,
+        "backend": args.backend,
+        "incremental": args.incremental,
+        "preview": args.preview,
+        "transition": args.transition,
+        "transition_duration": args.transition_duration,
+        "profile": args.profile,
+        "captions": args.captions,
+    }
+    if args.worker:
+        submit_job("wizard", params)
+    else:
+        job_id = f"{args.output_id}-preview" if args.preview else args.output_id
+        with render_job("wizard", job_id, cprofile=args.cprofile):
+            render_wizard_video(**params)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,233 @@
+"""
+Word-level (karaoke) captions for the MoviePy renderers.
+
+Every distinct word of a script is rasterized once with Pillow into a word
+sprite atlas: one premultiplied RGBA strip with all words side by side on a
+shared baseline. Each subtitle line is then assembled from atlas slices
+(greedy wrap, centered like the line captions) into one line sprite, and
+every word gets a highlight cue covering its timing: the difference between
+the highlight-colored and the normal word, added in place over the line. Per
+frame that is one line blend plus one small addition, found through the same
+interval index as the line captions (subtitle_sprites.index_cues).
+
+Word timings come from the subtitle JSON: a line may carry
+"words": [{"word": "Merhaba", "start": 0.0, "end": 0.4}, ...] (Whisper's
+word timestamp format; "text" works as the key too). Lines without word
+timings are split on whitespace and their duration is shared out by word
+length.
+
+CAPTION_MODE selects "line" (default) or "word" captions;
+CAPTION_HIGHLIGHT_COLOR sets the color of the word being spoken.
+"""
+import math
+import os
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from render_metrics import stage
+from subtitle_sprites import (
+    SUBTITLE_POSITION,
+    build_subtitle_track,
+    default_style,
+    index_cues,
+    place_sprite,
+)
+
+CAPTION_MODES = ("line", "word")
+CAPTION_MODE = os.getenv("CAPTION_MODE", "line")
+CAPTION_HIGHLIGHT_COLOR = os.getenv("CAPTION_HIGHLIGHT_COLOR", "#FFD400")
+
+INTERLINE = 4  # px between wrapped lines, as TextClip
+
+
+def word_timings(sub):
+    """
+    Timed words of a subtitle dict as [{"text", "start", "end"}], clipped to
+    the line. Falls back to splitting the text and sharing the line's
+    duration by word length when the line has no "words".
+    """
+    start, end = float(sub['start']), float(sub['end'])
+    words = [
+        {
+            "text": str(word.get("word", word.get("text", ""))).strip(),
+            "start": min(max(float(word["start"]), start), end),
+            "end": min(max(float(word["end"]), start), end),
+        }
+        for word in sub.get("words") or []
+    ]
+    words = [word for word in words if word["text"]]
+    if words:
+        return words
+
+    tokens = sub['text'].split()
+    total = sum(len(token) for token in tokens) or 1
+    words, elapsed = [], start
+    for token in tokens:
+        duration = (end - start) * len(token) / total
+        words.append({"text": token, "start": elapsed, "end": elapsed + duration})
+        elapsed += duration
+    return words
+
+
+def _load_font(style):
+    try:
+        return ImageFont.truetype(style["font"], style["font_size"])
+    except OSError:
+        print(f"  Warning: Font not found for word captions: {style['font']}, using Pillow's default")
+        return ImageFont.load_default(size=style["font_size"])
+
+
+@stage("word_atlas")
+def build_word_atlas(words, style=None, highlight=CAPTION_HIGHLIGHT_COLOR):
+    """
+    Rasterize each distinct word once into a shared-baseline atlas.
+
+    Returns:
+        Dict with "rgb" (premultiplied) and "inverse_alpha" float32 arrays of
+        the whole strip, "delta" (highlight minus normal color), "slots"
+        mapping word -> (x, width) in the strip, and the "space" width
+    """
+    style = style or default_style()
+    font = _load_font(style)
+    stroke = style["stroke_width"] or 0
+    words = list(dict.fromkeys(words))
+
+    boxes = {word: font.getbbox(word, stroke_width=stroke, anchor="ls") for word in words}
+    top = min([box[1] for box in boxes.values()] + [0])
+    bottom = max([box[3] for box in boxes.values()] + [1])
+    slots, x = {}, 0
+    for word in words:
+        left, _, right, _ = boxes[word]
+        slots[word] = (x, max(right - left, 1))
+        x += slots[word][1] + 1
+
+    image = Image.new("RGBA", (max(x, 1), bottom - top), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    for word in words:
+        draw.text(
+            (slots[word][0] - boxes[word][0], -top), word, font=font, anchor="ls",
+            fill=style["color"], stroke_width=stroke, stroke_fill=style["stroke_color"],
+        )
+
+    pixels = np.asarray(image, dtype=np.float32)
+    alpha = pixels[:, :, 3:] / 255.0
+    rgb = pixels[:, :, :3] * alpha
+    # Only the fill changes color: the (black) stroke scales to itself
+    tint = np.array(ImageColor.getrgb(highlight)[:3], dtype=np.float32) / 255.0
+    fill = np.array(ImageColor.getrgb(style["color"])[:3], dtype=np.float32) / 255.0
+    delta = rgb * (tint / np.maximum(fill, 1 / 255.0) - 1.0)
+
+    print(f"  ✓ Word atlas: {len(words)} distinct word(s), {image.width}x{image.height}px")
+    return {
+        "rgb": rgb,
+        "inverse_alpha": 1.0 - alpha,
+        "delta": delta,
+        "slots": slots,
+        "space": max(math.ceil(font.getlength(" ")) - 2 * stroke, 1),  # word boxes include the stroke
+        "height": image.height,
+    }
+
+
+def layout_words(words, atlas, max_width):
+    """
+    Greedy-wrap words into centered lines no wider than max_width.
+
+    Returns:
+        ([(x, y) per word], (block width, block height))
+    """
+    lines, current, width = [], [], 0
+    for index, word in enumerate(words):
+        word_width = atlas["slots"][word][1]
+        needed = word_width if not current else width + atlas["space"] + word_width
+        if current and needed > max_width:
+            lines.append((current, width))
+            current, needed = [], word_width
+        current.append(index)
+        width = needed
+    if current:
+        lines.append((current, width))
+
+    block_width = max((line_width for _, line_width in lines), default=0)
+    line_height = atlas["height"] + INTERLINE
+    positions = [None] * len(words)
+    for row, (indices, line_width) in enumerate(lines):
+        x = (block_width - line_width) // 2
+        for index in indices:
+            positions[index] = (x, row * line_height)
+            x += atlas["slots"][words[index]][1] + atlas["space"]
+    return positions, (block_width, len(lines) * line_height - INTERLINE)
+
+
+def _word_slice(atlas, word, key):
+    x, width = atlas["slots"][word]
+    return atlas[key][:, x:x + width]
+
+
+def build_word_track(subtitles, frame_size, style=None, position=SUBTITLE_POSITION,
+                     highlight=CAPTION_HIGHLIGHT_COLOR):
+    """
+    Karaoke subtitle track: each line shown in the caption color with the
+    word being spoken recolored to highlight.
+
+    Returns:
+        Track dict (see subtitle_sprites.index_cues) for apply_subtitle_track,
+        with the number of caption "lines"
+    """
+    style = style or default_style()
+    timed = [(sub, word_timings(sub)) for sub in subtitles]
+    atlas = build_word_atlas([word["text"] for _, words in timed for word in words], style, highlight)
+    box_size = tuple(style["size"])
+    cues = []
+    lines = 0
+
+    for sub, words in timed:
+        if not words:
+            continue
+        start, end = float(sub['start']), float(sub['end'])
+        texts = [word["text"] for word in words]
+        positions, (block_width, block_height) = layout_words(texts, atlas, box_size[0])
+
+        rgb = np.zeros((block_height, block_width, 3), dtype=np.float32)
+        inverse_alpha = np.ones((block_height, block_width, 1), dtype=np.float32)
+        for text, (x, y) in zip(texts, positions):
+            width = atlas["slots"][text][1]
+            rgb[y:y + atlas["height"], x:x + width] = _word_slice(atlas, text, "rgb")
+            inverse_alpha[y:y + atlas["height"], x:x + width] = _word_slice(atlas, text, "inverse_alpha")
+
+        # Block centered in the caption box, like TextClip(method="caption")
+        offset = ((box_size[0] - block_width) // 2, (box_size[1] - block_height) // 2)
+        line = place_sprite(
+            {"offset": offset, "size": box_size, "rgb": rgb, "inverse_alpha": inverse_alpha},
+            frame_size, position,
+        )
+        if not line or end <= start:
+            continue
+        cues.append({"start": start, "end": end, **line})
+        lines += 1
+
+        # A word stays highlighted until the next one starts (or the line ends)
+        for index, (word, (x, y)) in enumerate(zip(words, positions)):
+            until = words[index + 1]["start"] if index + 1 < len(words) else end
+            placed = place_sprite(
+                {
+                    "offset": (offset[0] + x, offset[1] + y),
+                    "size": box_size,
+                    "delta": _word_slice(atlas, word["text"], "delta"),
+                },
+                frame_size, position,
+            )
+            if placed and until > word["start"]:
+                cues.append({"start": word["start"], "end": until, **placed})
+
+    return {**index_cues(cues), "lines": lines}
+
+
+def build_caption_track(subtitles, frame_size, mode=None):
+    """Line or word caption track for the MoviePy renderers (CAPTION_MODE by default)."""
+    mode = mode or CAPTION_MODE
+    if mode not in CAPTION_MODES:
+        raise ValueError(f"Unknown caption mode: {mode} (choose from {', '.join(CAPTION_MODES)})")
+    if mode == "word":
+        return build_word_track(subtitles, frame_size)
+    return build_subtitle_track(subtitles, frame_size)
@@ -5,7 +5,8 @@ import { promises as fs } from 'node:fs';
 import { existsSync, readdirSync, statSync } from 'node:fs';
 import { fileURLToPath } from 'node:url';
 import { dirname, resolve, join } from 'node:path';
-import { execSync } from 'node:child_process';
+import { execSync, spawn } from 'node:child_process';
+import { createConnection } from 'node:net';
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = dirname(__filename);
@@ -23,6 +24,135 @@ function removeEmojis(text) {
     .trim();
 }
 
+// Render worker (pipeline/render_worker.py) connection settings
+const RENDER_WORKER_HOST = process.env.RENDER_WORKER_HOST || '127.0.0.1';
+const RENDER_WORKER_PORT = parseInt(process.env.RENDER_WORKER_PORT || '8790', 10);
+
+// Time known script text against the narration offline; resolves to subtitle JSON
+function alignSubtitles(audioFile, scriptText) {
+  const venvPython = resolve(ROOT_DIR, '.venv', 'bin', 'python3');
+  const pythonExec = existsSync(venvPython) ? venvPython : 'python3';
+  return new Promise((resolvePromise, reject) => {
+    const child = spawn(
+      pythonExec,
+      ['pipeline/subtitle_aligner.py', '--audio', audioFile, '--script-text', scriptText],
+      { cwd: ROOT_DIR, stdio: ['ignore', 'pipe', 'inherit'] }
+    );
+    let stdout = '';
+    child.stdout.on('data', chunk => { stdout += chunk; });
+    child.on('error', reject);
+    child.on('exit', code => {
+      if (code !== 0) return reject(new Error(`subtitle_aligner.py exited with code ${code}`));
+      try {
+        resolvePromise(JSON.parse(stdout));
+      } catch (error) {
+        reject(error);
+      }
+    });
+  });
+}
+
+// Run a shell command without blocking the event loop
+function runCommand(command, env) {
+  return new Promise((resolvePromise, reject) => {
+    const child = spawn(command, { cwd: ROOT_DIR, stdio: 'inherit', shell: true, env });
+    child.on('error', reject);
+    child.on('exit', code => {
+      if (code === 0) resolvePromise();
+      else reject(new Error(`Command failed with exit code ${code}: ${command}`));
+    });
+  });
+}
+
+// Submit a job to the persistent render worker; resolves with the output path
+function submitRenderJob(renderer, params) {
+  return new Promise((resolvePromise, reject) => {
+    const socket = createConnection({ host: RENDER_WORKER_HOST, port: RENDER_WORKER_PORT });
+    let buffer = '';
+    let settled = false;
+    const finish = (fn, value) => {
+      if (settled) return;
+      settled = true;
+      socket.destroy();
+      fn(value);
+    };
+    socket.on('connect', () => {
+      socket.write(JSON.stringify({ op: 'render', renderer, params }) + '\n');
+    });
+    // Decode as a stream so multi-byte characters split across chunks stay intact
+    socket.setEncoding('utf8');
+    socket.on('data', chunk => {
+      buffer += chunk;
+      let newline;
+      while ((newline = buffer.indexOf('\n')) !== -1) {
+        const line = buffer.slice(0, newline);
+        buffer = buffer.slice(newline + 1);
+        let event;
+        try {
+          event = JSON.parse(line);
+        } catch (err) {
+          finish(reject, new Error(`Invalid message from render worker: ${err.message}`));
+          return;
+        }
+        if (event.event === 'progress') {
+          console.log(`[${event.job}] ${event.message}`);
+        } else if (event.event === 'done') {
+          finish(resolvePromise, event.output);
+        } else if (event.event === 'error') {
+          finish(reject, new Error(event.error));
+        }
+      }
+    });
+    socket.on('error', err => finish(reject, err));
+    socket.on('close', () => finish(reject, new Error('Render worker closed the connection')));
+  });
+}
+
+// Prefer the warm render worker; fall back to spawning the CLI if it is not running
+async function runRender(renderer, params, fallbackCommand, env) {
+  try {
+    return await submitRenderJob(renderer, params);
+  } catch (error) {
+    if (error.code !== 'ECONNREFUSED') throw error;
+    console.log('Render worker not running, starting renderer process...');
+    await runCommand(fallbackCommand, env);
+  }
+}
+
+// Encoding profiles of pipeline/encoding_profiles.py; anything else falls back to the default
+const ENCODING_PROFILES = ['draft', 'upload', 'archive'];
+function encodingProfile(value) {
+  return ENCODING_PROFILES.includes(value) ? value : (process.env.ENCODING_PROFILE || 'upload');
+}
+
+// Full-quality renders running in the background after a preview, by video ID
+const backgroundRenders = new Map();
+
+// Render directly, or render a quick preview first and finish the full video in the background
+async function renderWithPreview({ videoId, renderer, params, command, env, preview, cleanup }) {
+  if (!preview) {
+    await runRender(renderer, params, command, env);
+    await cleanup();
+    return { videoUrl: `/videos/${videoId}.mp4` };
+  }
+
+  await runRender(renderer, { ...params, preview: true }, `${command} --preview`, env);
+  backgroundRenders.set(videoId, { status: 'rendering', startedAt: Date.now() });
+  runRender(renderer, params, command, env)
+    .then(() => backgroundRenders.set(videoId, { status: 'done', finishedAt: Date.now() }))
+    .catch(error => {
+      console.error(`Background render failed for ${videoId}:`, error);
+      backgroundRenders.set(videoId, { status: 'failed', error: error.message });
+    })
+    .finally(() => cleanup().catch(() => {}));
+
+  return {
+    previewUrl: `/videos/${videoId}-preview.mp4`,
+    videoUrl: `/videos/${videoId}.mp4`,
+    statusUrl: `/api/wizard/render-status/${videoId}`
+  };
+}
+
 const app = express();
 const PORT = process.env.PORT || 3000;
 
@@ -616,6 +746,17 @@ app.post('/api/wizard/generate-subtitles', async (req, res) => {
     // Remove emojis from script before generating subtitles
     scriptText = removeEmojis(scriptText);
     
+    // Align the script to the narration locally (pipeline/subtitle_aligner.py)
+    if (audioPath) {
+      try {
+        const audioFilePath = resolve(ROOT_DIR, audioPath.replace(/^\.\//, ''));
+        const subtitles = await alignSubtitles(audioFilePath, scriptText);
+        return res.json({ subtitles });
+      } catch (err) {
+        console.warn('Offline subtitle alignment failed, splitting evenly:', err.message);
+      }
+    }
+    
     // Get audio duration using ffprobe
     let audioDuration = null;
     if (audioPath) {
@@ -666,7 +807,8 @@ app.post('/api/wizard/finalize-video', upload.array('videos', 10), async (req, r
       return res.status(400).json({ error: 'At least one video file required' });
     }
     
-    const { scriptId, audioPath, subtitles } = req.body;
+    const { scriptId, audioPath, subtitles, preview } = req.body;
+    const profile = encodingProfile(req.body.profile);
     
     // Use virtual environment Python if available
     const venvPython = resolve(ROOT_DIR, '.venv', 'bin', 'python3');
@@ -691,25 +833,36 @@ app.post('/api/wizard/finalize-video', upload.array('videos', 10), async (req, r
     
     // Call Python renderer with multiple videos
     const videosArg = videoFiles.map(v => `"${v}"`).join(' ');
-    const command = `${pythonExec} pipeline/wizard_video_renderer.py --videos ${videosArg} --audio "${audioFile}" --subtitles-file "${subtitlesFile}" --output-id "${videoId}"`;
+    const command = `${pythonExec} pipeline/wizard_video_renderer.py --videos ${videosArg} --audio "${audioFile}" --subtitles-file "${subtitlesFile}" --output-id "${videoId}" --incremental --profile ${profile}`;
     
     console.log(`Running with ${videoFiles.length} video(s):`, command);
-    execSync(command, {
-      cwd: ROOT_DIR,
-      stdio: 'inherit',
-      env: { ...process.env, MOVIEPY_DOTENV: '' }
+    const urls = await renderWithPreview({
+      videoId,
+      renderer: 'wizard',
+      params: {
+        video_paths: videoFiles,
+        audio_path: audioFile,
+        subtitles: JSON.parse(subtitles),
+        output_id: videoId,
+        incremental: true,
+        profile
+      },
+      command,
+      env: { ...process.env, MOVIEPY_DOTENV: '' },
+      preview: preview === true || preview === 'true',
+      // Clean up temp files
+      cleanup: async () => {
+        for (const videoFile of videoFiles) {
+          await fs.unlink(videoFile);
+        }
+        await fs.unlink(subtitlesFile);
+      }
     });
     
-    // Clean up temp files
-    for (const videoFile of videoFiles) {
-      await fs.unlink(videoFile);
-    }
-    await fs.unlink(subtitlesFile);
-    
     res.json({
       success: true,
       videoId,
-      videoUrl: `/videos/${videoId}.mp4`,
+      ...urls,
       videoCount: videoFiles.length
     });
   } catch (error) {
@@ -720,7 +873,8 @@ app.post('/api/wizard/finalize-video', upload.array('videos', 10), async (req, r
 
 app.post('/api/wizard/auto-generate-video', upload.none(), async (req, res) => {
   try {
-    const { scriptId, audioPath, subtitles, scriptText } = req.body;
+    const { scriptId, audioPath, subtitles, scriptText, preview } = req.body;
+    const profile = encodingProfile(req.body.profile);
     
     // Use virtual environment Python if available
     const venvPython = resolve(ROOT_DIR, '.venv', 'bin', 'python3');
@@ -742,22 +896,33 @@ app.post('/api/wizard/auto-generate-video', upload.none(), async (req, res) => {
     
     // Call Python auto-generator with stock videos
     const assetsDir = resolve(ROOT_DIR, 'assets');
-    const command = `${pythonExec} pipeline/auto_video_generator.py --audio "${audioFile}" --subtitles-file "${subtitlesFile}" --assets-dir "${assetsDir}" --output-id "${videoId}"`;
+    // Same seed for preview and full render so both pick the same clips
+    const seed = Date.now();
+    const command = `${pythonExec} pipeline/auto_video_generator.py --audio "${audioFile}" --subtitles-file "${subtitlesFile}" --assets-dir "${assetsDir}" --output-id "${videoId}" --seed ${seed} --profile ${profile}`;
     
     console.log('Auto-generating video with stock videos...');
-    execSync(command, {
-      cwd: ROOT_DIR,
-      stdio: 'inherit',
-      env: { ...process.env, MOVIEPY_DOTENV: '' }
+    const urls = await renderWithPreview({
+      videoId,
+      renderer: 'auto',
+      params: {
+        audio_path: audioFile,
+        subtitles: JSON.parse(subtitles),
+        assets_dir: assetsDir,
+        output_id: videoId,
+        seed,
+        profile
+      },
+      command,
+      env: { ...process.env, MOVIEPY_DOTENV: '' },
+      preview: preview === true || preview === 'true',
+      // Clean up temp files
+      cleanup: () => fs.unlink(subtitlesFile)
     });
     
-    // Clean up temp files
-    await fs.unlink(subtitlesFile);
-    
     res.json({
       success: true,
       videoId,
-      videoUrl: `/videos/${videoId}.mp4`,
+      ...urls,
       mode: 'auto'
     });
   } catch (error) {
@@ -769,7 +934,8 @@ app.post('/api/wizard/auto-generate-video', upload.none(), async (req, res) => {
 // Pexels API ile otomatik video oluşturma
 app.post('/api/wizard/pexels-generate-video', upload.none(), async (req, res) => {
   try {
-    const { scriptId, audioPath, subtitles, scriptText } = req.body;
+    const { scriptId, audioPath, subtitles, scriptText, preview } = req.body;
+    const profile = encodingProfile(req.body.profile);
     
     // Use virtual environment Python if available
     const venvPython = resolve(ROOT_DIR, '.venv', 'bin', 'python3');
@@ -790,12 +956,23 @@ app.post('/api/wizard/pexels-generate-video', upload.none(), async (req, res) =>
     await fs.writeFile(subtitlesFile, JSON.stringify(JSON.parse(subtitles)));
     
     // Call Pexels video generator
-    const command = `${pythonExec} pipeline/pexels_video_generator.py --audio "${audioFile}" --subtitles-file "${subtitlesFile}" --output-id "${videoId}" --script "${scriptText || ''}" --use-pexels`;
+    const seed = Date.now();
+    const command = `${pythonExec} pipeline/pexels_video_generator.py --audio "${audioFile}" --subtitles-file "${subtitlesFile}" --output-id "${videoId}" --script "${scriptText || ''}" --use-pexels --seed ${seed} --profile ${profile}`;
     
     console.log('🎬 Generating video with Pexels API...');
-    execSync(command, {
-      cwd: ROOT_DIR,
-      stdio: 'inherit',
+    const urls = await renderWithPreview({
+      videoId,
+      renderer: 'pexels',
+      params: {
+        video_id: videoId,
+        audio_path: audioFile,
+        subtitles: JSON.parse(subtitles),
+        script_text: scriptText || '',
+        use_pexels: true,
+        seed,
+        profile
+      },
+      command,
       env: {
         ...process.env,
         MOVIEPY_DOTENV: '',  // Disable MoviePy's .env loading
@@ -803,16 +980,16 @@ app.post('/api/wizard/pexels-generate-video', upload.none(), async (req, res) =>
         RAW_VIDEOS_DIR: './pipeline/raw_videos',
         AUDIO_DIR: './pipeline/audio',
         OUTPUT_DIR: './pipeline/videos'
-      }
+      },
+      preview: preview === true || preview === 'true',
+      // Clean up temp files
+      cleanup: () => fs.unlink(subtitlesFile)
     });
     
-    // Clean up temp files
-    await fs.unlink(subtitlesFile);
-    
     res.json({
       success: true,
       videoId,
-      videoUrl: `/videos/${videoId}.mp4`,
+      ...urls,
       mode: 'pexels'
     });
   } catch (error) {
@@ -821,6 +998,15 @@ app.post('/api/wizard/pexels-generate-video', upload.none(), async (req, res) =>
   }
 });
 
+// Status of a full render started in the background after a preview
+app.get('/api/wizard/render-status/:videoId', (req, res) => {
+  const render = backgroundRenders.get(req.params.videoId);
+  if (!render) {
+    return res.status(404).json({ error: 'No background render for this video' });
+  }
+  res.json({ videoId: req.params.videoId, ...render, videoUrl: `/videos/${req.params.videoId}.mp4` });
+});
+
 app.post('/api/run/:step', async (req, res) => {
   try {
     const { step } = req.params;
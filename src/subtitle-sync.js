@@ -174,6 +174,29 @@ async function whisperViaCli(audioPath) {
   return null;
 }
 
+// Known script text timed against the narration offline (pipeline/subtitle_aligner.py)
+async function alignToScript(audioPath, scriptData) {
+  const scriptText =
+    scriptData?.bullets?.length > 0 ? scriptData.bullets.join(' ') : scriptData?.script;
+  if (!scriptText?.trim()) {
+    return null;
+  }
+  const venvPython = resolve(ROOT_DIR, '.venv', 'bin', 'python3');
+  const pythonExec = existsSync(venvPython) ? venvPython : 'python3';
+  try {
+    const { stdout } = await execFileAsync(
+      pythonExec,
+      ['pipeline/subtitle_aligner.py', '--audio', audioPath, '--script-text', scriptText],
+      { cwd: ROOT_DIR, maxBuffer: 16 * 1024 * 1024 }
+    );
+    const segments = JSON.parse(stdout);
+    return segments.length ? segments : null;
+  } catch (error) {
+    console.warn('Offline alignment failed:', error.message);
+    return null;
+  }
+}
+
 async function transcribeAudio(audioPath) {
   try {
     const viaApi = await whisperViaApi(audioPath);
@@ -268,7 +291,10 @@ async function processAudioFile(audioPath, options) {
   }
 
   let segments = null;
-  if (options.provider !== 'none') {
+  if (options.provider === 'align') {
+    segments = await alignToScript(audioPath, scriptData);
+  }
+  if (!segments && options.provider !== 'none') {
     segments = await transcribeAudio(audioPath);
   }
 
@@ -300,7 +326,7 @@ async function processAudioFile(audioPath, options) {
 async function main() {
   const args = parseArgs(process.argv.slice(2));
   const mode = args.mode === 'burn' ? 'burn' : 'file';
-  const provider = args.provider ?? 'whisper';
+  const provider = args.provider ?? 'align';
   const audioPaths = listAudioFiles({ audio: args.audio, id: args.id });
 
   if (!audioPaths.length) {